@@ -0,0 +1,87 @@
+"""
+Import time of `python -m dataPipelines.gc_scrapy crawl` startup for one spider, measured with -X importtime
+in fresh interpreters: the cli, the configured middlewares and pipelines, and the spider module itself
+
+    python -m benchmarks.bench_crawl_startup [--spider us_code_spider] [--runs 5] [--max-ms 1500]
+
+Exits non zero if a heavy optional dependency is imported or the median is over --max-ms.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# only needed by some spiders / code paths, shouldn't be imported at startup
+HEAVY_MODULES = ("pandas", "selenium", "bs4", "requests")
+
+STARTUP_CODE = """
+import importlib
+from scrapy.utils.misc import load_object
+import dataPipelines.gc_scrapy.cli
+from dataPipelines.gc_scrapy.gc_scrapy.runspider_settings import general_settings
+
+component_paths = [
+    *general_settings["DOWNLOADER_MIDDLEWARES"],
+    *general_settings["ITEM_PIPELINES"],
+    *general_settings["FEED_EXPORTERS"].values(),
+]
+for path in component_paths:
+    load_object(path)
+importlib.import_module("dataPipelines.gc_scrapy.gc_scrapy.spiders.{spider}")
+"""
+
+
+def import_times(spider: str):
+    """Runs the startup imports in a new interpreter
+    :returns: {top level package: summed self import us}, total us
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE.format(spider=spider)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    by_package = defaultdict(int)
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us)
+        total += int(self_us)
+    return by_package, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spider", default="us_code_spider", help="spider module name")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the median total import time is over this")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_times(args.spider) for _ in range(args.runs)]
+    median_ms = statistics.median(total for _, total in runs) / 1000
+    by_package = {
+        package: statistics.median(run[0].get(package, 0) for run in runs) / 1000
+        for package in set().union(*(run[0] for run in runs))
+    }
+
+    print(f"crawl startup imports for {args.spider}, median of {args.runs} runs: {median_ms:.0f} ms\n")
+    for package, ms in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+        print(f"  {package:<30} {ms:>8.1f} ms")
+
+    heavy = [package for package in HEAVY_MODULES if package in by_package]
+    failed = False
+    if heavy:
+        print(f"\nheavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"\nstartup imports took {median_ms:.0f} ms, over the {args.max_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
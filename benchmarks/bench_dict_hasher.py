@@ -0,0 +1,73 @@
+"""
+dict_to_sha256_hex_digest over representative version_hash_raw_data payloads,
+the previous reduce based string building vs streaming key/value pairs into sha256
+
+    python -m benchmarks.bench_dict_hasher [--repeat 3]
+"""
+import argparse
+import timeit
+from functools import reduce
+from hashlib import sha256
+
+from dataPipelines.gc_scrapy.gc_scrapy.utils import dict_to_sha256_hex_digest, stream_dict_to_sha256
+
+
+def reduce_dict_to_sha256_hex_digest(_dict):
+    """Previous implementation, rebuilds the accumulated string for every pair"""
+    value_string = reduce(
+        lambda t1, t2: "".join(map(str, (t1, t2))),
+        sorted(_dict.items(), key=lambda t: str(t[0])),
+        "",
+    )
+    return sha256(value_string.encode("utf-8")).hexdigest()
+
+
+PAYLOADS = {
+    # typical listing metadata, e.g. air_force_pubs
+    "listing (4 keys)": {
+        "item_currency": "2t0x1_f-35_afjqs.pdf",
+        "certified_date": "2018-03-26",
+        "last_action": "Correction",
+        "pub_date": "2018-03-26",
+    },
+    # unzipped sub-file, parent raw data plus doc_name and the parent digest
+    "sub file (8 keys)": {
+        "doc_name": "Title 42 - Health - Ch1 to Ch6 - Sec1 to Sec300",
+        "pub_date": "2022-01-03",
+        "download_url": "https://uscode.house.gov/download/releasepoints/us/pl/117/81/xml_usc42@117-81.zip",
+        "display_title": "Title 42 - The Public Health and Welfare",
+        "doc_num": "42",
+        "item_currency": "xml_usc42@117-81.zip",
+        "sub_file_version_hash": "9" * 64,
+        "type": "Title",
+    },
+    # spiders that hash page text / long lists
+    "page text (40 keys x 2KB)": {f"section_{i}": "lorem ipsum " * 170 for i in range(40)},
+    "large table (1000 keys)": {f"row_{i}": f"value {i} " * 20 for i in range(1000)},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'payload':<28}{'reduce us':>12}{'compat us':>12}{'canonical us':>14}{'speedup':>10}")
+    for name, payload in PAYLOADS.items():
+        assert dict_to_sha256_hex_digest(payload) == reduce_dict_to_sha256_hex_digest(payload)
+
+        number = max(1, 200_000 // (len(payload) * 20))
+        timings = []
+        for func in (
+            lambda: reduce_dict_to_sha256_hex_digest(payload),
+            lambda: dict_to_sha256_hex_digest(payload),
+            lambda: stream_dict_to_sha256(payload).hexdigest(),
+        ):
+            best = min(timeit.repeat(func, number=number, repeat=args.repeat))
+            timings.append(best / number * 1e6)
+        reduce_us, compat_us, canonical_us = timings
+        print(f"{name:<28}{reduce_us:>12.1f}{compat_us:>12.1f}{canonical_us:>14.1f}{reduce_us / compat_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
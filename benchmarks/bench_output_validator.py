@@ -0,0 +1,82 @@
+"""
+Items/sec for output schema validation, jsonschema Draft7Validator vs the compiled output_spec.json check
+
+    python -m benchmarks.bench_output_validator [--items 20000]
+"""
+import argparse
+import json
+from time import perf_counter
+
+from itemadapter import ItemAdapter
+from jsonschema import Draft7Validator
+
+from dataPipelines.gc_scrapy.gc_scrapy import OUTPUT_SPEC_PATH
+from dataPipelines.gc_scrapy.gc_scrapy.items import DocItem
+from dataPipelines.gc_scrapy.gc_scrapy.pipelines import ValidateJsonPipeline
+from dataPipelines.gc_scrapy.gc_scrapy.validators import DefaultOutputSchemaValidator
+
+
+def make_item(i: int) -> DocItem:
+    url = f"https://example.local/pubs/doc_{i}.pdf"
+    return DocItem(
+        doc_name=f"DOC {i}",
+        doc_title=f"Document {i}",
+        doc_num=str(i),
+        doc_type="DOC",
+        display_doc_type="Document",
+        publication_date="2020-06-01",
+        cac_login_required=False,
+        crawler_used="benchmark",
+        downloadable_items=[{"doc_type": "pdf", "download_url": url, "compression_type": None}],
+        download_url=url,
+        source_page_url="https://example.local/page_2.html",
+        source_fqdn="example.local",
+        version_hash_raw_data={"item_currency": url, "pub_date": "2020-06-01"},
+        version_hash=f"{i:064x}",
+        access_timestamp="2020-06-28T22:59:57",
+        display_org="Org",
+        data_source="Source",
+        source_title="Source Title",
+        display_source="Source - Source Title",
+        display_title=f"DOC {i} Document {i}",
+        file_ext="pdf",
+        is_revoked=False,
+    )
+
+
+def run(label: str, func, items) -> float:
+    start = perf_counter()
+    for item in items:
+        func(item)
+    elapsed = perf_counter() - start
+    print(f"{label:<55} {len(items) / elapsed:>12,.0f} items/sec")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20_000)
+    args = parser.parse_args()
+
+    items = [make_item(i) for i in range(args.items)]
+
+    with open(OUTPUT_SPEC_PATH) as f:
+        draft7 = Draft7Validator(json.load(f))
+    compiled = DefaultOutputSchemaValidator()
+    pipeline = ValidateJsonPipeline()
+    item_dicts = [ItemAdapter(item).asdict() for item in items]
+
+    def previous_json_writer(item):
+        with open(OUTPUT_SPEC_PATH) as f:
+            Draft7Validator(json.load(f)).validate(ItemAdapter(item).asdict())
+
+    baseline = run("Draft7Validator.validate(asdict(item))", lambda item: draft7.validate(ItemAdapter(item).asdict()), items)
+    current = run("ValidateJsonPipeline.process_item (compiled)", lambda item: pipeline.process_item(item, None), items)
+    run("Draft7Validator.validate, dict only", draft7.validate, item_dicts)
+    run("compiled validate_dict, dict only", compiled.validate_dict, item_dicts)
+    run("schema re-read per item (previous JsonWriterPipeline)", previous_json_writer, items[: max(len(items) // 20, 1)])
+    print(f"\npipeline speedup: {baseline / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
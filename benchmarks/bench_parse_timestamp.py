@@ -0,0 +1,84 @@
+"""
+Dates/sec for parse_timestamp over the publication dates in output_samples/*.json,
+the previous pandas.to_datetime per call vs strptime with formats learned per string shape
+
+    python -m benchmarks.bench_parse_timestamp [--repeat 3]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from dataPipelines.gc_scrapy.gc_scrapy import utils
+from dataPipelines.gc_scrapy.gc_scrapy.utils import parse_timestamp
+
+OUTPUT_SAMPLES_DIR = Path(utils.__file__).parent / "output_samples"
+
+
+def load_dates():
+    dates = []
+    for path in sorted(OUTPUT_SAMPLES_DIR.glob("*.json")):
+        for line in path.read_text().splitlines():
+            try:
+                jdoc = json.loads(line)
+            except ValueError:
+                continue
+            for key in ("publication_date", "access_timestamp"):
+                if isinstance(jdoc.get(key), str):
+                    dates.append(jdoc[key])
+    return dates
+
+
+def pandas_parse_timestamp(ts):
+    """Previous implementation"""
+    import pandas
+
+    try:
+        ts = pandas.to_datetime(ts).to_pydatetime()
+        return None if str(ts) == "NaT" else ts
+    except:
+        return None
+
+
+def run(label, func, dates, repeat):
+    best = min(_time(func, dates) for _ in range(repeat))
+    print(f"{label:<45} {len(dates) / best:>12,.0f} dates/sec")
+    return best
+
+
+def _time(func, dates):
+    start = perf_counter()
+    for ts in dates:
+        func(ts)
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dates = load_dates()
+    print(f"{len(dates):,} dates, {len(set(dates)):,} distinct, from {OUTPUT_SAMPLES_DIR}")
+
+    start = perf_counter()
+    import pandas  # noqa: F401
+    print(f"{'pandas import':<45} {perf_counter() - start:>12.3f} s (skipped when every date matches a format)")
+
+    mismatches = [ts for ts in dates if parse_timestamp(ts) != pandas_parse_timestamp(ts)]
+    if mismatches:
+        print(f"{len(mismatches)} dates parse differently from pandas, e.g. {mismatches[:5]}")
+        sys.exit(1)
+
+    utils._learned_timestamp_formats.clear()
+    cold = run("parse_timestamp, first pass (learning)", parse_timestamp, dates, 1)
+    baseline = run("pandas.to_datetime (previous)", pandas_parse_timestamp, dates, args.repeat)
+    current = run("parse_timestamp, learned formats", parse_timestamp, dates, args.repeat)
+    shapes = utils._learned_timestamp_formats
+    print(f"\n{len(shapes)} shapes learned, {sum(fmt is None for fmt in shapes.values())} left to pandas")
+    print(f"speedup: {baseline / current:.1f}x (first pass {baseline / cold:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
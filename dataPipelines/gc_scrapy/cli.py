@@ -1,14 +1,31 @@
 import click
 from textwrap import dedent
 
-from scrapy.crawler import CrawlerRunner
+from scrapy.crawler import Crawler, CrawlerRunner
 import importlib
 import os
 from scrapy.utils.project import get_project_settings
 from scrapy.utils.spider import iter_spider_classes
 from twisted.internet import reactor, defer
 from dataPipelines.notification import slack
+from dataPipelines.gc_scrapy.gc_scrapy.GCSpider import GCSpider
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.blob_store import BLOB_DIR_NAME, DUPLICATES_FILE_NAME
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.compaction import compact_manifests
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.reader import verify_manifest_checksum
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.shards import merge_shard_files, shard_path
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.validator_store import ValidatorStore
+from dataPipelines.gc_scrapy.gc_scrapy.run_history import (
+    RunHistory, module_name, order_longest_first, partition_longest_first
+)
+from dataPipelines.gc_scrapy.gc_scrapy.schedule_balancer import (
+    WEEK_DAYS, balance_week, format_week_report, spider_hosts, week_report
+)
+from dataPipelines.gc_scrapy.gc_scrapy.spider_registry import SPIDERS_PACKAGE, default_registry
 import copy
+import json
+import subprocess
+import sys
+import tempfile
 from pathlib import Path
 
 ####
@@ -89,6 +106,104 @@ def cli():
     required=False,
     type=click.BOOL
 )
+@click.option(
+    '--http-cache-location',
+    help='SQLite file of ETag/Last-Modified validators from previous runs, created if missing, enables conditional downloads',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    default=None,
+    required=False
+)
+@click.option(
+    '--rate-state-location',
+    help='JSON file of per host request limits learned by AdaptiveRateMiddleware, created if missing',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    default=None,
+    required=False
+)
+@click.option(
+    '--user-agent-health-location',
+    help='JSON file of per domain user agent health scores kept by BanEvasionMiddleware, created if missing',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    default=None,
+    required=False
+)
+@click.option(
+    '--max-parallel-spiders',
+    help='Crawl up to this many spiders at once in the same process, CONCURRENT_REQUESTS is split between them',
+    type=click.IntRange(min=1),
+    default=1,
+    required=False
+)
+@click.option(
+    '--run-history-location',
+    help='JSON file of previous run times per spider, created if missing, longest running spiders are started first',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    default=None,
+    required=False
+)
+@click.option(
+    '--selenium-spiders',
+    help='Run selenium spiders along with the others, skip them, or only run them',
+    type=click.Choice(['include', 'skip', 'only']),
+    default='include',
+    required=False
+)
+@click.option(
+    '--workers',
+    help='Split the spiders across this many worker processes, their outputs and manifests are merged when all are done',
+    type=click.IntRange(min=1),
+    default=1,
+    required=False
+)
+@click.option(
+    '--shard-id',
+    help='Set by --workers on the worker processes, suffixes the files the worker writes',
+    type=int,
+    default=None,
+    required=False,
+    hidden=True
+)
+@click.option(
+    '--stats-output-location',
+    help='Set by --workers on the worker processes, json file to write the spider stats to instead of sending them',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    default=None,
+    required=False,
+    hidden=True
+)
+@click.option(
+    '--concurrency-share',
+    help='Set by --workers on the worker processes, the worker\'s share of CONCURRENT_REQUESTS',
+    type=click.IntRange(min=1),
+    default=None,
+    required=False,
+    hidden=True
+)
 def crawl(
     download_output_dir,
     crawler_output_location,
@@ -97,6 +212,16 @@ def crawl(
     slack_hook_channel_id,
     slack_hook_url,
     dont_filter_previous_hashes,
+    http_cache_location,
+    rate_state_location,
+    user_agent_health_location,
+    max_parallel_spiders,
+    run_history_location,
+    selenium_spiders,
+    workers,
+    shard_id,
+    stats_output_location,
+    concurrency_share,
 ):
     print(dedent(f"""
     CRAWLING INITIATED
@@ -109,20 +234,36 @@ def crawl(
     slack_hook_channel_id={slack_hook_channel_id}
     slack_hook_url={slack_hook_url}
     dont_filter_previous_hashes={dont_filter_previous_hashes}
+    http_cache_location={http_cache_location}
+    rate_state_location={rate_state_location}
+    user_agent_health_location={user_agent_health_location}
+    max_parallel_spiders={max_parallel_spiders}
+    run_history_location={run_history_location}
+    selenium_spiders={selenium_spiders}
+    workers={workers}
+    shard_id={shard_id}
     """))
 
-    current_dir = os.path.dirname(os.path.realpath(__file__))
+    # spiders are listed, validated and filtered from the registry, only the ones that run get imported
+    spider_registry = default_registry()
     spiders_to_run = []
     if spiders_file_location:
         with open(spiders_file_location) as f:
             for line in f.readlines():
                 if line.strip():
                     spiders_to_run.append(line.strip())
+        for s in spiders_to_run:
+            if not spider_registry.get(module_name(s)):
+                print(f'No spider found in gc_scrapy/spiders for {s}, skipping')
+        spiders_to_run = [s for s in spiders_to_run if spider_registry.get(module_name(s))]
     else:
         print('No spider file location specified, running everything in')
+        spiders_to_run = spider_registry.spider_modules()
+
+    if selenium_spiders != 'include':
         spiders_to_run = [
-            f.name for f in Path(f'{current_dir}/gc_scrapy/spiders').iterdir()
-            if f.is_file() and not f.name.startswith("_")
+            s for s in spiders_to_run
+            if spider_registry.get(module_name(s))['selenium'] == (selenium_spiders == 'only')
         ]
 
     if not spiders_to_run:
@@ -132,45 +273,464 @@ def crawl(
         else:
             raise RuntimeError('NO SPIDERS FOUND IN SPIDERS DIR... EXITING')
 
+    run_history = RunHistory()
+    if run_history_location:
+        run_history.load(run_history_location)
+    # longest processing time first, so the slowest spiders don't start last and hold up the job
+    predicted_durations = run_history.predicted_durations(spiders_to_run)
+    spiders_to_run = order_longest_first(spiders_to_run, predicted_durations)
+
+    if http_cache_location and shard_id is None and os.path.isfile(http_cache_location):
+        # validators are only committed by `manifest merge`, anything left staged is from a job that failed
+        store = ValidatorStore(http_cache_location)
+        print(f'Discarded {store.discard_staged()} uncommitted http validators from a previous job')
+        store.close()
+
     print('Done resolving spiders, will run', len(spiders_to_run))
     for s in spiders_to_run:
-        print(' - ', s)
+        if run_history_location:
+            print(' - ', s, f'(~{predicted_durations[s]:.0f}s)')
+        else:
+            print(' - ', s)
     print()
 
+    selenium_to_run = {s for s in spiders_to_run if spider_registry.get(module_name(s))['selenium']}
+    if workers == 1 and max_parallel_spiders > 1 and 0 < len(selenium_to_run) < len(spiders_to_run):
+        # selenium spiders block the reactor they crawl in, the http spiders crawling next to them would time out
+        print('Running the selenium spiders in a worker of their own')
+        workers = 2
+
+    if workers > 1:
+        shards = partition_workers(spiders_to_run, predicted_durations, workers, selenium_to_run)
+        worker_args = {
+            'download-output-dir': download_output_dir,
+            'previous-manifest-location': previous_manifest_location,
+            'dont-filter-previous-hashes': dont_filter_previous_hashes,
+            'http-cache-location': http_cache_location,
+            'rate-state-location': rate_state_location,
+            'user-agent-health-location': user_agent_health_location,
+            'max-parallel-spiders': max_parallel_spiders,
+            # every worker has its own downloader, so the global limit is split between them
+            'concurrency-share': max(1, get_project_settings().getint('CONCURRENT_REQUESTS') // len(shards)),
+        }
+        for shard_id, shard_spiders in enumerate(shards):
+            shard_seconds = sum(predicted_durations[s] for s in shard_spiders)
+            print(f'Worker {shard_id}: {len(shard_spiders)} spiders, ~{shard_seconds:.0f}s predicted')
+        all_stats = run_workers(shards, worker_args, download_output_dir, crawler_output_location)
+        record_run_history(run_history, run_history_location, all_stats)
+        send_stats(all_stats=all_stats, slack_hook_channel_id=slack_hook_channel_id, slack_hook_url=slack_hook_url)
+        return
+
     settings = get_project_settings()
     settings.set('FEED_URI', crawler_output_location)
+    if rate_state_location:
+        settings.set('ADAPTIVE_RATE_STATE_PATH', rate_state_location)
+    if user_agent_health_location:
+        settings.set('USER_AGENT_HEALTH_STATE_PATH', user_agent_health_location)
+    if shard_id is not None:
+        settings.set('CRAWL_SHARD_ID', shard_id)
+        # the other workers write to the same http cache
+        settings.set('HTTP_CACHE_COMMIT_EVERY', 1)
+    if concurrency_share:
+        settings.set('CONCURRENT_REQUESTS', concurrency_share)
     runner = CrawlerRunner(settings)
 
-    spider_class_refs = []
-    for spider_module_name in spiders_to_run:
-        try:
-            spider_path = f'dataPipelines.gc_scrapy.gc_scrapy.spiders.{spider_module_name}'
-            spider_class = resolve_spider(spider_path)
-            if not spider_class:
-                print(f'Failed to resolve spider from {spider_path}, skipping')
-                continue
-            spider_class_refs.append(spider_class)
-        except Exception as e:
-            print(e)
-            print('Error running spider at path', spider_path)
-            raise e
+    # spider modules (and whatever they import, bs4, selenium, pandas...) are imported right before each one runs,
+    # so the first crawl starts without paying for all of them
+    spider_paths = [f'{SPIDERS_PACKAGE}.{module_name(s)}' for s in spiders_to_run]
 
     crawl_kwargs = {
         'download_output_dir': download_output_dir,
         'previous_manifest_location': previous_manifest_location,
         'dont_filter_previous_hashes': dont_filter_previous_hashes,
+        'http_cache_location': http_cache_location,
         'output': crawler_output_location
     }
 
+    selenium_paths = {path for s, path in zip(spiders_to_run, spider_paths) if s in selenium_to_run}
+
     try:
-        queue_spiders_sequentially(runner, spider_class_refs, crawl_kwargs)
+        if max_parallel_spiders > 1:
+            queue_spiders_in_parallel(
+                runner, spider_paths, crawl_kwargs, max_parallel_spiders, crawler_output_location, selenium_paths
+            )
+        else:
+            queue_spiders_sequentially(runner, spider_paths, crawl_kwargs, concurrency_share)
         reactor.run()
-        all_stats = copy.deepcopy(spider_class_refs[0].stats)
-        send_stats(all_stats=all_stats, slack_hook_channel_id=slack_hook_channel_id, slack_hook_url=slack_hook_url)
+        all_stats = copy.deepcopy(GCSpider.stats)
+        if stats_output_location:
+            with open(stats_output_location, 'w') as f:
+                json.dump(all_stats, f, default=str)
+        else:
+            record_run_history(run_history, run_history_location, all_stats)
+            send_stats(all_stats=all_stats, slack_hook_channel_id=slack_hook_channel_id, slack_hook_url=slack_hook_url)
     except Exception as e:
         print("ERROR RUNNING SPIDERS SEQUENTIALLY", e)
 
 
+@cli.group(name='manifest')
+def manifest():
+    """Maintenance commands for cumulative manifests"""
+    pass
+
+
+def _compact_manifests_and_report(input_paths, output_location, keep_latest, compress):
+    for input_path in input_paths:
+        if verify_manifest_checksum(input_path) is False:
+            raise click.ClickException(f'Checksum mismatch for manifest {input_path}')
+
+    results = compact_manifests(
+        input_paths=input_paths,
+        output_path=output_location,
+        keep_latest=keep_latest,
+        compress=compress
+    )
+
+    print(dedent(f"""
+    MANIFEST WRITTEN TO {output_location}
+
+    -- COUNTS --
+    rows_read={results['rows_read']}
+    rows_without_hash={results['rows_without_hash']}
+    duplicates_dropped={results['duplicates_dropped']}
+    superseded_dropped={results['superseded_dropped']}
+    rows_written={results['rows_written']}
+    sha256={results['sha256']}
+    """))
+
+
+_keep_latest_option = click.option(
+    '--keep-latest',
+    help='Only keep this many of the most recent versions of each doc_name per crawler',
+    type=click.IntRange(min=1),
+    default=None,
+    required=False
+)
+_compress_option = click.option(
+    '--compress/--no-compress',
+    help='Gzip the output manifest, only for readers that go through manifest_utils (it keeps its name)',
+    default=False
+)
+_output_location_option = click.option(
+    '--output-location',
+    help='File location for the compacted manifest, a .sha256 checksum file is written next to it',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    required=True
+)
+
+
+@manifest.command(name='compact')
+@click.option(
+    '--manifest-location',
+    help='Manifest to compact',
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    required=True
+)
+@_output_location_option
+@_keep_latest_option
+@_compress_option
+def compact(manifest_location, output_location, keep_latest, compress):
+    """Dedupe and sort a manifest by (crawler_used, version_hash)"""
+    _compact_manifests_and_report([manifest_location], output_location, keep_latest, compress)
+
+
+@manifest.command(name='merge')
+@click.option(
+    '--previous-manifest-location',
+    help='Previous cumulative manifest, skipped if it does not exist',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    required=True
+)
+@click.option(
+    '--new-manifest-location',
+    help='Manifest written by the latest crawl, skipped if it does not exist',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    required=True
+)
+@click.option(
+    '--http-cache-location',
+    help='SQLite file the crawl staged ETag/Last-Modified validators in, they are committed once the merge succeeds',
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    default=None,
+    required=False
+)
+@_output_location_option
+@_keep_latest_option
+@_compress_option
+def merge(previous_manifest_location, new_manifest_location, http_cache_location, output_location, keep_latest, compress):
+    """Stream-merge the previous cumulative manifest with a new job manifest"""
+    input_paths = []
+    for manifest_location in (previous_manifest_location, new_manifest_location):
+        if os.path.isfile(manifest_location):
+            input_paths.append(manifest_location)
+        else:
+            print(f'Manifest at {manifest_location} is not a file, skipping it')
+
+    _compact_manifests_and_report(input_paths, output_location, keep_latest, compress)
+
+    # the job's files are uploaded and in the manifest, later runs can revalidate them
+    if http_cache_location and os.path.isfile(http_cache_location):
+        store = ValidatorStore(http_cache_location)
+        print(f'Committed {store.commit_staged()} http validators to {http_cache_location}')
+        store.close()
+
+
+@cli.group(name='schedule')
+def schedule():
+    """Commands for the weekly crawler schedule (paasJobs/crawler_schedule)"""
+    pass
+
+
+def read_schedule_dir(schedule_dir: str) -> dict:
+    """Spiders listed in each day file of the schedule dir, missing days are empty"""
+    week = {}
+    for day in WEEK_DAYS:
+        day_file = Path(schedule_dir, f'{day}.txt')
+        week[day] = []
+        if day_file.is_file():
+            with open(day_file) as f:
+                week[day] = [line.strip() for line in f.readlines() if line.strip()]
+    return week
+
+
+@schedule.command(name='balance')
+@click.option(
+    '--schedule-dir',
+    help='Dir with the <day>.txt spider lists',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+        resolve_path=True
+    ),
+    default=str(Path(__file__).resolve().parents[2] / 'paasJobs' / 'crawler_schedule'),
+    required=False
+)
+@click.option(
+    '--run-history-location',
+    help='Run history json written by crawl --run-history-location',
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True
+    ),
+    required=True
+)
+@click.option(
+    '--window-hours',
+    help="Hours a day's crawl can take, leave room for the rest of the job before the next day's starts",
+    type=click.FloatRange(min=0, min_open=True),
+    default=20.0,
+    required=False
+)
+@click.option(
+    '--max-parallel-spiders',
+    help='Spiders crawled at once by the daily job (crawl --max-parallel-spiders)',
+    type=click.IntRange(min=1),
+    default=1,
+    required=False
+)
+@click.option(
+    '--write/--dry-run',
+    help='Rewrite the day files with the balanced schedule, or only report it',
+    default=False
+)
+def balance(schedule_dir, run_history_location, window_hours, max_parallel_spiders, write):
+    """Spread spiders over the week by predicted run time, bytes downloaded and the hosts they crawl"""
+    current = read_schedule_dir(schedule_dir)
+    spiders = [spider for day in WEEK_DAYS for spider in current[day]]
+    if not spiders:
+        raise click.ClickException(f'No spiders found in the day files of {schedule_dir}')
+
+    run_history = RunHistory()
+    run_history.load(run_history_location)
+    durations = run_history.predicted_durations(spiders)
+    downloaded_bytes = run_history.predicted_bytes_by_module(spiders)
+
+    spider_registry = default_registry()
+    hosts = {}
+    for spider in spiders:
+        entry = spider_registry.get(module_name(spider))
+        hosts[spider] = spider_hosts(entry['allowed_domains'], entry['start_urls']) if entry else set()
+
+    window_seconds = window_hours * 3600
+    balanced = balance_week(
+        spiders, durations, downloaded_bytes, hosts, window_seconds, parallel_spiders=max_parallel_spiders
+    )
+
+    print(format_week_report(
+        week_report(current, durations, downloaded_bytes, hosts, window_seconds, max_parallel_spiders),
+        week_report(balanced, durations, downloaded_bytes, hosts, window_seconds, max_parallel_spiders),
+        window_seconds
+    ))
+
+    if not write:
+        print('\nDry run, pass --write to update the day files')
+        return
+    for day, day_spiders in balanced.items():
+        with open(Path(schedule_dir, f'{day}.txt'), 'w') as f:
+            f.write('\n'.join(day_spiders))
+    print(f'\nDay files written to {schedule_dir}')
+
+
+@schedule.command(name='validate')
+@click.option(
+    '--schedule-dir',
+    help='Dir with the <day>.txt spider lists',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+        resolve_path=True
+    ),
+    default=str(Path(__file__).resolve().parents[2] / 'paasJobs' / 'crawler_schedule'),
+    required=False
+)
+def validate(schedule_dir):
+    """Check every scheduled spider exists and every spider is scheduled, without importing the spiders"""
+    spider_registry = default_registry()
+    scheduled = {}
+    for schedule_file in sorted(Path(schedule_dir).glob('*.txt')):
+        with open(schedule_file) as f:
+            for line in f.readlines():
+                if line.strip():
+                    scheduled.setdefault(module_name(line), []).append(schedule_file.stem)
+
+    errors = []
+    for spider, days in scheduled.items():
+        if not spider_registry.get(spider):
+            errors.append(f'{spider} is scheduled on {", ".join(days)} but is not a spider in gc_scrapy/spiders')
+        elif len(days) > 1:
+            print(f'Warning: {spider} is scheduled more than once: {", ".join(days)}')
+    unscheduled = [spider for spider in spider_registry.spider_modules() if spider not in scheduled]
+    if unscheduled:
+        errors.append(f'Spider(s) not used in a schedule: {unscheduled}')
+
+    spider_names = {}
+    for spider in spider_registry.spider_modules():
+        spider_names.setdefault(spider_registry.get(spider)['name'], []).append(spider)
+    for spider_name, spiders in spider_names.items():
+        if len(spiders) > 1:
+            errors.append(f'Spider name {spider_name} is used by more than one module: {spiders}')
+
+    if errors:
+        raise click.ClickException('\n'.join(errors))
+    print(f'All {len(scheduled)} scheduled spiders found, all spiders are in a schedule file')
+
+
+def run_workers(shards: list, worker_args: dict, download_output_dir: str, crawler_output_location: str) -> dict:
+    """
+    Runs the spiders split across worker processes, each a crawl of its own spiders file with its own reactor,
+    then merges the workers' feed, manifest, dead queue and duplicates shards into the usual files.
+
+    Args:
+        shards: spider module file names of each worker, in the order the worker runs them
+        worker_args: crawl options passed on to every worker, None values are left out
+        download_output_dir: directory the workers download to and write their manifest shards in
+        crawler_output_location: crawler output file, each worker feeds its own shard of it
+
+    Returns:
+        spider stats of every worker, keyed by spider name like GCSpider.stats
+    """
+    if not worker_args['dont-filter-previous-hashes']:
+        from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.index import ManifestIndex
+
+        # built once here instead of by every worker at the same time
+        ManifestIndex.for_manifest(worker_args['previous-manifest-location'])
+
+    all_stats = {}
+    with tempfile.TemporaryDirectory(prefix='crawl_workers_') as work_dir:
+        processes = []
+        for shard_id, shard_spiders in enumerate(shards):
+            spiders_file = Path(work_dir, f'spiders.shard{shard_id}.txt')
+            spiders_file.write_text('\n'.join(shard_spiders) + '\n')
+            command = [
+                sys.executable, '-m', 'dataPipelines.gc_scrapy', 'crawl',
+                f'--crawler-output-location={shard_path(crawler_output_location, shard_id)}',
+                f'--spiders-file-location={spiders_file}',
+                f'--shard-id={shard_id}',
+                f'--stats-output-location={Path(work_dir, f"stats.shard{shard_id}.json")}',
+                *(f'--{name}={value}' for name, value in worker_args.items() if value is not None),
+            ]
+            print(f'Starting crawl worker {shard_id} for', ', '.join(shard_spiders))
+            processes.append(subprocess.Popen(command))
+
+        for shard_id, process in enumerate(processes):
+            return_code = process.wait()
+            if return_code:
+                print(f'Crawl worker {shard_id} exited with {return_code}')
+            try:
+                with open(Path(work_dir, f'stats.shard{shard_id}.json')) as f:
+                    all_stats.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f'No stats from crawl worker {shard_id}:', e)
+
+    shard_ids = range(len(shards))
+    for output_path in (
+        Path(crawler_output_location),
+        Path(download_output_dir, 'manifest.json'),
+        Path(download_output_dir, 'dead_queue.json'),
+        Path(download_output_dir, BLOB_DIR_NAME, DUPLICATES_FILE_NAME),
+    ):
+        merged = merge_shard_files([shard_path(output_path, shard_id) for shard_id in shard_ids], output_path)
+        print(f'Merged {merged} worker shards into {output_path}')
+
+    return all_stats
+
+
+def partition_workers(spiders: list, durations: dict, workers: int, selenium_spiders: set) -> list:
+    """
+    Splits the spiders across the workers longest first, selenium spiders get a worker of their own
+    so they don't block the reactor of workers crawling plain http spiders
+
+    Returns:
+        spiders of each worker, empty workers are dropped
+    """
+    http_spiders = [s for s in spiders if s not in selenium_spiders]
+    if len(http_spiders) in (0, len(spiders)):
+        return partition_longest_first(spiders, durations, workers)
+    return partition_longest_first(http_spiders, durations, workers - 1) + [
+        order_longest_first([s for s in spiders if s in selenium_spiders], durations)
+    ]
+
+
+def record_run_history(run_history: RunHistory, run_history_location: str, all_stats: dict) -> None:
+    if not run_history_location:
+        return
+    for spider_name, stats in all_stats.items():
+        run_history.record(spider_name, stats)
+    try:
+        run_history.save(run_history_location)
+    except OSError as e:
+        print('Failed to save run history', e)
+
+
 def get_git_branch() -> str:
     """
     Get the git branch to be logged.
@@ -209,19 +769,33 @@ def send_stats(all_stats: dict, slack_hook_channel_id: str, slack_hook_url: str)
 
 
 @defer.inlineCallbacks
-def queue_spiders_sequentially(runner: CrawlerRunner, spiders: list, crawl_kwargs: dict) -> None:
+def queue_spiders_sequentially(runner: CrawlerRunner, spiders: list, crawl_kwargs: dict,
+                               concurrency_share: int = None) -> None:
     """
     Args:
         runner: CrawlerRunner instance
-        spiders: list of spider class references to run
+        spiders: list of spider class references or spider module paths to run,
+            paths are resolved when the spider's turn comes
         crawl_kwards: dict of args to pass CrawlerRunner
+        concurrency_share: caps each spider's CONCURRENT_REQUESTS, custom_settings included, when set
     """
 
     try:
         for spider in spiders:
+            if isinstance(spider, str):
+                spider_path = spider
+                spider = resolve_spider(spider_path)
+                if not spider:
+                    print(f'Failed to resolve spider from {spider_path}, skipping')
+                    continue
+            crawler = spider
+            if concurrency_share:
+                crawler = Crawler(spider, parallel_crawler_settings(
+                    runner.settings, spider, concurrency_share, runner.settings['FEED_URI']
+                ))
             try:
                 yield runner.crawl(
-                    spider,
+                    crawler,
                     **crawl_kwargs
                 )
             except Exception as e:
@@ -236,6 +810,89 @@ def queue_spiders_sequentially(runner: CrawlerRunner, spiders: list, crawl_kwarg
             exit(1)
 
 
+@defer.inlineCallbacks
+def queue_spiders_in_parallel(runner: CrawlerRunner, spiders: list, crawl_kwargs: dict, max_parallel: int,
+                              output_location: str, selenium_spiders: frozenset = frozenset()) -> None:
+    """
+    Keeps up to max_parallel spiders crawling, starting the next one in order as soon as one finishes.
+    Selenium spiders block the reactor while they drive a browser, so they get a lane of their own
+    where only one crawls at a time, next to max_parallel - 1 of the others. crawl doesn't mix them,
+    it runs the selenium spiders in a worker process of their own.
+
+    Args:
+        runner: CrawlerRunner instance
+        spiders: list of spider class references or spider module paths to run,
+            paths are resolved when the spider's turn comes
+        crawl_kwargs: dict of args to pass CrawlerRunner
+        max_parallel: most spiders crawling at once
+        output_location: crawler output file, each spider feeds its own part file which are appended to it
+            in spider order once every spider is done, so lines of spiders running at once don't interleave
+        selenium_spiders: which of spiders use selenium
+    """
+    selenium_count = sum(spider in selenium_spiders for spider in spiders)
+    http_lane_size = max_parallel - 1 if 0 < selenium_count < len(spiders) else max_parallel
+    lanes = {True: defer.DeferredSemaphore(1), False: defer.DeferredSemaphore(http_lane_size)}
+    # every crawler has its own downloader, so the global limit is split between the ones running at once
+    concurrency_share = max(1, runner.settings.getint('CONCURRENT_REQUESTS') // max_parallel)
+    feed_parts = [f'{output_location}.part{i}' for i in range(len(spiders))]
+
+    try:
+        yield defer.DeferredList([
+            lanes[spider in selenium_spiders].run(
+                crawl_with_concurrency_share, runner, spider, crawl_kwargs, concurrency_share, feed_part
+            )
+            for spider, feed_part in zip(spiders, feed_parts)
+        ])
+    finally:
+        merge_shard_files(feed_parts, output_location)
+        print("Done running spiders, stopping twisted.reactor and sending stats")
+        try:
+            reactor.stop()
+        except Exception as e:
+            print(e)
+            exit(1)
+
+
+def crawl_with_concurrency_share(runner: CrawlerRunner, spider, crawl_kwargs: dict, concurrency_share: int,
+                                 feed_uri: str) -> defer.Deferred:
+    """Crawl one spider of a parallel run, errors are printed so the other spiders carry on"""
+    if isinstance(spider, str):
+        spider_path = spider
+        spider = resolve_spider(spider_path)
+        if not spider:
+            print(f'Failed to resolve spider from {spider_path}, skipping')
+            return defer.succeed(None)
+
+    crawler = Crawler(spider, parallel_crawler_settings(runner.settings, spider, concurrency_share, feed_uri))
+
+    def crawl_failed(failure):
+        print(f'ERROR RUNNING SPIDER CLASS: {spider}')
+        print(failure.value)
+
+    return runner.crawl(crawler, **crawl_kwargs).addErrback(crawl_failed)
+
+
+def parallel_crawler_settings(settings, spidercls, concurrency_share: int, feed_uri: str):
+    """
+    Settings for a spider crawling next to others: its CONCURRENT_REQUESTS (and AdaptiveRateMiddleware's max) are
+    capped to its share of the global limit, per domain settings from its custom_settings are left alone
+    """
+    spider_settings = settings.copy()
+    spidercls.update_settings(spider_settings)
+    concurrency = min(spider_settings.getint('CONCURRENT_REQUESTS'), concurrency_share)
+
+    crawler_settings = settings.copy()
+    # cmdline priority is above the spider's custom_settings, which Crawler applies on top of these
+    crawler_settings.set('CONCURRENT_REQUESTS', concurrency, priority='cmdline')
+    crawler_settings.set(
+        'ADAPTIVE_RATE_MAX_CONCURRENCY',
+        min(spider_settings.getint('ADAPTIVE_RATE_MAX_CONCURRENCY', concurrency), concurrency),
+        priority='cmdline'
+    )
+    crawler_settings.set('FEED_URI', feed_uri, priority='cmdline')
+    return crawler_settings
+
+
 def resolve_spider(spider_path):
     """
     Args:
@@ -251,8 +908,10 @@ def resolve_spider(spider_path):
     try:
         module_path = spider_path.strip().replace('.py', '')
         spider_module = importlib.import_module(module_path)
-        spider = next(iter_spider_classes(spider_module))
-        return spider
+        entry = default_registry().get(module_name(module_path))
+        if entry:
+            return getattr(spider_module, entry['class_name'])
+        return next(iter_spider_classes(spider_module))
 
     except Exception as e:
         print('Error getting spider to run:', e)
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
+from time import perf_counter
+from twisted.internet import reactor
+from twisted.python.threadable import isInIOThread
 import typing
 
 from dataPipelines.gc_scrapy.gc_scrapy.runspider_settings import general_settings, selenium_settings
@@ -22,20 +26,25 @@ class GCSeleniumSpider(GCSpider):
 
     selenium_spider_start_request_retries_allowed: int = 5
     selenium_spider_start_request_retry_wait: int = 30
+    # request every start url instead of only the first, they render concurrently on the SeleniumMiddleware driver pool
+    selenium_request_all_start_urls: bool = False
 
     def start_requests(self):
         """
             Applies selenium_request_overrides dict and returns a selenium response instead of standard scrapy response
         """
 
-        opts = {
-            "url": self.start_urls[0],
-            "callback": self.parse,
-            "wait_time": 5,
-            **self.selenium_request_overrides
-        }
+        start_urls = self.start_urls if self.selenium_request_all_start_urls else self.start_urls[:1]
+        for start_url in start_urls:
+            opts = {
+                "url": start_url,
+                "callback": self.parse,
+                "wait_time": 5,
+                **self.selenium_request_overrides,
+                "meta": {**self.selenium_request_overrides.get("meta", {}), "start_url": start_url},
+            }
 
-        yield SeleniumRequest(**opts)
+            yield SeleniumRequest(**opts)
 
     @staticmethod
     def wait_until_css_clickable(driver, css_selector: str, wait: typing.Union[int, float] = 5):
@@ -57,3 +66,74 @@ class GCSeleniumSpider(GCSpider):
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, css_selector)
             ))
+
+    # js returning something that changes while the page is still loading or rendering
+    DOM_SNAPSHOT_SCRIPT = (
+        "return [document.readyState, document.getElementsByTagName('*').length,"
+        " document.body ? document.body.innerHTML.length : 0];"
+    )
+
+    def wait_for_dom_stable(self, driver, timeout: typing.Union[int, float] = 10, quiet_period: float = 0.75,
+                            poll: float = 0.25) -> bool:
+        """
+            Waits until the page has loaded and the DOM hasn't changed for quiet_period seconds, instead of sleeping
+            a fixed time. Returns False if it was still changing after timeout, the page is used as is in that case
+        """
+        last = {"snapshot": None, "changed_at": perf_counter()}
+
+        def dom_stable(driver):
+            snapshot = driver.execute_script(self.DOM_SNAPSHOT_SCRIPT)
+            # fast mode drivers use an eager page load strategy and can stop at interactive
+            if snapshot[0] == "loading" or snapshot != last["snapshot"]:
+                last["snapshot"], last["changed_at"] = snapshot, perf_counter()
+                return False
+            return perf_counter() - last["changed_at"] >= quiet_period
+
+        return self._timed_wait("dom_stable", driver, dom_stable, timeout, poll)
+
+    def wait_for_table_rows(self, driver, row_css_selector: str, min_rows: int = 1,
+                            timeout: typing.Union[int, float] = 10, quiet_period: float = 0.5,
+                            poll: float = 0.25) -> int:
+        """
+            Waits until at least min_rows elements match row_css_selector and their count hasn't changed for
+            quiet_period seconds, for tables filled in by js. Returns the row count, 0 if it timed out first
+        """
+        last = {"count": None, "changed_at": perf_counter()}
+
+        def rows_stable(driver):
+            count = len(driver.find_elements(By.CSS_SELECTOR, row_css_selector))
+            if count < min_rows or count != last["count"]:
+                last["count"], last["changed_at"] = count, perf_counter()
+                return False
+            return perf_counter() - last["changed_at"] >= quiet_period
+
+        if not self._timed_wait("table_rows", driver, rows_stable, timeout, poll):
+            return 0
+        return last["count"]
+
+    def _timed_wait(self, name: str, driver, condition, timeout: typing.Union[int, float], poll: float) -> bool:
+        """Runs a WebDriverWait and keeps how long it took and whether it timed out in the crawl stats"""
+        start = perf_counter()
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+            timed_out = False
+        except TimeoutException:
+            print(f"{self.name} : {name} wait timed out after {timeout}s, continuing with the page as is")
+            timed_out = True
+
+        self._inc_stat(f"selenium_wait/{name}/count")
+        self._inc_stat(f"selenium_wait/{name}/time_total", round(perf_counter() - start, 3))
+        if timed_out:
+            self._inc_stat(f"selenium_wait/{name}/timeout_count")
+        return not timed_out
+
+    def _inc_stat(self, key: str, count: typing.Union[int, float] = 1) -> None:
+        """Waits also run in SeleniumRequest driver_callbacks on the driver pool's threads, stats are only
+        updated from the reactor thread"""
+        crawler = getattr(self, "crawler", None)
+        if crawler is None:
+            return
+        if isInIOThread():
+            crawler.stats.inc_value(key, count)
+        else:
+            reactor.callFromThread(crawler.stats.inc_value, key, count)
@@ -6,7 +6,7 @@ from urllib.parse import urljoin, urlparse
 from os.path import splitext
 from time import perf_counter
 import urllib
-from dataPipelines.gc_scrapy.gc_scrapy.runspider_settings import general_settings
+from dataPipelines.gc_scrapy.gc_scrapy.runspider_settings import general_settings, streaming_download_handlers
 import copy
 
 url_re = re.compile("((http|https)://)(www.)?" +
@@ -28,6 +28,7 @@ UNKNOWN_FILE_EXTENSION_PLACEHOLDER = "UNKNOWN"
 STATS_BASE = {
     "Required CAC": 0,
     "In Previous Hashes": 0,
+    "Not Modified": 0,
 }
 
 
@@ -43,6 +44,13 @@ class GCSpider(scrapy.Spider):
         if self.time_lifespan:
             self.start_time = perf_counter()
 
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        if cls.stream_downloads:
+            handlers = {**settings.getdict("DOWNLOAD_HANDLERS"), **streaming_download_handlers}
+            settings.set("DOWNLOAD_HANDLERS", handlers, priority="spider")
+
     def __del__(self):
         if self.time_lifespan:
             alive = perf_counter() - self.start_time
@@ -54,6 +62,7 @@ class GCSpider(scrapy.Spider):
         from_default_stats = {
             "elapsed_time_seconds": "Elapsed Time (sec)",
             "item_scraped_count": "Item Scraped Count",
+            "downloader/response_bytes": "Response Bytes",
         }
 
         for k, v in spider.crawler.stats._stats.items():
@@ -63,6 +72,8 @@ class GCSpider(scrapy.Spider):
                 spider.stats[spider.name][readable_key] = v
 
         spider.stats[spider.name]['Close Reason'] = reason
+        # lets the crawl cli's run history match spiders to the modules listed in schedule files
+        spider.stats[spider.name]['Spider Module'] = type(spider).__module__.rsplit('.', 1)[-1]
         super().close(spider, reason)
 
     # this class init/del timer
@@ -76,6 +87,12 @@ class GCSpider(scrapy.Spider):
     source_page_url = None
     dont_filter_previous_hashes = False
     download_request_headers = {}
+    # pipelines.py#FileDownloadPipeline streams files to disk instead of buffering them in memory (through
+    # download_handlers.py#StreamingDownloadHandler, which update_settings sets for these spiders only),
+    # ignored for spiders that override download_response_handler since that needs the whole body
+    stream_downloads: bool = False
+    # sqlite file of ETag/Last-Modified per download url, FileDownloadPipeline makes conditional requests if set
+    http_cache_location: typing.Optional[str] = None
 
     stats: dict = {}
 
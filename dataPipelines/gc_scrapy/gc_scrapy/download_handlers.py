@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.download_handlers
+-----------------
+Download handler that streams response bodies straight to disk.
+
+StreamedBody stands in for the BytesIO scrapy's http11 response reader buffers bodies in, each chunk is written
+to a temp ``.part`` file while the sha256 and size are computed, so memory use is bounded by the write buffer
+instead of the file size. That relies on scrapy internals, so the handler is only set in the DOWNLOAD_HANDLERS of
+spiders with stream_downloads (GCSpider.update_settings) and checks the response reader still buffers in ``_bodybuf`` when it's loaded.
+"""
+import os
+import tempfile
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler, ScrapyAgent, _ResponseReader
+from scrapy.exceptions import NotConfigured
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+
+
+def response_reader_buffers_in_bodybuf() -> bool:
+    """Whether scrapy's _ResponseReader still creates, writes to and reads back its body from _bodybuf"""
+    return all(
+        "_bodybuf" in method.__code__.co_names
+        for method in (_ResponseReader.__init__, _ResponseReader.dataReceived, _ResponseReader._finish_response)
+    )
+
+
+class StreamingDownloadHandler(HTTP11DownloadHandler):
+    """HTTP(S) handler that writes the bodies of requests marked with meta["stream_to_dir"] straight to a temp file
+    in that dir instead of memory. They're still scheduled by the downloader slots and go through every downloader
+    middleware (delays, retries, ban evasion, adaptive rate), only where the body ends up differs.
+    Successful responses have an empty body, the temp file, sha256 and size are in response.meta["streamed_file"]
+    """
+
+    def __init__(self, settings, crawler=None):
+        if not response_reader_buffers_in_bodybuf():
+            raise NotConfigured(
+                "scrapy's http11 _ResponseReader no longer buffers bodies in _bodybuf, "
+                "StreamingDownloadHandler needs updating for this scrapy version"
+            )
+        super().__init__(settings, crawler)
+        self.buffer_size = settings.getint("STREAM_DOWNLOAD_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+
+    def download_request(self, request, spider):
+        temp_dir = request.meta.get("stream_to_dir")
+        if not temp_dir:
+            return super().download_request(request, spider)
+
+        # the body is on disk before HttpCompressionMiddleware sees the response, so it can't be decompressed
+        request.headers[b"Accept-Encoding"] = b"identity"
+        agent = StreamingScrapyAgent(
+            temp_dir,
+            self.buffer_size,
+            contextFactory=self._contextFactory,
+            pool=self._pool,
+            maxsize=getattr(spider, "download_maxsize", self._default_maxsize),
+            warnsize=getattr(spider, "download_warnsize", self._default_warnsize),
+            fail_on_dataloss=self._fail_on_dataloss,
+            crawler=self._crawler,
+        )
+        return agent.download_request(request)
+
+
+class StreamingScrapyAgent(ScrapyAgent):
+    """Hands 2xx response bodies to a StreamedBody, other responses are read into memory for error handling"""
+
+    def __init__(self, temp_dir, buffer_size, **kwargs):
+        super().__init__(**kwargs)
+        self.temp_dir = temp_dir
+        self.buffer_size = buffer_size
+        self.streamed_body = None
+
+    def download_request(self, request):
+        dfd = super().download_request(request)
+        dfd.addCallbacks(self._cb_streamed, self._eb_streamed, callbackArgs=(request,))
+        return dfd
+
+    def _cb_bodyready(self, txresponse, request):
+        if 200 <= txresponse.code < 300:
+            deliver_body = txresponse.deliverBody
+
+            def deliver_to_file(reader):
+                # scrapy's _ResponseReader only writes to, reads back and truncates its body buffer
+                reader._bodybuf = self.streamed_body = StreamedBody(self.temp_dir, self.buffer_size)
+                deliver_body(reader)
+
+            txresponse.deliverBody = deliver_to_file
+        return super()._cb_bodyready(txresponse, request)
+
+    def _cb_streamed(self, response, request):
+        if self.streamed_body is not None and self.streamed_body.path is not None:
+            request.meta["streamed_file"] = self.streamed_body.as_meta()
+            stats = self._crawler.stats
+            stats.inc_value("stream_download/file_count")
+            stats.inc_value("stream_download/bytes", self.streamed_body.size)
+            # DownloaderStats only sees the empty body, run history predictions use this total
+            stats.inc_value("downloader/response_bytes", self.streamed_body.size)
+        else:
+            # retried requests keep the meta of the attempt before them
+            request.meta.pop("streamed_file", None)
+        return response
+
+    def _eb_streamed(self, failure):
+        if self.streamed_body is not None:
+            self.streamed_body.discard()
+        return failure
+
+
+class StreamedBody:
+    """Body of a response being written to a temp file in temp_dir, the file is only created once data arrives
+    :param temp_dir: directory for the temp file, should be on the same filesystem as the final path so it can be renamed
+    :param buffer_size: bytes buffered before they're written to the file
+    """
+
+    def __init__(self, temp_dir: Union[str, Path], buffer_size: int = DEFAULT_CHUNK_SIZE):
+        self.temp_dir = Path(temp_dir)
+        self.buffer_size = buffer_size
+        self.path: Optional[Path] = None
+        self.size = 0
+        self._digest = sha256()
+        self._file = None
+
+    def write(self, data: bytes) -> None:
+        if self._file is None:
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=PART_SUFFIX)
+            self._file = os.fdopen(fd, "wb", buffering=self.buffer_size)
+            self.path = Path(temp_path)
+        self._file.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    def getvalue(self) -> bytes:
+        """Called once the body is complete, the body stays on disk so the response gets an empty one"""
+        self.close()
+        return b""
+
+    def truncate(self, size: int = 0) -> None:
+        """Called when the download is cancelled for going over DOWNLOAD_MAXSIZE"""
+        self.discard()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """Close and remove the temp file, for downloads that failed part way"""
+        self.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def as_meta(self) -> Dict[str, Union[str, int]]:
+        return {"path": str(self.path), "sha256": self._digest.hexdigest(), "size": self.size}
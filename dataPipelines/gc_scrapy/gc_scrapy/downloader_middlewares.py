@@ -1,14 +1,30 @@
 from random import choice
-from time import sleep
+from time import sleep, time
 
 from scrapy import signals
 from scrapy.exceptions import NotConfigured
 from scrapy.http import HtmlResponse
-from selenium.webdriver.support.ui import WebDriverWait
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import defer, reactor
+from twisted.internet.error import TCPTimedOutError, TimeoutError as TwistedTimeoutError
 from importlib import import_module
+from weakref import WeakKeyDictionary
 
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.adaptive_rate import AdaptiveRateController
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.delay_scheduler import DomainDelayScheduler
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_fast_mode import (
+    apply_fast_mode_options,
+    blocked_url_patterns,
+)
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_pool import SeleniumDriverPool
 from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_request import SeleniumRequest
-from selenium.common.exceptions import TimeoutException
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.user_agent_health import UserAgentHealth
+from dataPipelines.gc_scrapy.gc_scrapy.runspider_settings import general_settings
+from dataPipelines.gc_scrapy.gc_scrapy.utils import LazyModule
+
+# only selenium spiders need these, don't pay for importing selenium in every other spider
+selenium_ui = LazyModule("selenium.webdriver.support.ui")
+selenium_exceptions = LazyModule("selenium.common.exceptions")
 
 
 user_agent_list = (
@@ -58,8 +74,10 @@ class SeleniumMiddleware:
     # Shamelessly taken from https://github.com/clemfromspace/scrapy-selenium
 
     def __init__(self, driver_name, driver_executable_path,
-                 browser_executable_path, command_executor, driver_arguments):
-        """Initialize the selenium webdriver
+                 browser_executable_path, command_executor, driver_arguments,
+                 pool_size=1, max_pages_per_driver=0, fast_mode=False, blocked_resource_types=(),
+                 blocked_url_patterns=()):
+        """Set up the pool of selenium webdrivers, drivers are started when requests need them
 
         Parameters
         ----------
@@ -73,9 +91,34 @@ class SeleniumMiddleware:
             The path of the executable binary of the browser
         command_executor: str
             Selenium remote server endpoint
+        pool_size: int
+            Most drivers running, and pages rendering, at once
+        max_pages_per_driver: int
+            Pages a driver renders before it's replaced by a new one, 0 to keep drivers for the whole crawl
+        fast_mode: bool
+            Start drivers with images off and an eager page load strategy, and block the resource types and url
+            patterns below on every request that doesn't turn fast_mode off
+        blocked_resource_types: list
+            Resource types fast mode blocks, keys of selenium_fast_mode.RESOURCE_TYPE_PATTERNS
+        blocked_url_patterns: list
+            Url patterns (with * wildcards) fast mode blocks
         """
 
-        webdriver_base_path = f'selenium.webdriver.{driver_name}'
+        self.driver_name = driver_name
+        self.driver_executable_path = driver_executable_path
+        self.browser_executable_path = browser_executable_path
+        self.driver_arguments = driver_arguments
+        self.fast_mode = fast_mode
+        self.blocked_resource_types = list(blocked_resource_types)
+        self.blocked_url_patterns = list(blocked_url_patterns)
+        # patterns last sent to each driver, so devtools is only called when they change
+        self.driver_blocked_urls = WeakKeyDictionary()
+        self.pool = SeleniumDriverPool(self.create_driver, size=pool_size, max_pages=max_pages_per_driver)
+        self.crawler = None
+
+    def create_driver(self):
+        """Start a new webdriver, blocking"""
+        webdriver_base_path = f'selenium.webdriver.{self.driver_name}'
 
         driver_class_module = import_module(f'{webdriver_base_path}.webdriver')
         driver_class = getattr(driver_class_module, 'WebDriver')
@@ -85,28 +128,25 @@ class SeleniumMiddleware:
 
         driver_options = driver_options_class()
 
-        if browser_executable_path:
-            driver_options.binary_location = browser_executable_path
+        if self.browser_executable_path:
+            driver_options.binary_location = self.browser_executable_path
 
-        for argument in driver_arguments:
+        for argument in self.driver_arguments:
             driver_options.add_argument(argument)
 
         # set user agent to not headless
         driver_options.add_argument(
             f'user-agent={user_agent_list[0]}'),
 
-        driver_kwargs = {
-            'executable_path': driver_executable_path,
-            f'{driver_name}_options': driver_options
-        }
+        if self.fast_mode:
+            apply_fast_mode_options(driver_options)
 
         # locally installed driver
-        if driver_executable_path is not None:
-            driver_kwargs = {
-                'executable_path': driver_executable_path,
-                f'{driver_name}_options': driver_options
-            }
-            self.driver = driver_class(**driver_kwargs)
+        driver_kwargs = {
+            'executable_path': self.driver_executable_path,
+            f'{self.driver_name}_options': driver_options
+        }
+        return driver_class(**driver_kwargs)
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -123,30 +163,95 @@ class SeleniumMiddleware:
         if driver_name is None:
             raise NotConfigured('SELENIUM_DRIVER_NAME must be set')
 
-        if driver_executable_path is None and command_executor is None:
-            raise NotConfigured('Either SELENIUM_DRIVER_EXECUTABLE_PATH '
-                                'or SELENIUM_COMMAND_EXECUTOR must be set')
+        if driver_executable_path is None:
+            raise NotConfigured('SELENIUM_DRIVER_EXECUTABLE_PATH must be set')
 
         middleware = cls(
             driver_name=driver_name,
             driver_executable_path=driver_executable_path,
             browser_executable_path=browser_executable_path,
             command_executor=command_executor,
-            driver_arguments=driver_arguments
+            driver_arguments=driver_arguments,
+            pool_size=crawler.settings.getint('SELENIUM_DRIVER_POOL_SIZE', 1),
+            max_pages_per_driver=crawler.settings.getint('SELENIUM_DRIVER_MAX_PAGES', 0),
+            fast_mode=crawler.settings.getbool('SELENIUM_FAST_MODE'),
+            blocked_resource_types=crawler.settings.getlist('SELENIUM_BLOCKED_RESOURCE_TYPES'),
+            blocked_url_patterns=crawler.settings.getlist('SELENIUM_BLOCKED_URL_PATTERNS'),
         )
+        middleware.crawler = crawler
 
+        crawler.signals.connect(
+            middleware.spider_opened, signals.spider_opened)
         crawler.signals.connect(
             middleware.spider_closed, signals.spider_closed)
 
         return middleware
 
+    def spider_opened(self, spider):
+        self.pool.start()
+
     def process_request(self, request, spider):
-        """Process a request using the selenium driver if applicable"""
+        """Render the request on a pooled driver, off the reactor thread.
+        The driver stays leased to the response (meta "driver" / "driver_lease") until its callback is done
+        """
         if not isinstance(request, SeleniumRequest):
             return None
 
+        dfd = self.pool.acquire()
+        dfd.addCallback(self._render_with_lease, request, spider)
+        return dfd
+
+    def _render_with_lease(self, lease, request, spider):
+        def rendered(result):
+            current_url, body, load_time = result
+            # Expose the driver via the "meta" attribute
+            request.meta.update({'driver': lease.driver, 'driver_lease': lease, 'selenium_load_time': load_time})
+            stats = self.crawler.stats
+            stats.inc_value('selenium/page_load_count')
+            stats.inc_value('selenium/page_load_time_total', load_time)
+            stats.max_value('selenium/page_load_time_max', load_time)
+            return HtmlResponse(
+                current_url,
+                body=body,
+                encoding='utf-8',
+                request=request
+            )
+
+        def failed(failure):
+            print('SeleniumMiddleware.process_request - unexpected exception', failure.value)
+            # a crashed browser or lost session can't be reused
+            lease.release(broken=failure.check(selenium_exceptions.WebDriverException) is not None)
+            self.crawler.stats.inc_value('selenium/render_error_count')
+
+        dfd = self.pool.run(self.render, lease.driver, request, spider)
+        dfd.addCallbacks(rendered, failed)
+        return dfd
+
+    def block_urls(self, driver, request):
+        """Send the request's blocked url patterns to a chrome driver, blocking"""
+        fast_mode = self.fast_mode if request.fast_mode is None else request.fast_mode
+        patterns = []
+        if fast_mode:
+            patterns = blocked_url_patterns(
+                self.blocked_resource_types if request.blocked_resource_types is None else request.blocked_resource_types,
+                self.blocked_url_patterns if request.blocked_url_patterns is None else request.blocked_url_patterns,
+            )
+
+        if not hasattr(driver, 'execute_cdp_cmd') or self.driver_blocked_urls.get(driver, []) == patterns:
+            return
+        if driver not in self.driver_blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        self.driver_blocked_urls[driver] = patterns
+
+    def render(self, driver, request, spider):
+        """Load the request in driver, blocking, run on the pool's threads
+        :returns: (current url, utf-8 page source, seconds the page took to load)
+        """
+        self.block_urls(driver, request)
+
         for cookie_name, cookie_value in request.cookies.items():
-            self.driver.add_cookie(
+            driver.add_cookie(
                 {
                     'name': cookie_name,
                     'value': cookie_value
@@ -162,60 +267,109 @@ class SeleniumMiddleware:
             reqs_remaining = retries + 1
             while reqs_remaining:
                 try:
-                    self.driver.get(request.url)
-                    WebDriverWait(self.driver, request.wait_time).until(
+                    start = time()
+                    driver.get(request.url)
+                    selenium_ui.WebDriverWait(driver, request.wait_time).until(
                         request.wait_until
                     )
                     reqs_remaining = 0
-                except TimeoutException:
+                except selenium_exceptions.TimeoutException:
                     reqs_remaining -= 1
                     print(
                         f"{spider.name} : Selenium request timeout, retries remaining = {reqs_remaining}")
                     print(f"Waiting {retry_wait} seconds...")
-                    for _ in range(retry_wait):
-                        sleep(1)
-                except Exception as e:
-                    print(
-                        'SeleniumMiddleware.process_request - unexpected exception', e)
-                    return
+                    # only holds up this driver's thread
+                    sleep(retry_wait)
 
         else:
-            self.driver.get(request.url)
+            start = time()
+            driver.get(request.url)
+        load_time = time() - start
 
         if request.screenshot:
-            request.meta['screenshot'] = self.driver.get_screenshot_as_png()
+            request.meta['screenshot'] = driver.get_screenshot_as_png()
 
         if request.script:
-            self.driver.execute_script(request.script)
+            driver.execute_script(request.script)
 
-        body = str.encode(self.driver.page_source)
+        if request.driver_callback:
+            request.meta['driver_result'] = request.driver_callback(driver, request)
 
-        # Expose the driver via the "meta" attribute
-        request.meta.update({'driver': self.driver})
-
-        return HtmlResponse(
-            self.driver.current_url,
-            body=body,
-            encoding='utf-8',
-            request=request
-        )
+        return driver.current_url, str.encode(driver.page_source), load_time
 
     def spider_closed(self):
-        """Shutdown the driver when spider is closed"""
-
-        self.driver.quit()
+        """Shutdown the drivers when spider is closed"""
+        self.crawler.stats.set_value('selenium/drivers_started', self.pool.created_count)
+        self.crawler.stats.set_value('selenium/drivers_recycled', self.pool.recycled_count)
+        load_count = self.crawler.stats.get_value('selenium/page_load_count')
+        if load_count:
+            load_time_avg = self.crawler.stats.get_value('selenium/page_load_time_total') / load_count
+            self.crawler.stats.set_value('selenium/page_load_time_avg', round(load_time_avg, 3))
+            print(f"SeleniumMiddleware - {load_count} pages, {load_time_avg:.2f}s average load time"
+                  f"{' (fast mode)' if self.fast_mode else ''}")
+        self.pool.close()
 
 
 class BanEvasionMiddleware:
+    """Sets the User-Agent and random request delays. Rotated agents are picked by their health on the request's
+    domain, tracked from raw download outcomes (before retries) and saved to USER_AGENT_HEALTH_STATE_PATH when set
+    """
 
-    def __init__(self):
+    FAILURE_STATUSES = {403, 406, 429}
+
+    def __init__(self, crawler=None):
+        self.crawler = crawler
         self.stable_agent = choice(user_agent_list)
+        burst = crawler.settings.getint("RANDOM_DELAY_BURST", 1) if crawler else 1
+        self.delay_scheduler = DomainDelayScheduler(burst=burst)
+        self.agent_health = UserAgentHealth()
+        self.agent_health_state_path = crawler.settings.get("USER_AGENT_HEALTH_STATE_PATH") if crawler else None
+        self._responded = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signals.spider_closed)
+        # signals see every download attempt, process_response/process_exception here come after RetryMiddleware
+        crawler.signals.connect(middleware.response_downloaded, signals.response_downloaded)
+        crawler.signals.connect(middleware.request_left_downloader, signals.request_left_downloader)
+        return middleware
+
+    def spider_opened(self, spider):
+        if self.agent_health_state_path:
+            self.agent_health.load(self.agent_health_state_path)
+
+    def spider_closed(self, spider):
+        self.crawler.stats.set_value("user_agent_health/quarantine_count", self.agent_health.quarantines)
+        self.crawler.stats.set_value("user_agent_health/table", self.agent_health.stats_table(time()))
+        if self.agent_health_state_path:
+            self.agent_health.save(self.agent_health_state_path)
+
+    def response_downloaded(self, response, request, spider):
+        self._responded.add(request)
+        empty = response.status == 200 and not response.body and request.method != "HEAD"
+        self.record_agent_outcome(request, ok=response.status not in self.FAILURE_STATUSES and not empty)
+
+    def request_left_downloader(self, request, spider):
+        if request in self._responded:
+            self._responded.discard(request)
+        else:
+            # timed out or the connection was dropped
+            self.record_agent_outcome(request, ok=False)
+
+    def record_agent_outcome(self, request, ok):
+        agent = request.headers.get("User-Agent")
+        if agent:
+            domain = urlparse_cached(request).hostname or ""
+            self.agent_health.record(domain, agent.decode("utf-8", "replace"), ok, time())
 
     delays = range(0, 3)
 
     def process_request(self, request, spider):
         if spider.rotate_user_agent:
-            agent = choice(user_agent_list)
+            domain = urlparse_cached(request).hostname or ""
+            agent = self.agent_health.choose(domain, user_agent_list, time())
             request.headers["User-Agent"] = agent
         else:
             request.headers["User-Agent"] = self.stable_agent
@@ -223,11 +377,103 @@ class BanEvasionMiddleware:
         dr = spider.randomly_delay_request
         if dr and not request.meta.get("skip_delay"):
             delay_opts = dr if isinstance(dr, (range, list)) else self.delays
-            delay = choice(delay_opts)
-            # print('delay of', delay)
-            # makes sleep more interruptable
-            for _ in range(delay):
-                try:
-                    sleep(1)
-                except KeyboardInterrupt:
-                    exit(0)
+            # spaces requests to the same domain by a random pick from delay_opts,
+            # waiting on a Deferred instead of sleeping so other domains and the pipelines keep going
+            domain = urlparse_cached(request).hostname or ""
+            dfd = self.delay_scheduler.wait(domain, choice(delay_opts))
+            if dfd is not None and self.crawler:
+                self.crawler.stats.inc_value("random_delay/delayed_count")
+            return dfd
+
+
+class AdaptiveRateMiddleware:
+    """Tunes each host's downloader slot (concurrency and delay) and download timeout with an AdaptiveRateController,
+    raising limits while a host answers quickly and backing off on 403/429/5xx and timeouts.
+    Hosts start at CONCURRENT_REQUESTS_PER_DOMAIN and DOWNLOAD_DELAY and can go up to ADAPTIVE_RATE_MAX_CONCURRENCY and
+    down to ADAPTIVE_RATE_MIN_DELAY, unless the spider set them in its own custom_settings, then they're the limits.
+    Spiders using AutoThrottle are left to it.
+    Learned limits are loaded from / saved to the ADAPTIVE_RATE_STATE_PATH json file when it's set.
+    """
+
+    BACKOFF_STATUSES = {403, 429}
+    TIMEOUT_EXCEPTIONS = (defer.TimeoutError, TwistedTimeoutError, TCPTimedOutError)
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ADAPTIVE_RATE_ENABLED") or settings.getbool("AUTOTHROTTLE_ENABLED"):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.state_path = settings.get("ADAPTIVE_RATE_STATE_PATH")
+        self.default_timeout = settings.getfloat("DOWNLOAD_TIMEOUT")
+        download_delay = settings.getfloat("DOWNLOAD_DELAY")
+        min_delay = settings.getfloat("ADAPTIVE_RATE_MIN_DELAY")
+        if self.set_by_spider(crawler, "DOWNLOAD_DELAY"):
+            min_delay = max(min_delay, download_delay)
+        start_concurrency = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+        max_concurrency = settings.getint("ADAPTIVE_RATE_MAX_CONCURRENCY")
+        if self.set_by_spider(crawler, "CONCURRENT_REQUESTS_PER_DOMAIN"):
+            max_concurrency = min(max_concurrency, start_concurrency)
+        self.controller = AdaptiveRateController(
+            concurrency=(min(start_concurrency, max_concurrency), 1, max_concurrency),
+            delay=(download_delay, min_delay, settings.getfloat("ADAPTIVE_RATE_MAX_DELAY")),
+            timeout=(self.default_timeout, settings.getfloat("ADAPTIVE_RATE_MAX_TIMEOUT")),
+            target_latency=settings.getfloat("ADAPTIVE_RATE_TARGET_LATENCY"),
+            window=settings.getint("ADAPTIVE_RATE_WINDOW"),
+        )
+
+    @staticmethod
+    def set_by_spider(crawler, name):
+        """Whether the spider's custom_settings set name to something other than the general_settings it shares"""
+        custom_settings = getattr(crawler.spidercls, "custom_settings", None) or {}
+        return name in custom_settings and (name not in general_settings or custom_settings[name] != general_settings[name])
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        if self.state_path:
+            self.controller.load(self.state_path)
+
+    def spider_closed(self, spider):
+        stats = self.crawler.stats
+        stats.set_value("adaptive_rate/increase_count", self.controller.increase_count)
+        stats.set_value("adaptive_rate/decrease_count", self.controller.decrease_count)
+        stats.set_value(
+            "adaptive_rate/hosts",
+            {host: rate.as_state() for host, rate in self.controller.hosts.items() if rate.seen},
+        )
+        if self.state_path:
+            self.controller.save(self.state_path)
+
+    def process_request(self, request, spider):
+        # only replace the timeout DownloadTimeoutMiddleware defaulted, not one a spider chose
+        if request.meta.get("download_timeout") == self.default_timeout:
+            request.meta["download_timeout"] = self.controller.get(urlparse_cached(request).hostname or "").timeout
+
+    def process_response(self, request, response, spider):
+        host = urlparse_cached(request).hostname or ""
+        if response.status in self.BACKOFF_STATUSES or response.status >= 500:
+            rate = self.controller.record_failure(host, reactor.seconds())
+        elif "download_latency" in request.meta:
+            rate = self.controller.record_success(host, request.meta["download_latency"])
+        else:
+            # selenium / streamed responses don't have a latency
+            return response
+        self.apply(request, rate)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, self.TIMEOUT_EXCEPTIONS):
+            host = urlparse_cached(request).hostname or ""
+            self.apply(request, self.controller.record_failure(host, reactor.seconds(), timed_out=True))
+
+    def apply(self, request, rate):
+        slot = self.crawler.engine.downloader.slots.get(request.meta.get("download_slot"))
+        if slot is not None:
+            slot.concurrency = int(rate.concurrency)
+            slot.delay = rate.delay
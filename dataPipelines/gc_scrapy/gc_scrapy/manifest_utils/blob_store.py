@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.blob_store
+-----------------
+Content-addressed store for downloaded files.
+
+Each distinct file body is stored once under ``<output dir>/.blobs/<sha256[:2]>/<sha256>`` and output files are
+hardlinks to it (copies where hardlinks aren't supported). The first output path of each blob is remembered so
+later paths with the same bytes can be listed as duplicates and copied server side instead of uploaded again.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+BLOB_DIR_NAME = ".blobs"
+DUPLICATES_FILE_NAME = "duplicates.tsv"
+
+
+class BlobStore:
+    """Thread safe content-addressed file store
+    :param root: blob directory, created if it doesn't exist
+    """
+
+    _stores: Dict[Path, "BlobStore"] = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._first_paths: Dict[str, Path] = {}
+
+    @classmethod
+    def for_output_dir(cls, output_dir: Union[str, Path]) -> "BlobStore":
+        """Shared store for an output dir, so spiders downloading to the same dir dedupe against each other"""
+        root = Path(output_dir, BLOB_DIR_NAME).resolve()
+        with cls._stores_lock:
+            store = cls._stores.get(root)
+            if store is None:
+                store = cls(root)
+                cls._stores[root] = store
+            return store
+
+    @property
+    def duplicates_path(self) -> Path:
+        return self.root / DUPLICATES_FILE_NAME
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def add_bytes(self, data: bytes) -> Tuple[str, Path]:
+        """Store data if its content isn't stored yet
+        :returns: (sha256 hex digest, blob path)
+        """
+        digest = sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=blob.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, blob)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        return digest, blob
+
+    def add_file(self, src_path: Union[str, Path], digest: str) -> Path:
+        """Move a file with a known sha256 into the store, src is removed if the content is already stored
+        :returns: blob path
+        """
+        blob = self.blob_path(digest)
+        if blob.exists():
+            os.remove(src_path)
+        else:
+            blob.parent.mkdir(exist_ok=True)
+            os.replace(src_path, blob)
+        return blob
+
+    def link(self, digest: str, dest: Union[str, Path], track_duplicates: bool = True) -> Optional[Path]:
+        """Atomically point dest at the blob for digest, replacing anything already at dest
+        :param track_duplicates: remember dest as the first path with this content, or compare against it
+        :returns: the first path stored with the same content if dest is a duplicate of it, else None
+        """
+        blob = self.blob_path(digest)
+        dest = Path(dest)
+        # link to a temp name and swap in, writing to dest in place could write through an existing link to the blob
+        tmp_dest = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.link")
+        try:
+            os.link(blob, tmp_dest)
+        except OSError:
+            shutil.copyfile(blob, tmp_dest)
+        os.replace(tmp_dest, dest)
+        # renaming onto another link to the same blob is a no-op that leaves the temp link behind
+        if os.path.lexists(tmp_dest):
+            os.remove(tmp_dest)
+
+        if not track_duplicates:
+            return None
+        with self._lock:
+            first = self._first_paths.setdefault(digest, dest)
+        return first if first != dest else None
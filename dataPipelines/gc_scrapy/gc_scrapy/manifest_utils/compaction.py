@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.compaction
+-----------------
+Stream-merge and compact jsonlines manifests.
+
+Rows are deduplicated by (crawler_used, version_hash), optionally trimmed to the latest N versions of each
+doc_name, and written sorted by (crawler_used, doc_name, access_timestamp). Sorting is done with on-disk runs
+and a heap merge, so memory use is bounded by chunk_size regardless of how long the manifest history is.
+"""
+import gzip
+import heapq
+import itertools
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .reader import checksum_path, file_sha256_hex_digest, iter_manifest_rows
+
+DEFAULT_CHUNK_SIZE = 200_000
+
+SortKey = Tuple[str, ...]
+Keyed = Tuple[SortKey, dict]
+
+
+def _timestamp_key(row: dict) -> str:
+    # older manifests use "YYYY-MM-DD HH:MM:SS.ffffff", newer ones "YYYY-MM-DDTHH:MM:SS"
+    return str(row.get("access_timestamp") or "").replace("T", " ")
+
+
+def _hash_order(seq: int, row: dict) -> SortKey:
+    return (row.get("crawler_used") or "", row["version_hash"], _timestamp_key(row), f"{seq:012d}")
+
+
+def _doc_order(seq: int, row: dict) -> SortKey:
+    return (row.get("crawler_used") or "", str(row.get("doc_name") or ""), _timestamp_key(row), f"{seq:012d}")
+
+
+def _external_sort(
+    rows: Iterable[dict], key: Callable[[int, dict], SortKey], tmp_dir: str, chunk_size: int
+) -> Iterator[Keyed]:
+    """Sort rows of arbitrary count using sorted on-disk runs of at most chunk_size rows"""
+    run_paths = []
+    seq = itertools.count()
+    rows = iter(rows)
+    while True:
+        chunk = [(key(next(seq), row), row) for row in itertools.islice(rows, chunk_size)]
+        if not chunk:
+            break
+        chunk.sort(key=lambda keyed: keyed[0])
+        fd, run_path = tempfile.mkstemp(dir=tmp_dir, suffix=".run")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for sort_key, row in chunk:
+                f.write(json.dumps([sort_key, row]))
+                f.write("\n")
+        run_paths.append(run_path)
+
+    def read_run(run_path: str) -> Iterator[Keyed]:
+        with open(run_path, encoding="utf-8") as f:
+            for line in f:
+                sort_key, row = json.loads(line)
+                yield tuple(sort_key), row
+        os.remove(run_path)
+
+    return heapq.merge(*(read_run(p) for p in run_paths), key=lambda keyed: keyed[0])
+
+
+def _dedupe_versions(sorted_rows: Iterator[Keyed], stats: Dict[str, int]) -> Iterator[dict]:
+    """Keep the most recently accessed row of each (crawler_used, version_hash) group"""
+    for _, group in itertools.groupby(sorted_rows, key=lambda keyed: keyed[0][:2]):
+        *duplicates, (_, latest) = group
+        stats["duplicates_dropped"] += len(duplicates)
+        yield latest
+
+
+def _keep_latest_per_doc(sorted_rows: Iterator[Keyed], keep_latest: Optional[int], stats: Dict[str, int]) -> Iterator[dict]:
+    """Keep the keep_latest most recently accessed versions of each (crawler_used, doc_name) group"""
+    for _, group in itertools.groupby(sorted_rows, key=lambda keyed: keyed[0][:2]):
+        group_rows: List[dict] = [row for _, row in group]
+        if keep_latest and len(group_rows) > keep_latest:
+            stats["superseded_dropped"] += len(group_rows) - keep_latest
+            group_rows = group_rows[-keep_latest:]
+        yield from group_rows
+
+
+def compact_manifests(
+    input_paths: Iterable[Union[str, Path]],
+    output_path: Union[str, Path],
+    keep_latest: Optional[int] = None,
+    compress: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, Union[int, str]]:
+    """Merge manifests into a single deduplicated, sorted manifest with a sha256 checksum sidecar
+    :param input_paths: manifests to merge, oldest first (later inputs win ties on access_timestamp)
+    :param output_path: where to write the merged manifest, may be one of the inputs
+    :param keep_latest: if set, only keep this many versions per (crawler_used, doc_name)
+    :param compress: gzip the output
+    :param chunk_size: max rows held in memory per sorted run
+
+    :returns: dict of counts and the output checksum
+    """
+    if keep_latest is not None and keep_latest < 1:
+        raise ValueError("keep_latest must be a positive integer")
+
+    output_path = Path(output_path).resolve()
+    stats = {"rows_read": 0, "rows_without_hash": 0, "duplicates_dropped": 0, "superseded_dropped": 0, "rows_written": 0}
+
+    def read_inputs() -> Iterator[dict]:
+        for input_path in input_paths:
+            for row in iter_manifest_rows(input_path):
+                stats["rows_read"] += 1
+                if not row.get("version_hash"):
+                    stats["rows_without_hash"] += 1
+                    continue
+                yield row
+
+    with tempfile.TemporaryDirectory(dir=output_path.parent) as tmp_dir:
+        by_hash = _external_sort(read_inputs(), _hash_order, tmp_dir, chunk_size)
+        deduped = _dedupe_versions(by_hash, stats)
+        by_doc = _external_sort(deduped, _doc_order, tmp_dir, chunk_size)
+        kept = _keep_latest_per_doc(by_doc, keep_latest, stats)
+
+        # write next to the destination and swap in, output may overwrite one of the inputs
+        tmp_output = Path(tmp_dir, output_path.name)
+        with tmp_output.open(mode="wb") as raw:
+            f = gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) if compress else raw
+            try:
+                for row in kept:
+                    f.write(json.dumps(row).encode("utf-8"))
+                    f.write(b"\n")
+                    stats["rows_written"] += 1
+            finally:
+                if compress:
+                    f.close()
+        os.replace(tmp_output, output_path)
+
+    checksum = file_sha256_hex_digest(output_path)
+    checksum_path(output_path).write_text(f"{checksum}  {output_path.name}\n")
+
+    return {**stats, "sha256": checksum}
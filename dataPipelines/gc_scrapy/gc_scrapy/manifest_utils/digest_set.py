@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.digest_set
+-----------------
+Compact membership set for sha256 hex digests (version hashes).
+
+Digests are stored as raw 32 byte values in a single open-addressing table instead of as individual
+str objects, with an optional Bloom filter in front to short-circuit misses.
+"""
+import math
+from typing import Iterable, Iterator, Optional
+
+DIGEST_SIZE = 32
+_EMPTY_SLOT = bytes(DIGEST_SIZE)
+_MIN_CAPACITY = 16
+_MAX_LOAD_FACTOR = 0.8
+
+
+def hex_to_digest(value) -> Optional[bytes]:
+    """Raw digest for a lowercase sha256 hex string, None for anything else"""
+    if not isinstance(value, str) or len(value) != DIGEST_SIZE * 2:
+        return None
+    try:
+        digest = bytes.fromhex(value)
+    except ValueError:
+        return None
+    # round trip to keep lookups case sensitive, like the plain set of strings this replaces
+    if digest.hex() != value:
+        return None
+    return digest
+
+
+class BloomFilter:
+    """Bloom filter over raw sha256 digests, bit positions are taken directly from the digest bytes
+    :param capacity: expected number of items
+    :param error_rate: acceptable false positive rate at capacity
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        num_bits = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.num_bits = max(num_bits, 64)
+        # digest has 8 independent 32 bit words to draw positions from
+        self.num_hashes = min(max(int(round(self.num_bits / capacity * math.log(2))), 1), 8)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, digest: bytes) -> Iterator[int]:
+        for i in range(self.num_hashes):
+            yield int.from_bytes(digest[i * 4:(i + 1) * 4], "little") % self.num_bits
+
+    def add(self, digest: bytes) -> None:
+        for pos in self._positions(digest):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+class DigestSet:
+    """Set of version hashes stored as raw sha256 digests in an open-addressing (linear probing) table.
+    Values that aren't lowercase sha256 hex strings are kept in a regular set so membership matches a plain set.
+    :param capacity_hint: expected number of items, avoids resizing while loading
+    :param bloom_filter: put a Bloom filter in front of the table
+    :param bloom_error_rate: false positive rate the Bloom filter is sized for
+    """
+
+    def __init__(self, capacity_hint: int = 0, bloom_filter: bool = False, bloom_error_rate: float = 0.01):
+        # sized exactly rather than to a power of two, so a bulk load from the manifest index stays compact
+        capacity = max(_MIN_CAPACITY, math.ceil(capacity_hint / _MAX_LOAD_FACTOR) + 1)
+
+        self._table = bytearray(capacity * DIGEST_SIZE)
+        self._capacity = capacity
+        self._size = 0
+        # the all zero digest doubles as the empty slot marker, so track it separately
+        self._has_empty_digest = False
+        self._others = set()
+        self._bloom = BloomFilter(max(capacity_hint, _MIN_CAPACITY), bloom_error_rate) if bloom_filter else None
+
+    @classmethod
+    def from_iterable(cls, values: Iterable[str], **kwargs) -> "DigestSet":
+        digest_set = cls(**kwargs)
+        digest_set.update(values)
+        return digest_set
+
+    def _find_slot(self, digest: bytes) -> int:
+        """Offset of the slot holding digest, or of the empty slot where it would go"""
+        table = self._table
+        slot = int.from_bytes(digest[:8], "little") % self._capacity
+        while True:
+            offset = slot * DIGEST_SIZE
+            current = table[offset:offset + DIGEST_SIZE]
+            if current == digest or current == _EMPTY_SLOT:
+                return offset
+            slot = (slot + 1) % self._capacity
+
+    def _grow(self) -> None:
+        old_table = self._table
+        self._capacity *= 2
+        self._table = bytearray(self._capacity * DIGEST_SIZE)
+        for offset in range(0, len(old_table), DIGEST_SIZE):
+            digest = bytes(old_table[offset:offset + DIGEST_SIZE])
+            if digest != _EMPTY_SLOT:
+                new_offset = self._find_slot(digest)
+                self._table[new_offset:new_offset + DIGEST_SIZE] = digest
+
+    def add(self, value: str) -> None:
+        digest = hex_to_digest(value)
+        if digest is None:
+            self._others.add(value)
+            return
+
+        if self._bloom is not None:
+            self._bloom.add(digest)
+
+        if digest == _EMPTY_SLOT:
+            self._has_empty_digest = True
+            return
+
+        offset = self._find_slot(digest)
+        if self._table[offset:offset + DIGEST_SIZE] == _EMPTY_SLOT:
+            self._table[offset:offset + DIGEST_SIZE] = digest
+            self._size += 1
+            if self._size > self._capacity * _MAX_LOAD_FACTOR:
+                self._grow()
+
+    def update(self, values: Iterable[str]) -> None:
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value) -> bool:
+        digest = hex_to_digest(value)
+        if digest is None:
+            return value in self._others
+
+        if self._bloom is not None and digest not in self._bloom:
+            return False
+
+        if digest == _EMPTY_SLOT:
+            return self._has_empty_digest
+
+        offset = self._find_slot(digest)
+        return self._table[offset:offset + DIGEST_SIZE] == digest
+
+    def __len__(self) -> int:
+        return self._size + int(self._has_empty_digest) + len(self._others)
+
+    def __iter__(self) -> Iterator[str]:
+        if self._has_empty_digest:
+            yield _EMPTY_SLOT.hex()
+        for offset in range(0, len(self._table), DIGEST_SIZE):
+            digest = self._table[offset:offset + DIGEST_SIZE]
+            if digest != _EMPTY_SLOT:
+                yield digest.hex()
+        yield from self._others
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the digest storage"""
+        bloom_bytes = self._bloom.nbytes if self._bloom is not None else 0
+        return len(self._table) + bloom_bytes
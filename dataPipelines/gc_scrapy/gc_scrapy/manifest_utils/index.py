@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.index
+-----------------
+SQLite index of a cumulative manifest keyed by (crawler_used, version_hash).
+
+The index is built once per manifest file and reused by every spider in the job, so opening a spider
+is a partition lookup instead of a parse of the entire manifest history.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+from .reader import iter_manifest_rows
+
+# old manifest rows with no crawler info are stored under this key and apply to every spider
+LEGACY_CRAWLER_KEY = ""
+INDEX_SCHEMA_VERSION = "1"
+INDEX_DIR_NAME = "gc_manifest_index"
+_BATCH_SIZE = 10_000
+
+
+def default_index_path(manifest_path: Union[str, Path]) -> Path:
+    """Index location for a manifest, kept out of the download dir so it never gets uploaded"""
+    resolved = str(Path(manifest_path).resolve())
+    name = hashlib.sha1(resolved.encode("utf-8")).hexdigest()
+    return Path(tempfile.gettempdir(), INDEX_DIR_NAME, f"{name}.sqlite")
+
+
+class ManifestIndex:
+    """Read-only view of a built manifest index
+    :param index_path: path to an index file created by ManifestIndex.build
+    """
+
+    _open_indexes: Dict[Path, "ManifestIndex"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, index_path: Union[str, Path]):
+        self.index_path = Path(index_path)
+        self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+        self._conn.execute("PRAGMA query_only = ON")
+
+    @staticmethod
+    def _source_signature(manifest_path: Path) -> Dict[str, str]:
+        stat = manifest_path.stat()
+        return {
+            "schema_version": INDEX_SCHEMA_VERSION,
+            "source_path": str(manifest_path),
+            "source_size": str(stat.st_size),
+            "source_mtime_ns": str(stat.st_mtime_ns),
+        }
+
+    @staticmethod
+    def _is_current(index_path: Path, signature: Dict[str, str]) -> bool:
+        if not index_path.is_file():
+            return False
+        try:
+            conn = sqlite3.connect(str(index_path))
+            try:
+                stored = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+        return stored == signature
+
+    @classmethod
+    def build(cls, manifest_path: Union[str, Path], index_path: Optional[Union[str, Path]] = None) -> "ManifestIndex":
+        """Build (or reuse, if the manifest is unchanged) the index for a manifest file
+        :param manifest_path: path to jsonlines manifest
+        :param index_path: where to put the index, defaults to default_index_path(manifest_path)
+
+        :returns: ManifestIndex for the manifest
+        """
+        manifest_path = Path(manifest_path).resolve()
+        index_path = Path(index_path) if index_path else default_index_path(manifest_path)
+        signature = cls._source_signature(manifest_path)
+
+        if cls._is_current(index_path, signature):
+            return cls(index_path)
+
+        print(f"Building previous manifest index for {manifest_path}")
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        # build next to the final location and swap in atomically so concurrent jobs never see a partial index
+        tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        conn = sqlite3.connect(str(tmp_path))
+        try:
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE hashes ("
+                "crawler_used TEXT NOT NULL, version_hash TEXT NOT NULL, "
+                "PRIMARY KEY (crawler_used, version_hash)) WITHOUT ROWID"
+            )
+
+            count = 0
+            batch = []
+            for jdoc in iter_manifest_rows(manifest_path):
+                version_hash = jdoc.get("version_hash")
+                if not version_hash:
+                    continue
+                batch.append((jdoc.get("crawler_used") or LEGACY_CRAWLER_KEY, version_hash))
+                if len(batch) >= _BATCH_SIZE:
+                    conn.executemany("INSERT OR IGNORE INTO hashes VALUES (?, ?)", batch)
+                    count += len(batch)
+                    batch.clear()
+                    print(f"{count} lines indexed")
+            conn.executemany("INSERT OR IGNORE INTO hashes VALUES (?, ?)", batch)
+            count += len(batch)
+
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", signature.items())
+            conn.commit()
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, index_path)
+        print(f"Previous manifest index built from {count} lines")
+        return cls(index_path)
+
+    @classmethod
+    def for_manifest(cls, manifest_path: Union[str, Path]) -> "ManifestIndex":
+        """Process-wide cached index for a manifest, rebuilt only when the manifest file changes"""
+        manifest_path = Path(manifest_path).resolve()
+        with cls._lock:
+            index = cls._open_indexes.get(manifest_path)
+            if index is None or not cls._is_current(index.index_path, cls._source_signature(manifest_path)):
+                if index is not None:
+                    index.close()
+                index = cls.build(manifest_path)
+                cls._open_indexes[manifest_path] = index
+            return index
+
+    def contains(self, crawler_used: str, version_hash: str) -> bool:
+        """Check if version_hash was previously recorded for the crawler (or for an unattributed legacy row)"""
+        row = self._conn.execute(
+            "SELECT 1 FROM hashes WHERE crawler_used IN (?, ?) AND version_hash = ? LIMIT 1",
+            (crawler_used, LEGACY_CRAWLER_KEY, version_hash),
+        ).fetchone()
+        return row is not None
+
+    def iter_hashes(self, crawler_used: str) -> Iterator[str]:
+        """Iterate over the partition of hashes a crawler should filter on"""
+        cursor = self._conn.execute(
+            "SELECT version_hash FROM hashes WHERE crawler_used IN (?, ?)",
+            (crawler_used, LEGACY_CRAWLER_KEY),
+        )
+        for (version_hash,) in cursor:
+            yield version_hash
+
+    def count(self, crawler_used: str) -> int:
+        """Number of hashes in the crawler's partition"""
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM hashes WHERE crawler_used IN (?, ?)",
+            (crawler_used, LEGACY_CRAWLER_KEY),
+        ).fetchone()
+        return count
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.reader
+-----------------
+Helpers for reading jsonlines manifest files, plain or gzip compressed
+"""
+import gzip
+import json
+from hashlib import sha256
+from pathlib import Path
+from typing import IO, Iterator, Optional, Union
+
+GZIP_MAGIC = b"\x1f\x8b"
+CHECKSUM_SUFFIX = ".sha256"
+
+
+def is_gzip_file(file_path: Union[str, Path]) -> bool:
+    """Checks the file's magic bytes, compressed manifests keep their .json name in S3"""
+    with Path(file_path).open(mode="rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def open_manifest(manifest_path: Union[str, Path]) -> IO[str]:
+    """Open a manifest for reading as text, transparently decompressing gzip manifests"""
+    if is_gzip_file(manifest_path):
+        return gzip.open(manifest_path, mode="rt", encoding="utf-8")
+    return Path(manifest_path).open(mode="r", encoding="utf-8")
+
+
+def iter_manifest_rows(manifest_path: Union[str, Path]) -> Iterator[dict]:
+    """Iterate over the rows of a jsonlines manifest without reading the whole file into memory
+    :param manifest_path: path to manifest file
+
+    :returns: iterable of manifest row dicts, blank and malformed lines are skipped
+    """
+    with open_manifest(manifest_path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.decoder.JSONDecodeError:
+                print(f"Skipping malformed manifest line {line_number} in {manifest_path}")
+
+
+def checksum_path(manifest_path: Union[str, Path]) -> Path:
+    path = Path(manifest_path)
+    return path.with_name(path.name + CHECKSUM_SUFFIX)
+
+
+def file_sha256_hex_digest(file_path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    digest = sha256()
+    with Path(file_path).open(mode="rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_manifest_checksum(manifest_path: Union[str, Path]) -> Optional[bool]:
+    """Compare a manifest against its sha256sum style sidecar file
+    :returns: None if there is no sidecar, else whether the checksum matches
+    """
+    sidecar = checksum_path(manifest_path)
+    if not sidecar.is_file():
+        return None
+    expected = sidecar.read_text().split()[0].strip().lower()
+    return file_sha256_hex_digest(manifest_path) == expected
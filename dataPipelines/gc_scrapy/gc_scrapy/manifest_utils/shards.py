@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.shards
+-----------------
+Naming and merging of the files written by crawls split across worker processes (crawl --workers).
+
+Each worker writes its own shard of every append-only output (feed, manifest, dead queue, duplicates list) named
+``<stem>.shard<N><suffix>``, the parent appends the shards to the unsharded file in shard order once every worker
+is done, so the job ends with the same layout as a single process crawl.
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+
+def shard_path(path: Union[str, Path], shard_id: Optional[int]) -> Path:
+    """Path of a worker's shard of path, path itself when not sharded"""
+    path = Path(path)
+    if shard_id is None:
+        return path
+    return path.with_name(f"{path.stem}.shard{shard_id}{path.suffix}")
+
+
+def merge_shard_files(shard_paths: Iterable[Union[str, Path]], dest: Union[str, Path]) -> int:
+    """Append each existing shard to dest in order and remove it, dest isn't created when there are no shards
+    :returns: number of shards merged
+    """
+    shards = [shard for shard in shard_paths if os.path.isfile(shard)]
+    if not shards:
+        return 0
+    with open(dest, "ab") as output:
+        for shard in shards:
+            with open(shard, "rb") as part:
+                shutil.copyfileobj(part, output)
+            os.remove(shard)
+    return len(shards)
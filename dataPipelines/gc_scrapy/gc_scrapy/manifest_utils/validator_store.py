@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.validator_store
+-----------------
+Persistent per-URL HTTP validators (ETag / Last-Modified) for document downloads.
+
+Kept between runs next to the previous manifest, so FileDownloadPipeline can make conditional requests and skip
+re-downloading files whose version_hash changed only because of listing metadata.
+
+Validators recorded during a crawl are staged and only used by later runs once commit_staged() is called, after the
+job's files are uploaded and its manifest merged. A job that fails part way doesn't leave validators behind for
+files that never made it to S3, otherwise the next run would get a 304 for them and never download them again.
+"""
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import ClassVar, Dict, Optional, Union
+
+SCHEMA_VERSION = "1"
+DEFAULT_COMMIT_EVERY = 100
+
+
+class ValidatorStore:
+    """SQLite backed store of the validators last seen for each download url, safe to use from multiple threads
+    :param db_path: sqlite file, created if it doesn't exist
+    :param commit_every: writes per transaction, 1 when other processes write to the same file so they don't wait
+        on a long open transaction
+    """
+
+    # spiders crawling at once share one connection, a second connection would wait on the first one's
+    # uncommitted batch of writes
+    _stores: ClassVar[Dict[Path, "ValidatorStore"]] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, db_path: Union[str, Path], commit_every: int = DEFAULT_COMMIT_EVERY):
+        self.db_path = Path(db_path)
+        self.commit_every = max(commit_every, 1)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._refcount = 0
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_length INTEGER,
+                sha256 TEXT,
+                updated_at TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS staged_validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_length INTEGER,
+                sha256 TEXT,
+                updated_at TEXT NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (SCHEMA_VERSION,))
+        self._conn.commit()
+
+    @classmethod
+    def acquire(cls, db_path: Union[str, Path], commit_every: int = DEFAULT_COMMIT_EVERY) -> "ValidatorStore":
+        """Get the shared store for db_path, call release() when done with it, commit_every applies if it's opened"""
+        key = Path(db_path).resolve()
+        with cls._registry_lock:
+            store = cls._stores.get(key)
+            if store is None:
+                store = cls._stores[key] = cls(key, commit_every=commit_every)
+            store._refcount += 1
+            return store
+
+    def release(self) -> None:
+        """Drop a reference to the shared store, the last one out commits and closes it"""
+        with self._registry_lock:
+            self._refcount -= 1
+            if self._refcount > 0:
+                return
+            self._stores.pop(self.db_path, None)
+        self.close()
+
+    def get(self, url: str) -> Optional[Dict[str, Union[str, int, None]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_length, sha256 FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("etag", "last_modified", "content_length", "sha256"), row))
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for url, empty if nothing is stored for it"""
+        validators = self.get(url)
+        headers = {}
+        if validators:
+            if validators["etag"]:
+                headers["If-None-Match"] = validators["etag"]
+            if validators["last_modified"]:
+                headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def record(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        content_length: Optional[int] = None,
+        sha256: Optional[str] = None,
+    ) -> None:
+        """Stage the validators of a successful download until commit_staged(), urls without either validator are
+        removed when they're committed"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO staged_validators VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag or None, last_modified or None, content_length, sha256, datetime.now().isoformat()),
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def commit_staged(self) -> int:
+        """Make the staged validators visible to later runs, returns how many urls were updated"""
+        with self._lock:
+            with self._conn:
+                staged = self._conn.execute("SELECT COUNT(*) FROM staged_validators").fetchone()[0]
+                self._conn.execute(
+                    "DELETE FROM validators WHERE url IN "
+                    "(SELECT url FROM staged_validators WHERE etag IS NULL AND last_modified IS NULL)"
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO validators SELECT * FROM staged_validators "
+                    "WHERE etag IS NOT NULL OR last_modified IS NOT NULL"
+                )
+                self._conn.execute("DELETE FROM staged_validators")
+            self._pending = 0
+        return staged
+
+    def discard_staged(self) -> int:
+        """Drop validators staged by a job that never committed them, returns how many were dropped"""
+        with self._lock:
+            with self._conn:
+                discarded = self._conn.execute("DELETE FROM staged_validators").rowcount
+            self._pending = 0
+        return discarded
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM validators").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.manifest_utils.writers
+-----------------
+Buffered append-only jsonlines writers for the job manifest and dead queue.
+
+Lines are kept in memory and written in batches once the buffer is big or old enough, instead of an
+open/write/close per item. One writer is shared per file path, so every pipeline appending to the same
+manifest goes through the same buffer and lock.
+"""
+import atexit
+import json
+import os
+import threading
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Any, Dict, Optional, Union
+
+DEFAULT_MAX_BUFFER_BYTES = 256 * 1024
+DEFAULT_MAX_BUFFER_SECONDS = 5.0
+
+
+class BufferedAppendWriter:
+    """Thread safe, buffered, append-only line writer
+    :param path: file to append to, created on first flush
+    :param max_buffer_bytes: flush once this many bytes are buffered
+    :param max_buffer_seconds: flush on the next write once the oldest buffered line is this old
+    """
+
+    _writers: Dict[Path, "BufferedAppendWriter"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+        max_buffer_seconds: float = DEFAULT_MAX_BUFFER_SECONDS,
+    ):
+        self.path = Path(path)
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_buffer_seconds = max_buffer_seconds
+
+        self._lock = threading.RLock()
+        self._file = None
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_started: Optional[float] = None
+        self._refcount = 0
+
+        self.lines_written = 0
+        self.flush_count = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    @classmethod
+    def acquire(cls, path: Union[str, Path], **kwargs) -> "BufferedAppendWriter":
+        """Get the shared writer for path, call release() when done with it"""
+        key = Path(path).resolve()
+        with cls._registry_lock:
+            writer = cls._writers.get(key)
+            if writer is None:
+                writer = cls(key, **kwargs)
+                cls._writers[key] = writer
+            writer._refcount += 1
+            return writer
+
+    def release(self) -> None:
+        """Drop a reference to the shared writer, the last one out flushes durably and closes the file"""
+        with self._registry_lock:
+            self._refcount -= 1
+            if self._refcount > 0:
+                return
+            self._writers.pop(self.path, None)
+        self.close()
+
+    @classmethod
+    def flush_all(cls, durable: bool = True) -> None:
+        with cls._registry_lock:
+            writers = list(cls._writers.values())
+        for writer in writers:
+            try:
+                writer.flush(durable=durable)
+            except Exception as e:
+                print("Failed to flush", writer.path, e)
+
+    def write_line(self, line: str) -> None:
+        data = line if line.endswith("\n") else line + "\n"
+        with self._lock:
+            if not self._buffer:
+                self._buffer_started = monotonic()
+            self._buffer.append(data)
+            self._buffer_bytes += len(data)
+            if self._buffer_bytes >= self.max_buffer_bytes or self.is_stale():
+                self.flush()
+
+    def write_json(self, obj: Any) -> None:
+        self.write_line(json.dumps(obj))
+
+    def is_stale(self) -> bool:
+        """True if buffered lines have waited longer than max_buffer_seconds"""
+        started = self._buffer_started
+        return started is not None and monotonic() - started >= self.max_buffer_seconds
+
+    def flush(self, durable: bool = False) -> None:
+        """Write out buffered lines
+        :param durable: also fsync the file
+        """
+        with self._lock:
+            if not self._buffer and not durable:
+                return
+
+            start = perf_counter()
+            if self._file is None:
+                self._file = open(self.path, "a")
+            if self._buffer:
+                self._file.write("".join(self._buffer))
+                self.lines_written += len(self._buffer)
+                self._buffer.clear()
+                self._buffer_bytes = 0
+                self._buffer_started = None
+            self._file.flush()
+            if durable:
+                os.fsync(self._file.fileno())
+
+            elapsed = perf_counter() - start
+            self.flush_count += 1
+            self.flush_seconds_total += elapsed
+            self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._buffer or self._file is not None:
+                self.flush(durable=True)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Flush counters, for the crawler stats collector"""
+        return {
+            "lines_written": self.lines_written,
+            "flush_count": self.flush_count,
+            "flush_seconds_total": round(self.flush_seconds_total, 6),
+            "flush_seconds_max": round(self.flush_seconds_max, 6),
+        }
+
+
+# twisted turns SIGINT/SIGTERM into a normal reactor shutdown, so this also covers signalled exits
+atexit.register(BufferedAppendWriter.flush_all)
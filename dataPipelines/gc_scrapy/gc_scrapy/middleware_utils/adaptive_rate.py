@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.middleware_utils.adaptive_rate
+-----------------
+AIMD style per-host rate limits, learned from response latency and ban/overload signals.
+
+Every ``window`` responses from a host are checked: if the p95 latency and error rate are healthy the host gets
+one more concurrent request and a shorter delay, a slow window takes one concurrent request away. A 403/429/5xx
+or timeout halves concurrency and doubles the delay right away (once per cooldown, so a burst of failures from
+requests already in flight only counts once), and timeouts also lengthen the host's download timeout.
+
+Learned limits are kept per FQDN in a small json state file so the next run starts where the last one ended.
+"""
+import json
+import math
+import os
+import tempfile
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, Optional, Union
+
+from dataPipelines.gc_scrapy.gc_scrapy.utils import locked_state_file
+
+STATE_VERSION = 1
+
+
+class HostRate:
+    """Current limits and recent samples of one host"""
+
+    def __init__(self, concurrency: float, delay: float, timeout: float):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.timeout = timeout
+        self.p95_latency: Optional[float] = None
+        self.latencies: Deque[float] = deque()
+        self.errors = 0
+        self.last_decrease = float("-inf")
+        # only hosts with responses this run are written back to the state file
+        self.seen = False
+
+    def as_state(self) -> Dict[str, Union[int, float, str, None]]:
+        return {
+            "concurrency": int(self.concurrency),
+            "delay": round(self.delay, 4),
+            "timeout": round(self.timeout, 3),
+            "p95_latency": None if self.p95_latency is None else round(self.p95_latency, 4),
+            "updated_at": datetime.now().isoformat(),
+        }
+
+
+class AdaptiveRateController:
+    """Per-host AIMD controller, not thread safe, meant to be used from the reactor thread
+    :param concurrency: (start, min, max) concurrent requests per host
+    :param delay: (start, min, max) seconds between requests to a host
+    :param timeout: (start, max) download timeout, learned timeouts never go under start
+    :param target_latency: p95 latency in seconds a host must stay under to be sped up
+    :param max_error_rate: share of failed responses in a window a host can have and still be sped up
+    :param window: responses per host between adjustments
+    """
+
+    def __init__(
+        self,
+        concurrency=(8, 1, 16),
+        delay=(0.1, 0.0, 30.0),
+        timeout=(3.5, 60.0),
+        target_latency: float = 2.0,
+        max_error_rate: float = 0.05,
+        window: int = 20,
+    ):
+        self.start_concurrency, self.min_concurrency, self.max_concurrency = concurrency
+        self.start_delay, self.min_delay, self.max_delay = delay
+        self.start_timeout, self.max_timeout = timeout
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.hosts: Dict[str, HostRate] = {}
+        self.increase_count = 0
+        self.decrease_count = 0
+
+    def get(self, host: str) -> HostRate:
+        rate = self.hosts.get(host)
+        if rate is None:
+            rate = HostRate(self.start_concurrency, self.start_delay, self.start_timeout)
+            self.hosts[host] = rate
+        return rate
+
+    def _clamp(self, rate: HostRate) -> HostRate:
+        rate.concurrency = min(max(rate.concurrency, self.min_concurrency), self.max_concurrency)
+        rate.delay = min(max(rate.delay, self.min_delay), self.max_delay)
+        rate.timeout = min(max(rate.timeout, self.start_timeout), self.max_timeout)
+        return rate
+
+    def record_success(self, host: str, latency: float) -> HostRate:
+        rate = self.get(host)
+        rate.seen = True
+        rate.latencies.append(latency)
+        if len(rate.latencies) + rate.errors >= self.window:
+            self._adjust(rate)
+        return rate
+
+    def record_failure(self, host: str, now: float, timed_out: bool = False) -> HostRate:
+        """403/429/5xx or a timeout, backs off at most once per cooldown
+        :param now: current time in seconds, e.g. reactor.seconds()
+        """
+        rate = self.get(host)
+        rate.seen = True
+        rate.errors += 1
+        if timed_out:
+            rate.timeout *= 1.5
+        # failures of requests sent before the last back off don't count again
+        cooldown = max(1.0, rate.delay * rate.concurrency, rate.p95_latency or 0.0)
+        if now - rate.last_decrease >= cooldown:
+            rate.concurrency = math.floor(rate.concurrency / 2)
+            rate.delay = max(rate.delay * 2, 0.25)
+            rate.last_decrease = now
+            self.decrease_count += 1
+        return self._clamp(rate)
+
+    def _adjust(self, rate: HostRate) -> None:
+        responses = len(rate.latencies) + rate.errors
+        if rate.latencies:
+            latencies = sorted(rate.latencies)
+            rate.p95_latency = latencies[min(len(latencies) - 1, math.ceil(len(latencies) * 0.95) - 1)]
+            # timeout follows the latency, slowly coming back down after timeouts raised it
+            rate.timeout = max(rate.p95_latency * 3, rate.timeout * 0.9)
+
+        if rate.errors / responses <= self.max_error_rate and (rate.p95_latency or 0) <= self.target_latency:
+            rate.concurrency += 1
+            rate.delay = rate.delay / 2 if rate.delay > 0.02 else 0.0
+            self.increase_count += 1
+        elif (rate.p95_latency or 0) > self.target_latency:
+            rate.concurrency -= 1
+
+        rate.latencies.clear()
+        rate.errors = 0
+        self._clamp(rate)
+
+    def load(self, path: Union[str, Path]) -> None:
+        """Start hosts from a state file written by save, missing or unreadable files are ignored"""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") != STATE_VERSION:
+            return
+
+        for host, saved in state.get("hosts", {}).items():
+            rate = HostRate(saved["concurrency"], saved["delay"], saved["timeout"])
+            rate.p95_latency = saved.get("p95_latency")
+            self.hosts[host] = self._clamp(rate)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Merge the learned hosts into the state file, hosts this run didn't touch are kept"""
+        with locked_state_file(path) as path:
+            hosts = {}
+            try:
+                with path.open() as f:
+                    saved = json.load(f)
+                if saved.get("version") == STATE_VERSION:
+                    hosts = saved.get("hosts", {})
+            except (OSError, ValueError):
+                pass
+            hosts.update({host: rate.as_state() for host, rate in self.hosts.items() if rate.seen})
+
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": STATE_VERSION, "hosts": hosts}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, path)
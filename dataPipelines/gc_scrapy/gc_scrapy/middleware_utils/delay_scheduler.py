@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.middleware_utils.delay_scheduler
+-----------------
+Per-domain request spacing that doesn't block the reactor.
+
+Each domain is a token bucket refilled by one token per interval, where the interval is picked per request so
+requests keep the random spacing spiders ask for with ``randomly_delay_request``. A request that has to wait
+gets a Deferred firing once its token is available, requests to other domains carry on in the meantime.
+"""
+from typing import Dict, Optional
+
+from twisted.internet import defer, task
+
+
+class DomainDelayScheduler:
+    """Token bucket per domain, tracked as the time the bucket is next empty (GCRA)
+    :param clock: reactor or task.Clock to schedule on
+    :param burst: how many requests to a domain can go out back to back before spacing applies
+    """
+
+    def __init__(self, clock=None, burst: int = 1):
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.burst = max(burst, 1)
+        self._ready_at: Dict[str, float] = {}
+
+    def reserve(self, domain: str, interval: float) -> float:
+        """Take the next token for domain
+        :param interval: seconds the token takes to refill, i.e. the spacing after this request
+        :returns: seconds to wait before sending the request
+        """
+        now = self.clock.seconds()
+        ready_at = max(self._ready_at.get(domain, now), now)
+        # up to burst - 1 intervals of tokens can be banked
+        delay = max(0.0, ready_at - now - (self.burst - 1) * interval)
+        self._ready_at[domain] = ready_at + interval
+        return delay
+
+    def wait(self, domain: str, interval: float) -> Optional[defer.Deferred]:
+        """Deferred firing with None when the request to domain can be sent, None if it can go right away"""
+        delay = self.reserve(domain, interval)
+        if not delay:
+            return None
+        return task.deferLater(self.clock, delay, lambda: None)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.middleware_utils.selenium_pool
+-----------------
+Bounded pool of selenium WebDrivers for SeleniumMiddleware.
+
+Drivers are started, used to render pages and quit on a thread pool with one thread per driver, so page loads
+don't block the reactor and several pages can render at once. A leased driver stays with its response until the
+spider callback is done with it (see spider_middlewares.SeleniumDriverLeaseMiddleware), then goes back to the
+pool, or is quit and replaced after ``max_pages`` pages or when it broke.
+"""
+from typing import Any, Callable, Dict, List
+
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+
+class DriverLease:
+    """A driver checked out of the pool, release is safe to call more than once"""
+
+    def __init__(self, pool: "SeleniumDriverPool", driver):
+        self.pool = pool
+        self.driver = driver
+        self.released = False
+
+    def release(self, broken: bool = False) -> None:
+        if not self.released:
+            self.released = True
+            self.pool.release(self.driver, broken=broken)
+
+
+class SeleniumDriverPool:
+    """
+    :param driver_factory: creates a new driver, called on a pool thread
+    :param size: most drivers alive (and pages rendering) at once
+    :param max_pages: pages a driver renders before it's replaced, 0 to never replace
+    """
+
+    def __init__(self, driver_factory: Callable[[], Any], size: int = 2, max_pages: int = 200):
+        self.driver_factory = driver_factory
+        self.size = max(size, 1)
+        self.max_pages = max_pages
+        self.thread_pool = ThreadPool(minthreads=1, maxthreads=self.size, name="SeleniumDriverPool")
+        self.semaphore = defer.DeferredSemaphore(self.size)
+        self.idle: List[Any] = []
+        self.pages: Dict[int, int] = {}
+        self.drivers: Dict[int, Any] = {}
+        self.created_count = 0
+        self.recycled_count = 0
+        self.shutdown_trigger = None
+
+    def start(self) -> None:
+        self.thread_pool.start()
+        self.shutdown_trigger = reactor.addSystemEventTrigger("during", "shutdown", self.thread_pool.stop)
+
+    def run(self, func: Callable, *args, **kwargs) -> defer.Deferred:
+        """Run a blocking call on the pool's threads"""
+        return threads.deferToThreadPool(reactor, self.thread_pool, func, *args, **kwargs)
+
+    def acquire(self) -> defer.Deferred:
+        """Deferred firing with a DriverLease once a driver is free, a driver is started if none is idle"""
+        dfd = self.semaphore.acquire()
+
+        def get_driver(_):
+            if self.idle:
+                return self.idle.pop()
+            return self.run(self.driver_factory).addCallback(self._created)
+
+        def failed(failure):
+            self.semaphore.release()
+            return failure
+
+        dfd.addCallback(get_driver)
+        dfd.addCallbacks(lambda driver: DriverLease(self, driver), failed)
+        return dfd
+
+    def _created(self, driver):
+        self.created_count += 1
+        self.drivers[id(driver)] = driver
+        self.pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver, broken: bool = False) -> None:
+        if id(driver) not in self.drivers:
+            # already quit by close
+            self.semaphore.release()
+            return
+        self.pages[id(driver)] += 1
+        if broken or (self.max_pages and self.pages[id(driver)] >= self.max_pages):
+            self.recycled_count += 1
+            self.drivers.pop(id(driver), None)
+            self.pages.pop(id(driver), None)
+            self.run(self.quit_driver, driver)
+        else:
+            self.idle.append(driver)
+        self.semaphore.release()
+
+    @staticmethod
+    def quit_driver(driver) -> None:
+        try:
+            driver.quit()
+        except Exception as e:
+            print("SeleniumDriverPool - error quitting driver", e)
+
+    def close(self) -> None:
+        """Quit every driver, leased or not, and stop the threads"""
+        for driver in self.drivers.values():
+            self.quit_driver(driver)
+        self.drivers.clear()
+        self.idle.clear()
+        if self.shutdown_trigger:
+            reactor.removeSystemEventTrigger(self.shutdown_trigger)
+            self.shutdown_trigger = None
+        self.thread_pool.stop()
@@ -5,7 +5,8 @@ class SeleniumRequest(Request):
     """Scrapy ``Request`` subclass providing additional arguments"""
     # Shamelessly taken from https://github.com/clemfromspace/scrapy-selenium
 
-    def __init__(self, wait_time=None, wait_until=None, screenshot=False, script=None, *args, **kwargs):
+    def __init__(self, wait_time=None, wait_until=None, screenshot=False, script=None, fast_mode=None,
+                 blocked_resource_types=None, blocked_url_patterns=None, driver_callback=None, *args, **kwargs):
         """Initialize a new selenium request
         Parameters
         ----------
@@ -19,11 +20,25 @@ class SeleniumRequest(Request):
             will be returned in the response "meta" attribute.
         script: str
             JavaScript code to execute.
+        fast_mode: bool
+            Block resources while loading this page, None to follow the SELENIUM_FAST_MODE setting.
+        blocked_resource_types: list
+            Resource types to block in fast mode instead of SELENIUM_BLOCKED_RESOURCE_TYPES.
+        blocked_url_patterns: list
+            Url patterns to block in fast mode instead of SELENIUM_BLOCKED_URL_PATTERNS.
+        driver_callback: method
+            Called with (driver, request) on the driver pool's thread once the page is loaded, for clicking through
+            a page (waits, pagination...) without blocking the reactor. What it returns is in the response's
+            "driver_result" meta.
         """
 
         self.wait_time = wait_time
         self.wait_until = wait_until
         self.screenshot = screenshot
         self.script = script
+        self.fast_mode = fast_mode
+        self.blocked_resource_types = blocked_resource_types
+        self.blocked_url_patterns = blocked_url_patterns
+        self.driver_callback = driver_callback
 
         super().__init__(*args, **kwargs)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.middleware_utils.user_agent_health
+-----------------
+Per (domain, user agent) health scores for BanEvasionMiddleware.
+
+Each outcome moves an agent's score (an exponentially weighted success rate) and agents are picked at random
+weighted by score, so traffic drifts toward agents a site is happy with. An agent failing several times in a row
+(403/406/429, empty 200 bodies, timeouts and dropped connections) is quarantined for that domain, each quarantine
+twice as long as the one before. Once it's over the next outcome is a probe, a failure sends it straight back.
+
+Scores are kept between runs in a json state file, timestamps are epoch seconds so quarantines carry over.
+"""
+import json
+import os
+import random
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Union
+
+from dataPipelines.gc_scrapy.gc_scrapy.utils import locked_state_file
+
+STATE_VERSION = 1
+
+
+class AgentHealth:
+    """Outcomes of one user agent on one domain"""
+
+    def __init__(self, score: float = 1.0, successes: int = 0, failures: int = 0, consecutive_failures: int = 0,
+                 quarantine_count: int = 0, quarantined_until: float = 0.0):
+        self.score = score
+        self.successes = successes
+        self.failures = failures
+        self.consecutive_failures = consecutive_failures
+        self.quarantine_count = quarantine_count
+        self.quarantined_until = quarantined_until
+        # only agents used this run are written back to the state file
+        self.seen = False
+
+    def as_state(self) -> Dict[str, Union[int, float]]:
+        return {
+            "score": round(self.score, 4),
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "quarantine_count": self.quarantine_count,
+            "quarantined_until": round(self.quarantined_until, 1),
+        }
+
+
+class UserAgentHealth:
+    """Health table and weighted agent picker, not thread safe, meant to be used from the reactor thread
+    :param failure_threshold: consecutive failures that quarantine an agent
+    :param quarantine_seconds: first quarantine, doubled for every quarantine after it
+    :param max_quarantine_seconds: longest quarantine
+    :param smoothing: weight of each new outcome in the score
+    :param min_weight: pick weight of the worst agents that aren't quarantined
+    """
+
+    def __init__(self, failure_threshold: int = 3, quarantine_seconds: float = 60.0,
+                 max_quarantine_seconds: float = 24 * 60 * 60, smoothing: float = 0.2, min_weight: float = 0.05,
+                 rng: Optional[random.Random] = None):
+        self.failure_threshold = failure_threshold
+        self.quarantine_seconds = quarantine_seconds
+        self.max_quarantine_seconds = max_quarantine_seconds
+        self.smoothing = smoothing
+        self.min_weight = min_weight
+        self.rng = rng or random.Random()
+        self.table: Dict[str, Dict[str, AgentHealth]] = {}
+        self.quarantines = 0
+
+    def get(self, domain: str, agent: str) -> AgentHealth:
+        agents = self.table.setdefault(domain, {})
+        health = agents.get(agent)
+        if health is None:
+            health = agents[agent] = AgentHealth()
+        return health
+
+    def choose(self, domain: str, agents: Sequence[str], now: float) -> str:
+        """Random agent weighted by score, skipping quarantined agents unless every agent is quarantined"""
+        healths = [self.get(domain, agent) for agent in agents]
+        available = [(agent, h) for agent, h in zip(agents, healths) if h.quarantined_until <= now]
+        if not available:
+            return min(zip(agents, healths), key=lambda pair: pair[1].quarantined_until)[0]
+        weights = [max(h.score, self.min_weight) for _, h in available]
+        return self.rng.choices(available, weights=weights)[0][0]
+
+    def record(self, domain: str, agent: str, ok: bool, now: float) -> AgentHealth:
+        health = self.get(domain, agent)
+        health.seen = True
+        health.score += self.smoothing * ((1.0 if ok else 0.0) - health.score)
+        if ok:
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.quarantine_count = 0
+            return health
+
+        health.failures += 1
+        health.consecutive_failures += 1
+        # a failed probe after a quarantine goes straight back, otherwise it takes a run of failures
+        probing = health.quarantine_count > 0 and health.quarantined_until <= now
+        if health.quarantined_until <= now and (probing or health.consecutive_failures >= self.failure_threshold):
+            duration = min(self.quarantine_seconds * 2 ** health.quarantine_count, self.max_quarantine_seconds)
+            health.quarantined_until = now + duration
+            health.quarantine_count += 1
+            self.quarantines += 1
+        return health
+
+    def stats_table(self, now: float) -> Dict[str, Dict[str, Dict[str, Union[int, float, bool]]]]:
+        """Agents used this run per domain, for the spider stats"""
+        table = {}
+        for domain, agents in self.table.items():
+            rows = {
+                agent: {**health.as_state(), "quarantined": health.quarantined_until > now}
+                for agent, health in agents.items()
+                if health.seen
+            }
+            if rows:
+                table[domain] = rows
+        return table
+
+    def load(self, path: Union[str, Path]) -> None:
+        """Start from a state file written by save, missing or unreadable files are ignored"""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") != STATE_VERSION:
+            return
+
+        for domain, agents in state.get("domains", {}).items():
+            for agent, saved in agents.items():
+                self.table.setdefault(domain, {})[agent] = AgentHealth(**saved)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Merge the agents used this run into the state file, everything else in it is kept"""
+        with locked_state_file(path) as path:
+            domains = {}
+            try:
+                with path.open() as f:
+                    saved = json.load(f)
+                if saved.get("version") == STATE_VERSION:
+                    domains = saved.get("domains", {})
+            except (OSError, ValueError):
+                pass
+            for domain, agents in self.table.items():
+                for agent, health in agents.items():
+                    if health.seen:
+                        domains.setdefault(domain, {})[agent] = health.as_state()
+
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": STATE_VERSION, "domains": domains}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, path)
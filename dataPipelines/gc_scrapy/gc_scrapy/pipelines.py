@@ -9,7 +9,10 @@
 ##########################################################################################
 
 import copy
+import shutil
+import threading
 from typing import Union
+from hashlib import sha256
 from itemadapter import ItemAdapter
 from datetime import datetime
 import os
@@ -18,11 +21,20 @@ import json
 from jsonschema.exceptions import ValidationError
 
 import scrapy
+from twisted.internet import defer, reactor, task, threads
+from twisted.python.threadpool import ThreadPool
 from scrapy.pipelines.media import MediaPipeline
 from scrapy.exceptions import DropItem
 
-from dataPipelines.gc_scrapy.gc_scrapy.utils import unzip_docs_as_needed
+from dataPipelines.gc_scrapy.gc_scrapy.utils import NameReservationIndex, unzip_docs_as_needed
 from .validators import DefaultOutputSchemaValidator, SchemaValidator
+from .GCSpider import GCSpider
+from .manifest_utils.index import ManifestIndex
+from .manifest_utils.digest_set import DigestSet
+from .manifest_utils.blob_store import BLOB_DIR_NAME, BlobStore
+from .manifest_utils.shards import shard_path
+from .manifest_utils.validator_store import DEFAULT_COMMIT_EVERY, ValidatorStore
+from .manifest_utils.writers import BufferedAppendWriter, DEFAULT_MAX_BUFFER_BYTES, DEFAULT_MAX_BUFFER_SECONDS
 from . import OUTPUT_FOLDER_NAME
 from .utils import dict_to_sha256_hex_digest, get_fqdn_from_web_url
 
@@ -41,24 +53,106 @@ class FileDownloadPipeline(MediaPipeline):
         settings.setdefault("MEDIA_ALLOW_REDIRECTS", True)
         super().__init__(download_func, settings)
 
-    previous_hashes = set()
+    previous_hashes: DigestSet
     output_dir: Path
     previous_manifest_path: Path
     job_manifest_path: Path
+    dead_queue_path: Path
+    manifest_writer: BufferedAppendWriter
+    dead_queue_writer: BufferedAppendWriter
     dont_filter_previous_hashes: bool
+    stream_downloads: bool
+    validator_store: Union[ValidatorStore, None]
+    blob_store: Union[BlobStore, None]
 
     def open_spider(self, spider):
         super().open_spider(spider)
         print("++ Initiating downloader for", spider.name)
 
         self.output_dir = Path(spider.download_output_dir).resolve()
-        self.job_manifest_path = Path(self.output_dir, "manifest.json").resolve()
+        # crawl --workers processes each write their own shards, merged by the parent when they're all done
+        shard_id = spider.settings.get("CRAWL_SHARD_ID")
+        self.job_manifest_path = shard_path(Path(self.output_dir, "manifest.json").resolve(), shard_id)
+        self.dead_queue_path = shard_path(Path(self.output_dir, "dead_queue.json").resolve(), shard_id)
+
+        writer_kwargs = {
+            "max_buffer_bytes": spider.settings.getint("MANIFEST_WRITER_MAX_BUFFER_BYTES", DEFAULT_MAX_BUFFER_BYTES),
+            "max_buffer_seconds": spider.settings.getfloat("MANIFEST_WRITER_MAX_BUFFER_SECONDS", DEFAULT_MAX_BUFFER_SECONDS),
+        }
+        self.manifest_writer = BufferedAppendWriter.acquire(self.job_manifest_path, **writer_kwargs)
+        self.dead_queue_writer = BufferedAppendWriter.acquire(self.dead_queue_path, **writer_kwargs)
+        # time based flush for when items stop coming in, size based flushes happen on write
+        self.writer_flush_loop = task.LoopingCall(self.flush_stale_writers)
+        self.writer_flush_loop.start(writer_kwargs["max_buffer_seconds"], now=False)
+
+        file_pool_threads = spider.settings.getint("FILE_PIPELINE_THREADS", 4)
+        self.file_thread_pool = ThreadPool(minthreads=1, maxthreads=file_pool_threads, name=f"FileDownloadPipeline-{spider.name}")
+        self.file_thread_pool.start()
+        self.file_pool_shutdown_trigger = reactor.addSystemEventTrigger("during", "shutdown", self.file_thread_pool.stop)
+        self.file_work_semaphore = defer.DeferredSemaphore(
+            spider.settings.getint("FILE_PIPELINE_MAX_PENDING", file_pool_threads * 2)
+        )
+
+        self.stream_downloads = getattr(spider, "stream_downloads", False) and (
+            type(spider).download_response_handler is GCSpider.download_response_handler
+        )
+        if getattr(spider, "stream_downloads", False) and not self.stream_downloads:
+            print(f"{spider.name} overrides download_response_handler, files will not be streamed to disk")
+        # the same response is handed to every item with the same download url, guards moving its streamed file
+        self.streamed_file_lock = threading.Lock()
+
+        # files are stored once per content hash and hardlinked to their output paths
+        if spider.settings.getbool("DOWNLOAD_BLOB_STORE", True):
+            self.blob_store = BlobStore.for_output_dir(self.output_dir)
+            self.duplicates_writer = BufferedAppendWriter.acquire(
+                shard_path(self.blob_store.duplicates_path, shard_id), **writer_kwargs
+            )
+        else:
+            self.blob_store = None
 
         self.previous_manifest_path = Path(spider.previous_manifest_location).resolve()
+        self.dont_filter_previous_hashes = spider.dont_filter_previous_hashes
+
+        # conditional requests only make sense when previously downloaded docs are being filtered
+        http_cache_location = getattr(spider, "http_cache_location", None)
+        if http_cache_location and not self.dont_filter_previous_hashes:
+            self.validator_store = ValidatorStore.acquire(
+                http_cache_location, commit_every=spider.settings.getint("HTTP_CACHE_COMMIT_EVERY", DEFAULT_COMMIT_EVERY)
+            )
+        else:
+            self.validator_store = None
+
+        # scoped to this spider, so hashes don't accumulate across every spider run by the cli
+        self.previous_hashes = DigestSet()
 
-        if not spider.dont_filter_previous_hashes:
+        if not self.dont_filter_previous_hashes:
             self.load_hashes_from_cumulative_manifest(self.previous_manifest_path, spider.name)
 
+    def close_spider(self, spider):
+        # every item has completed by now, so this only joins idle threads
+        reactor.removeSystemEventTrigger(self.file_pool_shutdown_trigger)
+        self.file_thread_pool.stop()
+
+        if self.writer_flush_loop.running:
+            self.writer_flush_loop.stop()
+
+        if self.validator_store is not None:
+            self.validator_store.release()
+
+        if self.blob_store is not None:
+            self.duplicates_writer.release()
+
+        for stat_prefix, writer in (("manifest_writer", self.manifest_writer), ("dead_queue_writer", self.dead_queue_writer)):
+            writer.release()
+            # writers are shared, so counters are cumulative for every spider that used the file
+            for k, v in writer.stats().items():
+                spider.crawler.stats.set_value(f"{stat_prefix}/{k}", v)
+
+    def flush_stale_writers(self):
+        for writer in (self.manifest_writer, self.dead_queue_writer):
+            if writer.is_stale():
+                writer.flush()
+
     def load_hashes_from_cumulative_manifest(self, previous_manifest_path, spider_name):
         file_location = Path(previous_manifest_path).resolve() if previous_manifest_path else None
 
@@ -69,24 +163,14 @@ class FileDownloadPipeline(MediaPipeline):
             else:
                 exit(1)
 
+        # index is built once per manifest file and shared by every spider in the process
         print("Reading in previous manifest")
-        count = 0
-        with file_location.open(mode="r") as f:
-            for line in f.readlines():
-                count += 1
-                if count % 1000 == 0:
-                    print(f"{count} lines read in")
-                if not line.strip():
-                    continue
-
-                jdoc = json.loads(line)
-                crawler_used = jdoc.get("crawler_used")
-                # covers old manifest items with no crawler info
-                if not crawler_used:
-                    self.previous_hashes.add(jdoc["version_hash"])
-                # skips adding hashes for other spiders for combined manifest files with that info
-                elif crawler_used == spider_name:
-                    self.previous_hashes.add(jdoc["version_hash"])
+        manifest_index = ManifestIndex.for_manifest(file_location)
+        self.previous_hashes = DigestSet(
+            capacity_hint=manifest_index.count(spider_name),
+            bloom_filter=self.crawler.settings.getbool("PREVIOUS_HASHES_BLOOM_FILTER", False),
+        )
+        self.previous_hashes.update(manifest_index.iter_hashes(spider_name))
 
         num_hashes = len(self.previous_hashes)
         print(f"Previous manifest loaded, will filter {num_hashes} hashes")
@@ -146,10 +230,20 @@ class FileDownloadPipeline(MediaPipeline):
                 "doc_type": file_item["doc_type"],
                 "compression_type": file_item["compression_type"],
             }
+            if self.stream_downloads:
+                # handled by download_handlers.py#StreamingDownloadHandler, temp files are kept under the blob dir
+                # so they're on the output dir's filesystem but never uploaded (run_job.sh excludes .blobs/*)
+                meta["stream_to_dir"] = str(Path(self.output_dir, BLOB_DIR_NAME, "streaming"))
+
+            headers = dict(info.spider.download_request_headers or {})
+            if self.validator_store is not None:
+                # a 304 means the file from the last download is still current
+                meta["http_cache_url"] = url
+                headers.update(self.validator_store.conditional_headers(url))
 
             try:
-                if info.spider.download_request_headers:
-                    yield scrapy.Request(url, headers=info.spider.download_request_headers, meta=meta)
+                if headers:
+                    yield scrapy.Request(url, headers=headers, meta=meta)
                 else:
                     yield scrapy.Request(url, meta=meta)
             except Exception as probably_url_error:
@@ -164,6 +258,8 @@ class FileDownloadPipeline(MediaPipeline):
         # Just filtering by response code
         if 200 <= response.status < 300:
             return (True, response, None)
+        elif response.status == 304 and "http_cache_url" in response.meta:
+            return (True, response, None)
         elif not len(response.body):
             return (False, response, "Response has empty body")
         else:
@@ -177,7 +273,6 @@ class FileDownloadPipeline(MediaPipeline):
         return (False, failure, "Pipeline Media Request Failed")
 
     def add_to_dead_queue(self, item, reason):
-        path = Path(self.output_dir, "dead_queue.json").resolve() if self.output_dir else None
         if isinstance(reason, int):
             reason_text = f"HTTP Response Code {reason}"
         elif isinstance(reason, str):
@@ -185,33 +280,25 @@ class FileDownloadPipeline(MediaPipeline):
         else:
             reason_text = "Unknown failure"
 
-        with open(path, "a+") as f:
-            dead_dict = {"document": dict(item), "failure_reason": reason_text}
-            try:
-                f.write(json.dumps(dead_dict))
-                f.write("\n")
-
-            except Exception as e:
-                print("Failed to write to dead_queue file", path, e)
-
-    def add_to_manifest(self, item):
-        path = self.job_manifest_path
-        with open(self.job_manifest_path, "a") as f:
-            try:
-                f.write(
-                    json.dumps(
-                        {
-                            "version_hash": item["version_hash"],
-                            "doc_name": item["doc_name"],
-                            "crawler_used": item["crawler_used"],
-                            "access_timestamp": item["access_timestamp"],
-                        }
-                    )
-                )
-                f.write("\n")
-
-            except Exception as e:
-                print("Failed to write to manifest file", path, e)
+        dead_dict = {"document": dict(item), "failure_reason": reason_text}
+        try:
+            self.dead_queue_writer.write_json(dead_dict)
+        except Exception as e:
+            print("Failed to write to dead_queue file", self.dead_queue_path, e)
+
+    def add_to_manifest(self, item, content_hash=None):
+        row = {
+            "version_hash": item["version_hash"],
+            "doc_name": item["doc_name"],
+            "crawler_used": item["crawler_used"],
+            "access_timestamp": item["access_timestamp"],
+        }
+        if content_hash:
+            row["content_hash"] = content_hash
+        try:
+            self.manifest_writer.write_json(row)
+        except Exception as e:
+            print("Failed to write to manifest file", self.job_manifest_path, e)
 
     def item_completed(self, results, item, info):
         """The function is called for each item after all media requests have been processed"""
@@ -219,6 +306,77 @@ class FileDownloadPipeline(MediaPipeline):
         if not info.downloaded:
             return item # return item for crawler output if download was skipped
 
+        # file writes and unzipping happen on the file pool so they don't stall the reactor,
+        # the semaphore caps queued work so a slow disk backs up into the scraper instead of memory
+        return self.file_work_semaphore.run(self.run_on_file_pool, self.store_downloaded_files, results, item, info.spider)
+
+    def run_on_file_pool(self, func, *args):
+        return threads.deferToThreadPool(reactor, self.file_thread_pool, func, *args)
+
+    def record_validators(self, response):
+        """Stage the response's ETag / Last-Modified for conditional requests in later runs, see ValidatorStore"""
+        streamed_file = response.meta.get("streamed_file")
+        if streamed_file:
+            content_sha256, content_length = streamed_file["sha256"], streamed_file["size"]
+        else:
+            content_sha256, content_length = sha256(response.body).hexdigest(), len(response.body)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        try:
+            self.validator_store.record(
+                response.meta["http_cache_url"],
+                etag=etag.decode("latin-1") if etag else None,
+                last_modified=last_modified.decode("latin-1") if last_modified else None,
+                content_length=content_length,
+                sha256=content_sha256,
+            )
+        except Exception as e:
+            print("Failed to record http validators for", response.meta["http_cache_url"], e)
+
+    def move_streamed_file(self, streamed_file, file_download_path, track_duplicates=True):
+        """Atomically rename a streamed download into place, copies it if another item already moved it"""
+        with self.streamed_file_lock:
+            moved_to = streamed_file.get("moved_to")
+            if self.blob_store is not None:
+                if moved_to is None:
+                    streamed_file["moved_to"] = str(self.blob_store.add_file(streamed_file["path"], streamed_file["sha256"]))
+            elif moved_to is None:
+                os.replace(streamed_file["path"], file_download_path)
+                streamed_file["moved_to"] = str(file_download_path)
+            elif moved_to != str(file_download_path):
+                shutil.copyfile(moved_to, file_download_path)
+
+        if self.blob_store is not None:
+            self.link_blob(streamed_file["sha256"], file_download_path, track_duplicates)
+        return streamed_file["sha256"]
+
+    def link_not_modified_file(self, response, file_download_path, track_duplicates=True):
+        """Link the file of a 304 response from the blob of its last download, returns its sha256 or None if there's
+        no blob for it. Validators without a blob are dropped so the next run downloads the whole file
+        """
+        url = response.meta["http_cache_url"]
+        validators = self.validator_store.get(url)
+        content_hash = validators and validators["sha256"]
+        if self.blob_store is not None and content_hash and self.blob_store.blob_path(content_hash).exists():
+            self.link_blob(content_hash, file_download_path, track_duplicates)
+            return content_hash
+        self.validator_store.record(url, etag=None, last_modified=None)
+        return None
+
+    def link_blob(self, content_hash, file_download_path, track_duplicates=True):
+        """Link an output path to its blob, duplicates of a file already linked in this job are listed for upload"""
+        first_path = self.blob_store.link(content_hash, file_download_path, track_duplicates)
+        if first_path is not None:
+            # stats and spider counters aren't thread safe, they're only touched on the reactor thread
+            reactor.callFromThread(self.crawler.stats.inc_value, "blob_store/duplicate_count")
+            self.duplicates_writer.write_line(
+                f"{Path(file_download_path).relative_to(self.output_dir)}\t{first_path.relative_to(self.output_dir)}"
+            )
+
+    def store_downloaded_files(self, results, item, spider):
+        """Writes downloaded files, unzips and writes metadata, runs on the file pool threads"""
+
         ### first in results is supposed to be 'ok' status but it always returns true b/c 404 doesnt cause failure for some reason :(
         ### so added to the media_downloaded function as a sub-tuple in return
         file_downloads = []
@@ -227,6 +385,12 @@ class FileDownloadPipeline(MediaPipeline):
             if not okay:
                 self.add_to_dead_queue(item, reason if reason else int(response.status))
             else:
+                # only listing metadata changed, the file is linked again from the blob of its last download
+                not_modified = response.status == 304
+                if not_modified:
+                    print(f"Not downloading {item.get('doc_name')} because it was not modified")
+                    reactor.callFromThread(spider.increment_not_modified)
+
                 # Get values from metadata:
                 output_file_name = response.meta["output_file_name"] # Assigned to metadata above in get_media_requests function
                 doc_type = response.meta["doc_type"]
@@ -255,18 +419,55 @@ class FileDownloadPipeline(MediaPipeline):
                 if not os.path.exists(directory):
                     os.makedirs(directory, exist_ok=True)
 
-                with open(file_download_path, "wb") as f: # Download each file to it's download path
+                # zips are removed once unzipped, so they can't be the source of a server side copy
+                track_duplicates = not compression_type
+                content_hash = None
+                if not_modified:
                     try:
-                        to_write = info.spider.download_response_handler(response)
-                        f.write(to_write)
-                        f.close()
+                        content_hash = self.link_not_modified_file(response, file_download_path, track_duplicates)
+                    except Exception as e:
+                        print("Failed to link not modified file to", file_download_path, "Error:", e)
+                        return item
+                    if content_hash is None:
+                        # no blob to link it from, the changed metadata still goes out, but without a manifest row
+                        # so the item isn't filtered by its version_hash before the file is downloaded again
+                        with open(metadata_download_path, "w") as f:
+                            try:
+                                f.write(json.dumps(dict(item)))
+                            except Exception as e:
+                                print("Failed to write metadata", metadata_download_path, e)
+                        continue
+                elif "streamed_file" in response.meta:
+                    try:
+                        content_hash = self.move_streamed_file(response.meta["streamed_file"], file_download_path, track_duplicates)
+                    except Exception as e:
+                        print("Failed to move streamed file to", file_download_path, "Error:", e)
+                        return item
+                elif self.blob_store is not None:
+                    try:
+                        content_hash, _ = self.blob_store.add_bytes(spider.download_response_handler(response))
+                        self.link_blob(content_hash, file_download_path, track_duplicates)
                     except Exception as e:
                         print("Failed to write file to", file_download_path, "Error:", e)
                         return item
+                else:
+                    with open(file_download_path, "wb") as f: # Download each file to it's download path
+                        try:
+                            to_write = spider.download_response_handler(response)
+                            f.write(to_write)
+                            f.close()
+                        except Exception as e:
+                            print("Failed to write file to", file_download_path, "Error:", e)
+                            return item
+
+                if self.validator_store is not None and "http_cache_url" in response.meta and not not_modified:
+                    self.record_validators(response)
 
                 if compression_type:
                     if compression_type.lower() == "zip":
-                        unzipped_files = unzip_docs_as_needed(file_download_path, file_unzipped_path, doc_type) # Unzip downloaded zip documents
+                        unzipped_files = unzip_docs_as_needed(
+                            file_download_path, file_unzipped_path, doc_type, NameReservationIndex.for_dir(self.output_dir)
+                        ) # Unzip downloaded zip documents
 
                         if unzipped_files: # If files have been unzipped...
                             for unzipped_item in self.create_items_from_nested_zip(unzipped_files, item): # Create new DocItem for each unzipped file
@@ -294,10 +495,10 @@ class FileDownloadPipeline(MediaPipeline):
                         except Exception as e:
                             print("Failed to write metadata", file_download_path, e)
 
-                file_downloads.append(file_download_path)
+                file_downloads.append((file_download_path, content_hash))
 
         if file_downloads: # If file was downloaded, add to manifest
-            self.add_to_manifest(item)
+            self.add_to_manifest(item, content_hash=file_downloads[0][1] if file_downloads else None)
 
         if len(unzipped_items) > 1: # If there were unzipped files, return each as item in list 'unzipped_items'
             return unzipped_items
@@ -382,7 +583,9 @@ class ValidateJsonPipeline:
     """Validates json as Scrapy passes each item to be validated to self.process_item
     :param validator: output validator"""
 
-    def __init__(self, validator: SchemaValidator = DefaultOutputSchemaValidator()):
+    def __init__(self, validator: SchemaValidator = None):
+        # the default is compiled from output_spec.json once per process
+        validator = validator if validator is not None else DefaultOutputSchemaValidator()
 
         if not isinstance(validator, SchemaValidator):
             raise TypeError("arg: validator must be of type SchemaValidator")
@@ -390,7 +593,12 @@ class ValidateJsonPipeline:
         self.validator = validator
 
     def process_item(self, item, spider):
-        item_dict = ItemAdapter(item).asdict()
+        adapter = ItemAdapter(item)
+        # a shallow copy is enough to check valid items, nested items aren't dicts so they fail and get converted below
+        if self.validator.is_valid(dict(adapter)):
+            return item
+
+        item_dict = adapter.asdict()
         name = item_dict.get("doc_name", str(item_dict))
 
         try:
@@ -407,6 +615,7 @@ class JsonWriterPipeline(object):
         json_name = "./" + OUTPUT_FOLDER_NAME + "/" + spider.name + ".json"
 
         self.file = open(json_name, "w")
+        self.validator = DefaultOutputSchemaValidator()
         # Your scraped items will be saved in the file 'scraped_items.json'.
         # You can change the filename to whatever you want.
 
@@ -416,8 +625,7 @@ class JsonWriterPipeline(object):
     def process_item(self, item, spider):
         doc = item["document"]
 
-        validator = DefaultOutputSchemaValidator()
-        validator.validate(doc)
+        self.validator.validate(doc)
         self.file.write(doc + "\n")
         return doc
 
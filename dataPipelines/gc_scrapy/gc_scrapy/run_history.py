@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.run_history
+-----------------
+Per spider history of crawl runs, from the stats GCSpider.close collects, kept in a json file between jobs.
+
+The crawl cli uses it to predict how long each spider will take and start the longest ones first (and spread them
+over workers), so one slow crawler doesn't start last and hold up the whole job.
+"""
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from statistics import median
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from dataPipelines.gc_scrapy.gc_scrapy.utils import locked_state_file
+
+STATE_VERSION = 1
+ELAPSED_STAT = "Elapsed Time (sec)"
+ITEMS_STAT = "Item Scraped Count"
+BYTES_STAT = "Response Bytes"
+CLOSE_REASON_STAT = "Close Reason"
+MODULE_STAT = "Spider Module"
+
+
+def module_name(spider_module: str) -> str:
+    """Spider module as listed in schedule files and the spiders dir, without a package or .py"""
+    name = spider_module.strip()
+    if name.endswith(".py"):
+        name = name[:-3]
+    return name.rsplit(".", 1)[-1]
+
+
+class RunHistory:
+    """Recent runs of each spider, keyed by spider name
+    :param max_runs: runs kept per spider
+    :param predict_from: most recent runs a predicted duration is the median of
+    """
+
+    def __init__(self, max_runs: int = 20, predict_from: int = 5):
+        self.max_runs = max_runs
+        self.predict_from = predict_from
+        self.spiders: Dict[str, dict] = {}
+        # spiders with runs recorded since the history was loaded, the only ones save writes over
+        self.recorded: Set[str] = set()
+
+    def record(self, spider_name: str, stats: dict, finished_at: Optional[datetime] = None) -> None:
+        """Add a run from a spider's GCSpider.stats entry, runs without an elapsed time are ignored"""
+        elapsed = stats.get(ELAPSED_STAT)
+        if elapsed is None:
+            return
+        spider = self.spiders.setdefault(spider_name, {"module": None, "runs": []})
+        if stats.get(MODULE_STAT):
+            spider["module"] = module_name(stats[MODULE_STAT])
+        spider["runs"].append({
+            "finished_at": (finished_at or datetime.now()).isoformat(timespec="seconds"),
+            "elapsed": round(float(elapsed), 3),
+            "items": stats.get(ITEMS_STAT, 0),
+            "bytes": stats.get(BYTES_STAT, 0),
+            "close_reason": stats.get(CLOSE_REASON_STAT),
+        })
+        del spider["runs"][:-self.max_runs]
+        self.recorded.add(spider_name)
+
+    def _predict(self, spider_name: str, field: str) -> Optional[float]:
+        """Median of field over the spider's recent finished runs (any runs if none finished), None if unknown"""
+        runs = self.spiders.get(spider_name, {}).get("runs", [])
+        finished = [run for run in runs if run["close_reason"] == "finished"] or runs
+        values = [run[field] for run in finished[-self.predict_from:] if run.get(field) is not None]
+        return median(values) if values else None
+
+    def predicted_duration(self, spider_name: str) -> Optional[float]:
+        return self._predict(spider_name, "elapsed")
+
+    def predicted_bytes(self, spider_name: str) -> Optional[float]:
+        return self._predict(spider_name, "bytes")
+
+    def _by_module(self, modules: Iterable[str], field: str) -> Dict[str, float]:
+        # spiders without history get the largest known prediction, so they're started early rather than last
+        known = {}
+        for spider_name, spider in self.spiders.items():
+            predicted = self._predict(spider_name, field)
+            if spider["module"] and predicted is not None:
+                known[spider["module"]] = predicted
+        unknown = max(known.values(), default=0.0)
+        return {module: known.get(module_name(module), unknown) for module in modules}
+
+    def predicted_durations(self, modules: Iterable[str]) -> Dict[str, float]:
+        """Predicted seconds for each spider module (as listed in schedule files)"""
+        return self._by_module(modules, "elapsed")
+
+    def predicted_bytes_by_module(self, modules: Iterable[str]) -> Dict[str, float]:
+        """Predicted bytes downloaded by each spider module (as listed in schedule files)"""
+        return self._by_module(modules, "bytes")
+
+    def load(self, path: Union[str, Path]) -> None:
+        """Start from a history file written by save, missing or unreadable files are ignored"""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") != STATE_VERSION:
+            return
+        self.spiders.update(state.get("spiders", {}))
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Merge the recorded spiders into the history file, spiders saved there by other crawls since are kept"""
+        with locked_state_file(path) as path:
+            saved = RunHistory()
+            saved.load(path)
+            spiders = {**self.spiders, **saved.spiders}
+            spiders.update({spider_name: self.spiders[spider_name] for spider_name in self.recorded})
+
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": STATE_VERSION, "spiders": spiders}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, path)
+
+
+def order_longest_first(items: Iterable[str], durations: Dict[str, float]) -> List[str]:
+    """Items by predicted duration, longest first, ties keep their order"""
+    return sorted(items, key=lambda item: -durations.get(item, 0.0))
+
+
+def partition_longest_first(items: Iterable[str], durations: Dict[str, float], partitions: int) -> List[List[str]]:
+    """Longest processing time first packing, each item goes to the partition with the least predicted time so far.
+    Partitions keep their items longest first, empty partitions are dropped
+    """
+    bins: List[List[str]] = [[] for _ in range(partitions)]
+    loads = [0.0] * partitions
+    for item in order_longest_first(items, durations):
+        # ties go to the emptier partition, so equal durations are dealt out round robin
+        target = min(range(partitions), key=lambda i: (loads[i], len(bins[i]), i))
+        bins[target].append(item)
+        loads[target] += durations.get(item, 0.0)
+    return [partition for partition in bins if partition]
@@ -1,3 +1,10 @@
+# writes FileDownloadPipeline downloads to disk as they arrive, other requests are downloaded as usual
+# .. only set for spiders with stream_downloads (GCSpider.update_settings), it swaps out a scrapy internal
+streaming_download_handlers = {
+    "http": "dataPipelines.gc_scrapy.gc_scrapy.download_handlers.StreamingDownloadHandler",
+    "https": "dataPipelines.gc_scrapy.gc_scrapy.download_handlers.StreamingDownloadHandler",
+}
+
 general_settings = {
     "ITEM_PIPELINES": {
         "dataPipelines.gc_scrapy.gc_scrapy.pipelines.FileNameFixerPipeline": 50,
@@ -11,6 +18,8 @@ general_settings = {
     },
     "DOWNLOADER_MIDDLEWARES": {
         "dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares.BanEvasionMiddleware": 100,
+        # after RetryMiddleware (550) so it sees every 429/5xx and timeout before they're retried
+        "dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares.AdaptiveRateMiddleware": 560,
     },
     # 'STATS_DUMP': False,
     "ROBOTSTXT_OBEY": False,
@@ -23,6 +32,34 @@ general_settings = {
     "RETRY_ENABLE": True,
     "RETRY_TIMES": 2,
     "CONCURRENT_REQUESTS": 10,
+
+    # Put a bloom filter in front of the previous manifest hash set (FileDownloadPipeline)
+    "PREVIOUS_HASHES_BLOOM_FILTER": False,
+    # Buffering for manifest.json / dead_queue.json appends (FileDownloadPipeline)
+    "MANIFEST_WRITER_MAX_BUFFER_BYTES": 256 * 1024,
+    "MANIFEST_WRITER_MAX_BUFFER_SECONDS": 5.0,
+    # Threads for file writes / unzipping and how many items may queue for them (FileDownloadPipeline)
+    "FILE_PIPELINE_THREADS": 4,
+    "FILE_PIPELINE_MAX_PENDING": 8,
+    # Store downloads once per content hash under <download dir>/.blobs and hardlink output files to them (FileDownloadPipeline)
+    "DOWNLOAD_BLOB_STORE": True,
+    # Write buffer for downloads of spiders with stream_downloads (StreamingDownloadHandler)
+    "STREAM_DOWNLOAD_CHUNK_SIZE": 1024 * 1024,
+    # Requests per domain that can skip randomly_delay_request spacing back to back (BanEvasionMiddleware)
+    # .. user agent health scores are kept between runs in the json file at USER_AGENT_HEALTH_STATE_PATH,
+    # .. set by crawl --user-agent-health-location
+    "RANDOM_DELAY_BURST": 1,
+    # Per host concurrency/delay/timeout tuning starting from the values above (AdaptiveRateMiddleware)
+    # .. hosts grow up to the max concurrency and down to the min delay below, a CONCURRENT_REQUESTS_PER_DOMAIN or
+    # .. DOWNLOAD_DELAY set in a spider's own custom_settings is its limit instead, spiders with AUTOTHROTTLE_ENABLED skip it
+    # .. learned limits are kept between runs in the json file at ADAPTIVE_RATE_STATE_PATH, set by crawl --rate-state-location
+    "ADAPTIVE_RATE_ENABLED": True,
+    "ADAPTIVE_RATE_MAX_CONCURRENCY": 16,
+    "ADAPTIVE_RATE_MIN_DELAY": 0.0,
+    "ADAPTIVE_RATE_MAX_DELAY": 30.0,
+    "ADAPTIVE_RATE_MAX_TIMEOUT": 60.0,
+    "ADAPTIVE_RATE_TARGET_LATENCY": 2.0,
+    "ADAPTIVE_RATE_WINDOW": 20,
 }
 selenium_settings = {
     "SELENIUM_DRIVER_NAME": "chrome",
@@ -36,11 +73,28 @@ selenium_settings = {
         "--disable-setuid-sandbox",
         "--enable-javascript",
     ],
+    # Drivers running at once and pages each renders before it's replaced (SeleniumMiddleware)
+    "SELENIUM_DRIVER_POOL_SIZE": 2,
+    "SELENIUM_DRIVER_MAX_PAGES": 100,
+    # Fast mode drivers skip images and return from page loads at DOMContentLoaded, and requests block the resource
+    # .. types and url patterns below, SeleniumRequest(fast_mode=...) overrides it per request (SeleniumMiddleware)
+    "SELENIUM_FAST_MODE": False,
+    "SELENIUM_BLOCKED_RESOURCE_TYPES": ["image", "media", "font"],
+    "SELENIUM_BLOCKED_URL_PATTERNS": [
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*dap.digitalgov.gov*",
+    ],
+    "SPIDER_MIDDLEWARES": {
+        # wraps every other spider middleware so drivers are only returned once the callback output is consumed
+        "dataPipelines.gc_scrapy.gc_scrapy.spider_middlewares.SeleniumDriverLeaseMiddleware": 10,
+    },
     "DOWNLOADER_MIDDLEWARES": {
         **general_settings["DOWNLOADER_MIDDLEWARES"],
-        "dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares.SeleniumMiddleware": max(
-            general_settings["DOWNLOADER_MIDDLEWARES"].values()
-        )
+        "dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares.SeleniumMiddleware": general_settings[
+            "DOWNLOADER_MIDDLEWARES"
+        ]["dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares.BanEvasionMiddleware"]
         + 1,
     },
 }
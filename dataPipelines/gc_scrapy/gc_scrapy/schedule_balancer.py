@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.schedule_balancer
+-----------------
+Spreads spiders over the weekly crawler schedule (paasJobs/crawler_schedule/<day>.txt) using their run history.
+
+Spiders are placed longest first, each on the day that keeps things most even: first avoiding days that already
+crawl one of its hosts (two spiders hammering the same site on the same day), then days it would push past the
+job window, then the day with the least predicted time and bytes downloaded so far.
+"""
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+from .run_history import order_longest_first
+
+WEEK_DAYS = ("sunday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday")
+# how much a day's share of the week's bytes counts against its share of the week's crawl time
+BYTES_WEIGHT = 0.25
+
+
+def normalize_host(host: str) -> str:
+    host = host.strip().lower().split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+def spider_hosts(allowed_domains: Iterable[str], start_urls: Iterable[str]) -> Set[str]:
+    """Hosts a spider crawls, from its allowed_domains and start_urls"""
+    hosts = {normalize_host(domain) for domain in allowed_domains or ()}
+    hosts |= {normalize_host(urlparse(url).netloc) for url in start_urls or () if urlparse(url).netloc}
+    return {host for host in hosts if host}
+
+
+def day_runtime(spiders: Iterable[str], durations: Dict[str, float], parallel_spiders: int = 1) -> float:
+    """Predicted seconds for a day's crawl, spiders run longest first on parallel_spiders slots"""
+    slots = [0.0] * max(parallel_spiders, 1)
+    for spider in order_longest_first(spiders, durations):
+        slots[slots.index(min(slots))] += durations.get(spider, 0.0)
+    return max(slots)
+
+
+def host_conflicts(spiders: Iterable[str], hosts: Dict[str, Set[str]]) -> List[str]:
+    """Hosts crawled by more than one of the spiders"""
+    seen: Set[str] = set()
+    conflicts: Set[str] = set()
+    for spider in spiders:
+        spider_hosts = hosts.get(spider, set())
+        conflicts |= seen & spider_hosts
+        seen |= spider_hosts
+    return sorted(conflicts)
+
+
+def balance_week(
+    spiders: Iterable[str],
+    durations: Dict[str, float],
+    downloaded_bytes: Dict[str, float],
+    hosts: Dict[str, Set[str]],
+    window_seconds: float,
+    days: Iterable[str] = WEEK_DAYS,
+    parallel_spiders: int = 1,
+) -> Dict[str, List[str]]:
+    """
+    :param spiders: spider modules as listed in the day files
+    :param durations: predicted seconds per spider
+    :param downloaded_bytes: predicted bytes downloaded per spider
+    :param hosts: normalized hosts each spider crawls
+    :param window_seconds: time a day's job has before the next one starts
+    :param parallel_spiders: spiders the job crawls at once (crawl --max-parallel-spiders)
+    :returns: day -> spiders, longest first
+    """
+    spiders = list(spiders)
+    week: Dict[str, List[str]] = {day: [] for day in days}
+    total_seconds = sum(durations.get(s, 0.0) for s in spiders) or 1.0
+    total_bytes = sum(downloaded_bytes.get(s, 0.0) for s in spiders) or 1.0
+    day_hosts: Dict[str, Set[str]] = {day: set() for day in week}
+    day_bytes: Dict[str, float] = {day: 0.0 for day in week}
+
+    def placement_cost(spider: str, day: str):
+        runtime = day_runtime(week[day] + [spider], durations, parallel_spiders)
+        load = runtime / total_seconds + BYTES_WEIGHT * (day_bytes[day] + downloaded_bytes.get(spider, 0.0)) / total_bytes
+        return len(day_hosts[day] & hosts.get(spider, set())), runtime > window_seconds, load, len(week[day])
+
+    for spider in order_longest_first(spiders, durations):
+        day = min(week, key=lambda d: placement_cost(spider, d))
+        week[day].append(spider)
+        day_hosts[day] |= hosts.get(spider, set())
+        day_bytes[day] += downloaded_bytes.get(spider, 0.0)
+    return week
+
+
+def week_report(
+    week: Dict[str, List[str]],
+    durations: Dict[str, float],
+    downloaded_bytes: Dict[str, float],
+    hosts: Dict[str, Set[str]],
+    window_seconds: float,
+    parallel_spiders: int = 1,
+) -> Dict[str, dict]:
+    """Predicted runtime, bytes and host conflicts of each day"""
+    return {
+        day: {
+            "spiders": len(spiders),
+            "runtime": day_runtime(spiders, durations, parallel_spiders),
+            "bytes": sum(downloaded_bytes.get(s, 0.0) for s in spiders),
+            "host_conflicts": host_conflicts(spiders, hosts),
+            "over_window": day_runtime(spiders, durations, parallel_spiders) > window_seconds,
+        }
+        for day, spiders in week.items()
+    }
+
+
+def format_week_report(current: Dict[str, dict], balanced: Dict[str, dict], window_seconds: Optional[float]) -> str:
+    def hours(seconds):
+        return f"{seconds / 3600:6.2f}h"
+
+    lines = [f"{'day':<10} {'current':>8} {'balanced':>8}  {'GB':>6}  spiders  host conflicts"]
+    for day in balanced:
+        lines.append(
+            f"{day:<10} {hours(current[day]['runtime']):>8} {hours(balanced[day]['runtime']):>8}  "
+            f"{balanced[day]['bytes'] / 1e9:6.2f}  {balanced[day]['spiders']:>7}  "
+            f"{', '.join(balanced[day]['host_conflicts']) or '-'}"
+            f"{'  OVER WINDOW' if balanced[day]['over_window'] else ''}"
+        )
+
+    current_longest = max(day["runtime"] for day in current.values())
+    balanced_longest = max(day["runtime"] for day in balanced.values())
+    saved = 1 - balanced_longest / current_longest if current_longest else 0.0
+    lines.append("")
+    lines.append(f"longest day: {hours(current_longest).strip()} -> {hours(balanced_longest).strip()} ({abs(saved):.0%} {'shorter' if saved >= 0 else 'longer'})")
+    lines.append(
+        "host conflicts: "
+        f"{sum(len(day['host_conflicts']) for day in current.values())} -> "
+        f"{sum(len(day['host_conflicts']) for day in balanced.values())}"
+    )
+    if window_seconds:
+        lines.append(
+            f"days over the {hours(window_seconds).strip()} window: "
+            f"{sum(day['over_window'] for day in current.values())} -> "
+            f"{sum(day['over_window'] for day in balanced.values())}"
+        )
+    return "\n".join(lines)
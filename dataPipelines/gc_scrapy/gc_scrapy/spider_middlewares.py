@@ -0,0 +1,22 @@
+class SeleniumDriverLeaseMiddleware:
+    """Hands a response's pooled selenium driver back to SeleniumMiddleware's pool once the callback
+    is done with it, i.e. when its output has been fully consumed or it raised
+    """
+
+    def process_spider_output(self, response, result, spider):
+        lease = response.meta.get("driver_lease")
+        if lease is None:
+            return result
+        return self._release_when_done(result, lease)
+
+    @staticmethod
+    def _release_when_done(result, lease):
+        try:
+            yield from result
+        finally:
+            lease.release()
+
+    def process_spider_exception(self, response, exception, spider):
+        lease = response.meta.get("driver_lease")
+        if lease is not None:
+            lease.release()
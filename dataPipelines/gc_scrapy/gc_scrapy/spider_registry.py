@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+gc_scrapy.spider_registry
+-----------------
+Index of the spiders in gc_scrapy/spiders, read from their source with ast instead of importing them.
+
+Each spider module maps to its spider classes: class name, spider name, whether it's a selenium spider, and its
+allowed_domains / start_urls. The cli uses it to list, filter and validate the spiders of a schedule, so the only
+spider modules imported (with whatever they pull in, selenium, pandas...) are the ones that actually run.
+
+Scans are cached in spiders/__pycache__, a module is only parsed again when its mtime or size changes.
+"""
+import ast
+import json
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from urllib.parse import urljoin
+
+SPIDERS_DIR = Path(__file__).parent / "spiders"
+SPIDERS_PACKAGE = "dataPipelines.gc_scrapy.gc_scrapy.spiders"
+CACHE_VERSION = 1
+
+SELENIUM_SPIDER_BASES = {"GCSeleniumSpider"}
+SPIDER_BASES = {"GCSpider", "Spider", "CrawlSpider", "SitemapSpider", *SELENIUM_SPIDER_BASES}
+
+
+def _base_name(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _static_value(node: ast.expr, names: dict):
+    """Value of a literal, allowing f-strings, +, urljoin and names assigned earlier in the class, None if not static"""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [_static_value(element, names) for element in node.elts]
+        return None if None in values else values
+    if isinstance(node, ast.Name):
+        return names.get(node.id)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _static_value(node.left, names), _static_value(node.right, names)
+        if isinstance(left, str) and isinstance(right, str) or isinstance(left, list) and isinstance(right, list):
+            return left + right
+        return None
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                value = value.value
+            part = _static_value(value, names)
+            if not isinstance(part, (str, int, float)):
+                return None
+            parts.append(str(part))
+        return "".join(parts)
+    if isinstance(node, ast.Call) and _base_name(node.func) == "urljoin" and len(node.args) == 2 and not node.keywords:
+        base, url = (_static_value(arg, names) for arg in node.args)
+        return urljoin(base, url) if isinstance(base, str) and isinstance(url, str) else None
+    return None
+
+
+def scan_spider_source(source: str) -> List[dict]:
+    """Spider classes defined in a module's source, in definition order like scrapy's iter_spider_classes"""
+    spiders = []
+    module_classes: Dict[str, dict] = {}
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [_base_name(base) for base in node.bases]
+        parents = [module_classes[base] for base in bases if base in module_classes]
+        if not parents and not SPIDER_BASES.intersection(bases):
+            continue
+
+        # class attributes, starting from the ones inherited from spider classes earlier in the module
+        names = {}
+        for parent in reversed(parents):
+            names.update(parent["names"])
+        for statement in node.body:
+            if isinstance(statement, ast.Assign):
+                targets, value = statement.targets, statement.value
+            elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+                targets, value = [statement.target], statement.value
+            else:
+                continue
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    names[target.id] = _static_value(value, names)
+
+        selenium = bool(SELENIUM_SPIDER_BASES.intersection(bases)) or any(parent["selenium"] for parent in parents)
+        module_classes[node.name] = {"names": names, "selenium": selenium}
+        if not isinstance(names.get("name"), str) or not names["name"]:
+            # scrapy doesn't treat spider classes without a name as spiders either
+            continue
+        spiders.append({
+            "class_name": node.name,
+            "name": names["name"],
+            "selenium": selenium,
+            "allowed_domains": [d for d in names.get("allowed_domains") or [] if isinstance(d, str)],
+            "start_urls": [u for u in names.get("start_urls") or [] if isinstance(u, str)],
+        })
+    return spiders
+
+
+class SpiderRegistry:
+    """Spider modules of a spiders dir by module name (file name without .py)
+    :param spiders_dir: dir of spider modules, files starting with _ are skipped
+    :param cache_path: json file scans are kept in between runs, None to only keep them in memory
+    """
+
+    def __init__(self, spiders_dir: Union[str, Path] = SPIDERS_DIR,
+                 cache_path: Union[str, Path, None] = SPIDERS_DIR / "__pycache__" / "spider_registry.json"):
+        self.spiders_dir = Path(spiders_dir)
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.modules: Dict[str, dict] = {}
+        self._cache_loaded = False
+
+    def refresh(self) -> None:
+        """Scan modules added or changed since the last scan and drop removed ones"""
+        if not self._cache_loaded:
+            self._load_cache()
+            self._cache_loaded = True
+
+        changed = False
+        found = set()
+        for path in sorted(self.spiders_dir.glob("*.py")):
+            if path.name.startswith("_"):
+                continue
+            module = path.stem
+            found.add(module)
+            stat = path.stat()
+            cached = self.modules.get(module)
+            if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                continue
+            try:
+                spiders = scan_spider_source(path.read_text(encoding="utf-8"))
+            except (SyntaxError, UnicodeDecodeError, ValueError) as e:
+                print(f"Could not scan spider module {path}: {e}")
+                spiders = []
+            self.modules[module] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "spiders": spiders}
+            changed = True
+
+        for module in set(self.modules) - found:
+            del self.modules[module]
+            changed = True
+        if changed:
+            self._save_cache()
+
+    def spider_modules(self) -> List[str]:
+        """Modules defining at least one spider, sorted"""
+        self.refresh()
+        return sorted(module for module, entry in self.modules.items() if entry["spiders"])
+
+    def get(self, module: str) -> Optional[dict]:
+        """First spider of a module (the one the cli runs), None if it isn't a spider module"""
+        self.refresh()
+        entry = self.modules.get(module)
+        return entry["spiders"][0] if entry and entry["spiders"] else None
+
+    def find_by_name(self, spider_name: str) -> Optional[str]:
+        """Module of the spider with this spider name"""
+        for module in self.spider_modules():
+            if self.modules[module]["spiders"][0]["name"] == spider_name:
+                return module
+        return None
+
+    def _load_cache(self) -> None:
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") == CACHE_VERSION and state.get("spiders_dir") == str(self.spiders_dir.resolve()):
+            self.modules.update(state.get("modules", {}))
+
+    def _save_cache(self) -> None:
+        # a read only install still works, it just scans every run
+        if not self.cache_path:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": CACHE_VERSION, "spiders_dir": str(self.spiders_dir.resolve()),
+                           "modules": self.modules}, f, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not write spider registry cache {self.cache_path}: {e}")
+
+
+@lru_cache(maxsize=None)
+def default_registry() -> SpiderRegistry:
+    """Registry of gc_scrapy/spiders shared by the cli"""
+    return SpiderRegistry()
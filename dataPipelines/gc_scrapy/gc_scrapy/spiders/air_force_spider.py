@@ -4,10 +4,8 @@ from scrapy import Selector
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select, WebDriverWait
-from selenium.webdriver import Chrome
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 import re
-import time
 
 from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_request import SeleniumRequest
 from dataPipelines.gc_scrapy.gc_scrapy.items import DocItem
@@ -51,6 +49,7 @@ class AirForcePubsSpider(GCSeleniumSpider):
     ] # URL where the spider begins crawling
 
     file_type = "pdf" # Define filetype for the spider to identify.
+    selenium_request_all_start_urls = True # Render the categories concurrently
 
     cac_required_options = ['physical.pdf', 'PKI certificate required', 'placeholder', 'FOUO', 
                             'for_official_use_only'] # Possible values in raw URLs or titles for documents that would indicate 
@@ -59,6 +58,11 @@ class AirForcePubsSpider(GCSeleniumSpider):
     item_count_dropdown_selector = 'label select[name="data_length"]' # Count of a given dropdown's selection options
     table_selector = "table.epubs-table.dataTable.no-footer.dtr-inline" # Define CSS selector for tables
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the category walk clicks and waits on the driver pool's thread, not the reactor
+        self.selenium_request_overrides = {"driver_callback": self.walk_category}
+
     def select_dropdown(self, driver):
         dropdown = WebDriverWait(driver, 5).until(
             EC.visibility_of_element_located((By.CSS_SELECTOR, self.item_count_dropdown_selector)))
@@ -67,45 +71,54 @@ class AirForcePubsSpider(GCSeleniumSpider):
 
     def parse(self, response):
         '''
-        This function finds the the "Product Index" table at the end of each of the "dropdown" (or element tree) pathways.
+        This function parses the "Product Index" table pages walk_category collected for a category.
         The parse_table function is called to get documents.
         '''
-        driver: Chrome = response.meta["driver"] # Assign Chrome as the WebDriver instance to perform "user" actions  ##(**What is .meta['driver']?)
+        for source_page_url, page_source in response.meta.get("driver_result") or []:
+            for item in self.parse_table(page_source, source_page_url):
+                yield item
+
+    def walk_category(self, driver, request):
+        '''
+        This function finds the the "Product Index" table at the end of each of the "dropdown" (or element tree) pathways
+        and returns the (url, page source) of every page of each table. It runs as the SeleniumRequest driver_callback,
+        on the driver pool's thread, once the start url is loaded.
+        '''
+        # each start url is its own request, rendered by SeleniumMiddleware on a pooled driver
+        page_url = request.meta["start_url"]
+        self.wait_for_dom_stable(driver)
         
-        for page_url in self.start_urls:
-            driver.get(page_url)
-            time.sleep(5)
-            
-            init_webpage = Selector(text=driver.page_source)
-            
-            cat_id_raw = re.search('(catID=\d*)', page_url, re.IGNORECASE) # Find Category ID from URL
-            cat_id = str(cat_id_raw.group(0)).replace("ID=", "-").lower()
-            
-            organizations = init_webpage.css(f'#{cat_id} > div > ul > li a::text').getall() # List of organizations in specified category
+        init_webpage = Selector(text=driver.page_source)
+        
+        cat_id_raw = re.search('(catID=\d*)', page_url, re.IGNORECASE) # Find Category ID from URL
+        cat_id = str(cat_id_raw.group(0)).replace("ID=", "-").lower()
+        
+        organizations = init_webpage.css(f'#{cat_id} > div > ul > li a::text').getall() # List of organizations in specified category
+        
+        # if page_url.endswith('catID=2'):  # Optional condition to pull AF Reserve Command docs from Major Commands section
+        #     organizations = ['Air Force Reserve Command'] 
+        
+        table_pages = []
+        for org in organizations:
+            try:
+                driver.execute_script("arguments[0].click();", WebDriverWait(driver, 10).until(
+                    EC.element_to_be_clickable((By.LINK_TEXT, org))))
             
-            # if page_url.endswith('catID=2'):  # Optional condition to pull AF Reserve Command docs from Major Commands section
-            #     organizations = ['Air Force Reserve Command'] 
+                all_pubs = WebDriverWait(driver, 5).until(
+                    EC.visibility_of_element_located((By.LINK_TEXT, '00   ALL PUBLICATIONS')))
+            except:
+                driver.back()
+                print(f"Failed to find publications link for: {org} at {page_url}")
+                continue
             
-            for org in organizations:
-                try:
-                    driver.execute_script("arguments[0].click();", WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.LINK_TEXT, org))))
-                
-                    all_pubs = WebDriverWait(driver, 5).until(
-                        EC.visibility_of_element_located((By.LINK_TEXT, '00   ALL PUBLICATIONS')))
-                except:
-                    driver.back()
-                    print(f"Failed to find publications link for: {org} at {page_url}")
-                    continue
-                
+            try:
                 all_pubs.click()
- 
+     
                 anchor_after_current_selector = "div.dataTables_paginate.paging_simple_numbers a.paginate_button.current + a" # Next page button element
                 
                 self.select_dropdown(driver)
                 
-                for item in self.parse_table(driver):
-                    yield item
+                table_pages.append((driver.current_url, driver.page_source))
                             
                 try:
                     last_page_raw = driver.find_element(By.CSS_SELECTOR, '#data_paginate > span > a:last-child')
@@ -118,20 +131,24 @@ class AirForcePubsSpider(GCSeleniumSpider):
                 while last_page > 1:
                     driver.execute_script("arguments[0].click();", WebDriverWait(driver, 5).until(
                         EC.element_to_be_clickable((By.CSS_SELECTOR, anchor_after_current_selector))))
-                    for item in self.parse_table(driver):
-                        yield item
+                    table_pages.append((driver.current_url, driver.page_source))
                     last_page -= 1
-                
-                driver.get(page_url)
-                time.sleep(5)
-                
+            except Exception as e:
+                # move on to the next organization, the pages collected so far are kept
+                print(f"Failed to walk the publications of: {org} at {page_url}", e)
+            
+            driver.get(page_url)
+            self.wait_for_dom_stable(driver)
 
-    def parse_table(self, driver):
+        return table_pages
+            
+
+    def parse_table(self, page_source, source_page_url):
         '''
         This function generates a link and metadata for each document in the "Product Index" table on the Air Force E-Publishing 
         site for download.
         '''
-        webpage = Selector(text=driver.page_source) # Raw HTML of webpage
+        webpage = Selector(text=page_source) # Raw HTML of webpage
         row_selector = f'{self.table_selector} tbody tr ' # Define list of table rows
 
         ## Iterate through each row in table get column values as metadata for each downloadable document
@@ -220,8 +237,6 @@ class AirForcePubsSpider(GCSeleniumSpider):
                 or any(x in doc_title for x in self.cac_required_options) \
                 or '-S' in prod_num else False
 
-            source_page_url = driver.current_url
-
             fields = {
                 'doc_name': doc_name,
                 'doc_num': doc_num,
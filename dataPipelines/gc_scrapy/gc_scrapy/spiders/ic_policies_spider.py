@@ -1,6 +1,5 @@
 import re
 import bs4
-import time
 from selenium.webdriver import Chrome
 
 from dataPipelines.gc_scrapy.gc_scrapy.doc_item_fields import DocItemFields
@@ -55,6 +54,7 @@ class IcPoliciesSpider(GCSeleniumSpider):
     custom_settings = {
         **GCSeleniumSpider.custom_settings,
         "DOWNLOAD_TIMEOUT": 7.0,
+        "SELENIUM_FAST_MODE": True,
         "DOWNLOAD_DELAY": 5,
         "AUTOTHROTTLE_ENABLED": True,
         "AUTOTHROTTLE_START_DELAY": 1,
@@ -120,7 +120,7 @@ class IcPoliciesSpider(GCSeleniumSpider):
 
         for page_url in self.start_urls:
             driver.get(page_url)
-            time.sleep(5)
+            self.wait_for_table_rows(driver, 'div[itemprop="articleBody"] p a')
 
             # parse html response
             div = bs4.BeautifulSoup(driver.page_source, features="html.parser").find(
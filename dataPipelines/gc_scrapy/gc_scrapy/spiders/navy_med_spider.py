@@ -1,5 +1,4 @@
 from typing import Any, Generator
-import time
 import bs4
 from scrapy.http import Response
 
@@ -44,6 +43,7 @@ class NavyMedSpider(GCSeleniumSpider):
     custom_settings = {
         **GCSeleniumSpider.custom_settings,
         "DOWNLOAD_TIMEOUT": 7.0,
+        "SELENIUM_FAST_MODE": True,
     }
 
     def get_tab_button_els(self, driver: Chrome) -> list:
@@ -82,7 +82,7 @@ class NavyMedSpider(GCSeleniumSpider):
             driver.get(
                 self.start_urls[0]
             )  # navigating to the homepage again to reset the page (because refresh doesn't work)
-            time.sleep(8)  # waiting to be sure that it loaded
+            self.wait_for_dom_stable(driver, timeout=15)  # waiting to be sure that it loaded
             try:
                 button = self.get_tab_button_els(driver)[i]
             except Exception as e:
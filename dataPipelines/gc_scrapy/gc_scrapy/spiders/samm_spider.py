@@ -3,7 +3,6 @@ from dataPipelines.gc_scrapy.gc_scrapy.GCSpider import GCSpider
 from dataPipelines.gc_scrapy.gc_scrapy.utils import dict_to_sha256_hex_digest, get_pub_date
 import re
 from urllib.parse import urljoin, urlparse
-import time
 
 class SammSpider(GCSpider):
     name = "samm_policy"
@@ -26,7 +25,6 @@ class SammSpider(GCSpider):
     def parse(self, response):
         base_url = "https://samm.dsca.mil"
         if response.url == "https://samm.dsca.mil/policy-memoranda/PolicyMemoList-All":
-            time.sleep(1)
             for row in response.xpath('//div[@class="view-content"]//table/tbody/tr'):
                 pm_status_text = row.xpath('td[6]/text()').get()
                 pm_status = pm_status_text.strip() if pm_status_text is not None else ""
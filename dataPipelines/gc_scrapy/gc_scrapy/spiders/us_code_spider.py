@@ -23,6 +23,8 @@ class USCodeSpider(GCSpider):
     start_urls = ["https://uscode.house.gov/download/download.shtml"]
     doc_type = "Title"
     rotate_user_agent = True
+    # title zips run to hundreds of MB, write them to disk as they download
+    stream_downloads = True
 
 
     custom_settings = \
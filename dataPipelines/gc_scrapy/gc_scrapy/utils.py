@@ -4,20 +4,99 @@ gc_crawler.utils
 -----------------
 Various gc_crawler util functions/classes used in other modules
 """
-from pathlib import Path
-from typing import Union, List, Any, Dict, Generator, Iterable
+from pathlib import Path, PurePosixPath
+from typing import Union, List, Any, Dict, Generator, Iterable, Iterator, Optional, Tuple
 import zipfile
+import contextlib
+import importlib
+import io
+import struct
 import copy
 import tempfile
 import shutil
 from hashlib import sha256
-from functools import reduce
 from urllib.parse import urljoin, urlparse
 import re
 import os
+import stat
+import threading
+import types
 import typing as t
 import datetime
-import pandas
+
+try:
+    import fcntl
+except ImportError:  # windows, state files aren't shared between processes there
+    fcntl = None
+
+_ZIP_LOCAL_HEADER_SIZE = 30
+_NESTED_ZIP_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+# strptime formats that parse to the same value as pandas.to_datetime whenever they match
+# (no 2 digit years, day first dates or timezones, those are left to pandas)
+_TIMESTAMP_FORMATS = (
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+    "%m-%d-%Y",
+    "%Y/%m/%d",
+    "%Y %m %d",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M %p",
+    "%B %d, %Y",
+    "%b %d, %Y",
+    "%b. %d, %Y",
+    "%B %d %Y",
+    "%b %d %Y",
+    "%A, %B %d, %Y",
+    "%a, %b %d, %Y",
+    "%d %B %Y",
+    "%d %b %Y",
+    "%d %B, %Y",
+    "%d-%b-%Y",
+    "%B %Y",
+    "%b %Y",
+    "%B, %Y",
+    "%Y-%m",
+    "%m/%Y",
+    "%Y",
+)
+# strings with the same shape almost always come from the same source and share a format
+_TIMESTAMP_SHAPE_TABLE = str.maketrans("0123456789" + "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ", "9" * 10 + "a" * 52)
+_TIMESTAMP_SHAPE_CACHE_SIZE = 4096
+# shape -> format that parsed it, None if no format did and pandas had to
+_learned_timestamp_formats: Dict[str, Optional[str]] = {}
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is only imported on first attribute access,
+    for heavy dependencies (selenium, requests, ...) that most spiders never use
+
+        selenium_ui = LazyModule("selenium.webdriver.support.ui")
+        selenium_ui.WebDriverWait(driver, 5)  # selenium is imported here
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module = None
+
+    def _load(self) -> types.ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
 
 def str_to_sha256_hex_digest(_str: str) -> str:
     """Converts string to sha256 hex digest"""
@@ -27,6 +106,63 @@ def str_to_sha256_hex_digest(_str: str) -> str:
     return sha256(_str.encode("utf-8")).hexdigest()
 
 
+def _iter_compat_chunks(_dict: Dict[Any, Any]) -> Iterator[bytes]:
+    """Key/value pairs sorted by str(key) and encoded as str((key, value)), the encoding version hashes have always used"""
+    for key_value in sorted(_dict.items(), key=lambda t: str(t[0])):
+        yield str(key_value).encode("utf-8")
+
+
+def _canonical_chunk(value: Any) -> bytes:
+    if isinstance(value, str):
+        encoded = value.encode("utf-8")
+        return b"s%d:%s" % (len(encoded), encoded)
+    if value is None:
+        return b"n"
+    if isinstance(value, bool):
+        return b"t" if value else b"f"
+    if isinstance(value, int):
+        return b"i%d;" % value
+    if isinstance(value, float):
+        return b"d%s;" % repr(value).encode("ascii")
+    if isinstance(value, (bytes, bytearray)):
+        return b"b%d:%s" % (len(value), bytes(value))
+    # anything else (dates, etc) is hashed by its string value, tagged so it can't collide with a str
+    encoded = str(value).encode("utf-8")
+    return b"o%d:%s" % (len(encoded), encoded)
+
+
+def _iter_canonical_chunks(value: Any) -> Iterator[bytes]:
+    """Type tagged, length prefixed encoding of nested dicts/lists/scalars, dict keys are sorted by their encoding"""
+    if isinstance(value, dict):
+        yield b"m%d:" % len(value)
+        for encoded_key, item_value in sorted(
+            ((_canonical_chunk(k), v) for k, v in value.items()), key=lambda pair: pair[0]
+        ):
+            yield encoded_key
+            yield from _iter_canonical_chunks(item_value)
+    elif isinstance(value, (list, tuple)):
+        yield b"l%d:" % len(value)
+        for item_value in value:
+            yield from _iter_canonical_chunks(item_value)
+    else:
+        yield _canonical_chunk(value)
+
+
+def stream_dict_to_sha256(_dict: Dict[Any, Any], digest=None, compat: bool = False):
+    """Feeds a dict's key/value pairs into a sha256 object one pair at a time, linear in the payload size
+
+    :param _dict: dict to hash
+    :param digest: hashlib sha256 object to update, a new one is created if not given
+    :param compat: use the str((key, value)) encoding of dict_to_sha256_hex_digest, so digests match existing
+        version hashes. The default canonical encoding also covers nested values, but produces different digests
+    :return: the updated sha256 object
+    """
+    digest = digest if digest is not None else sha256()
+    for chunk in (_iter_compat_chunks(_dict) if compat else _iter_canonical_chunks(_dict)):
+        digest.update(chunk)
+    return digest
+
+
 def dict_to_sha256_hex_digest(_dict: Dict[Any, Any]) -> str:
     """Converts dictionary to sha256 hex digest.
 
@@ -35,14 +171,8 @@ def dict_to_sha256_hex_digest(_dict: Dict[Any, Any]) -> str:
     if not _dict and not isinstance(_dict, dict):
         raise ValueError("Arg should be a non-empty dictionary")
 
-    # order dict k/v pairs & concat their values as strings
-    value_string = reduce(
-        lambda t1, t2: "".join(map(str, (t1, t2))),
-        sorted(_dict.items(), key=lambda t: str(t[0])),
-        "",
-    )
-
-    return str_to_sha256_hex_digest(value_string)
+    # ordered k/v pairs as strings, same digests as when they were concatenated before hashing
+    return stream_dict_to_sha256(_dict, compat=True).hexdigest()
 
 def get_pub_date(publication_date):
         '''
@@ -86,11 +216,105 @@ def get_fqdn_from_web_url(url_string: str) -> str:
     return urlparse(url_string).netloc
 
 
-def get_available_path(desired_path: Union[str, Path]) -> Path:
+class NameReservationIndex:
+    """In-memory index of the names taken in a directory, hands out the same names as get_available_path's
+    probing without a stat per candidate. The directory is listed once, every name handed out is reserved, and the
+    next _dup counter is kept per name so repeated collisions don't re-probe from 1.
+
+    Names written to the directory by other code are picked up by a single stat of the name about to be returned.
+    Names deleted after they were seen stay reserved, so unlike probing, freed _dupN names aren't reused.
+
+    :param dir_path: directory names are reserved in, must exist
+    """
+
+    _indexes: Dict[Path, "NameReservationIndex"] = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, dir_path: Union[str, Path]):
+        self.dir_path = Path(dir_path).resolve()
+        if not self.dir_path.is_dir():
+            raise ValueError(f"Base dir for path does not exist: {self.dir_path}")
+
+        self._lock = threading.Lock()
+        # name -> True for files, False for dirs, reserved names get the kind they were reserved as
+        self._taken: Dict[str, bool] = {}
+        with os.scandir(self.dir_path) as entries:
+            for entry in entries:
+                self._taken[entry.name] = entry.is_file()
+        self._next_counter: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def for_dir(cls, dir_path: Union[str, Path]) -> "NameReservationIndex":
+        """Shared index for a directory, for dirs that live as long as the process like the download dir"""
+        key = Path(dir_path).resolve()
+        with cls._indexes_lock:
+            index = cls._indexes.get(key)
+            if index is None:
+                index = cls(key)
+                cls._indexes[key] = index
+            return index
+
+    @staticmethod
+    def _stat_is_file(path: Path) -> Optional[bool]:
+        """True for files, False for anything else that exists, None if nothing exists at path"""
+        try:
+            return stat.S_ISREG(os.stat(path).st_mode)
+        except FileNotFoundError:
+            return None
+
+    def reserve(self, desired_path: Union[str, Path], is_dir: bool = False) -> Path:
+        """Reserve and return an available path, same naming as get_available_path
+        :param desired_path: proposed file/dir path inside this index's directory
+        :param is_dir: the path is reserved for a directory, later reservations of the name are then numbered
+            the way get_available_path numbers existing dirs (new.dir -> new.dir_dup1.dir)
+        :returns: available file/dir path
+        """
+        original_path = Path(desired_path)
+        if original_path.parent.resolve() != self.dir_path:
+            raise ValueError(f"{desired_path} is not in {self.dir_path}")
+
+        name = original_path.name
+        with self._lock:
+            if name not in self._taken:
+                # not seen when the dir was listed, check the disk in case it was written since
+                is_file = self._stat_is_file(original_path)
+                if is_file is None:
+                    self._taken[name] = not is_dir
+                    return original_path.resolve()
+                self._taken[name] = is_file
+
+            is_file = self._taken[name]
+            base_ext = original_path.suffix
+            base_name = name[: (-len(base_ext) if is_file else None)]
+            counter_key = (base_name, base_ext)
+            counter = self._next_counter.get(counter_key, 1)
+            while True:
+                candidate = f"{base_name}_dup{counter}{base_ext}"
+                counter += 1
+                if candidate in self._taken:
+                    continue
+                if os.path.lexists(Path(self.dir_path, candidate)):
+                    self._taken[candidate] = Path(self.dir_path, candidate).is_file()
+                    continue
+                break
+
+            self._next_counter[counter_key] = counter
+            self._taken[candidate] = not is_dir
+            return Path(self.dir_path, candidate).resolve()
+
+
+def get_available_path(
+    desired_path: Union[str, Path], name_index: Optional[NameReservationIndex] = None, is_dir: bool = False
+) -> Path:
     """Given desired path, returns one that uses desired path as prefix but won't overwrite existing files
     :param desired_path: proposed file/dir path
+    :param name_index: index of desired_path's directory, reserves the name instead of probing for it
+    :param is_dir: the name is reserved for a directory, only used with name_index
     :returns: available file/dir path
     """
+    if name_index is not None:
+        return name_index.reserve(desired_path, is_dir=is_dir)
+
     original_path = Path(desired_path)
     base_dir = Path(original_path).parent
     base_ext = original_path.suffix
@@ -162,12 +386,17 @@ def unzip_all(zip_file: Union[Path, str], output_dir: str) -> List[Path]:
     if any(output_dir_path.iterdir()):
         output_dir_path = get_available_path(output_dir_path)
 
+    # nested zips get sibling tmp_unzip dirs, index each dir once instead of probing tmp_unzip_dupN per zip
+    name_indexes: Dict[Path, NameReservationIndex] = {}
+
     def unzip_nested(zip_path: Path, dir_path: Path) -> None:
         with zipfile.ZipFile(Path(zip_path).absolute()) as zip_ref:
             zip_ref.extractall(dir_path)
         for path in iter_all_files(dir_path):
             if path.suffix == ".zip":
-                new_output_dir = Path(get_available_path(Path(dir_path, "tmp_unzip")))
+                if dir_path not in name_indexes:
+                    name_indexes[dir_path] = NameReservationIndex(dir_path)
+                new_output_dir = Path(get_available_path(Path(dir_path, "tmp_unzip"), name_indexes[dir_path], is_dir=True))
                 new_output_dir.mkdir()
                 unzip_nested(path.absolute(), new_output_dir.absolute())
                 path.unlink()
@@ -178,20 +407,26 @@ def unzip_all(zip_file: Union[Path, str], output_dir: str) -> List[Path]:
     return unzipped_file_paths
 
 
-def safe_move_file(file_path: Union[Path, str], output_path: Union[Path, str], copy: bool = False) -> Path:
+def safe_move_file(
+    file_path: Union[Path, str],
+    output_path: Union[Path, str],
+    copy: bool = False,
+    name_index: Optional[NameReservationIndex] = None,
+) -> Path:
     """Safely moves/copies file to given directory
     by changing file suffix (sans extension) to avoid collisions, if necessary
 
     :param file_path: Source file, must exist
     :param output_path: Destination directory, must exist
     :param copy: Flag to perform copy instead of move
+    :param name_index: NameReservationIndex of the destination directory
     :return: Path to moved/copied file location
     """
     _file_path = Path(file_path).resolve()
     _output_path = Path(output_path).resolve()
 
     desired_path = Path(_output_path, _file_path.name) if _output_path.is_dir() else _output_path
-    available_dest_path = Path(get_available_path(desired_path))
+    available_dest_path = Path(get_available_path(desired_path, name_index))
 
     if not _file_path.is_file():
         raise ValueError(f"Given path is not a file: {_file_path!s}")
@@ -208,6 +443,27 @@ def safe_move_file(file_path: Union[Path, str], output_path: Union[Path, str], c
     return available_dest_path
 
 
+@contextlib.contextmanager
+def locked_state_file(path: Union[Path, str]) -> Iterator[Path]:
+    """Holds an exclusive lock on a json state file (through a .lock file next to it) so crawl workers sharing it
+    don't overwrite each other's read-merge-write saves
+
+    :param path: State file, its parent dir is created if missing
+    :return: Path of the state file
+    """
+    _path = Path(path)
+    _path.parent.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield _path
+        return
+    with open(_path.with_name(_path.name + ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield _path
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 def extract_title_42_subfile_names(filename: str, parent_filename: str) -> str:
     """Create unique filename for nested zipped PDFs for Title 42 use-case
 
@@ -227,38 +483,147 @@ def extract_title_42_subfile_names(filename: str, parent_filename: str) -> str:
     return output_filename
 
 
-def unzip_docs_as_needed(input_dir: Union[Path, str], output_dir: Union[Path, str], doc_type: str) -> List[Path]:
+class _StoredZipMember(io.RawIOBase):
+    """Read only, seekable view of a stored (uncompressed) zip member's bytes inside its parent archive,
+    so a nested zip that wasn't compressed can be opened in place
+    """
+
+    def __init__(self, fileobj: t.BinaryIO, info: zipfile.ZipInfo):
+        super().__init__()
+        fileobj.seek(info.header_offset)
+        header = fileobj.read(_ZIP_LOCAL_HEADER_SIZE)
+        if header[:4] != b"PK\x03\x04":
+            raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        self._fileobj = fileobj
+        self._start = info.header_offset + _ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+        self._size = info.file_size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = min(max(offset, 0), self._size)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), self._size - self._pos)
+        if n <= 0:
+            return 0
+        self._fileobj.seek(self._start + self._pos)
+        n = self._fileobj.readinto(memoryview(buffer)[:n])
+        self._pos += n
+        return n
+
+
+def _open_nested_zip(parent: zipfile.ZipFile, info: zipfile.ZipInfo, stack: contextlib.ExitStack) -> zipfile.ZipFile:
+    """Open a zip inside a zip, in place if it's stored, otherwise spooled to memory (or disk if it's big)"""
+    if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+        fileobj = io.BufferedReader(_StoredZipMember(parent.fp, info))
+    else:
+        fileobj = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=_NESTED_ZIP_SPOOL_MAX_SIZE))
+        with parent.open(info) as member:
+            shutil.copyfileobj(member, fileobj, _COPY_BUFFER_SIZE)
+        fileobj.seek(0)
+    return stack.enter_context(zipfile.ZipFile(fileobj))
+
+
+def iter_zip_members(
+    zip_file: zipfile.ZipFile, stack: contextlib.ExitStack, doc_type: Optional[str] = None, _prefix: str = ""
+) -> Generator[Tuple[PurePosixPath, zipfile.ZipFile, zipfile.ZipInfo], None, None]:
+    """Iterate over the files in a zip, recursing into nested zips without extracting anything
+
+    :param zip_file: open archive
+    :param stack: nested archives are kept open on this stack, members can only be read while it's open
+    :param doc_type: only yield members with this extension, e.g. "pdf"
+    :return: (sort path, archive, member info), sort path is where unzip_all would have put the member
+    """
+    nested_count = 0
+    for info in sorted(zip_file.infolist(), key=lambda i: i.filename):
+        if info.is_dir():
+            continue
+        member_path = PurePosixPath(info.filename)
+        if member_path.suffix == ".zip":
+            # unzip_all extracted each nested zip to its own tmp_unzip, tmp_unzip_dup1, ... dir
+            nested_dir = "tmp_unzip" + (f"_dup{nested_count}" if nested_count else "")
+            nested_count += 1
+            nested_zip = _open_nested_zip(zip_file, info, stack)
+            yield from iter_zip_members(nested_zip, stack, doc_type, f"{_prefix}{nested_dir}/")
+        elif doc_type is None or member_path.suffix.lower()[1:] == doc_type:
+            yield PurePosixPath(_prefix + info.filename), zip_file, info
+
+
+def extract_zip_member(
+    zip_file: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    output_path: Union[Path, str],
+    name_index: Optional[NameReservationIndex] = None,
+) -> Path:
+    """Stream a zip member to the given directory or file path, renaming like safe_move_file to avoid collisions
+
+    :param output_path: Destination directory or file path, parent must exist
+    :param name_index: NameReservationIndex of the destination directory
+    :return: Path the member was written to
+    """
+    _output_path = Path(output_path).resolve()
+    desired_path = Path(_output_path, PurePosixPath(info.filename).name) if _output_path.is_dir() else _output_path
+    available_dest_path = Path(get_available_path(desired_path, name_index))
+
+    with zip_file.open(info) as member, available_dest_path.open(mode="wb") as f:
+        shutil.copyfileobj(member, f, _COPY_BUFFER_SIZE)
+
+    return available_dest_path
+
+
+def unzip_docs_as_needed(
+    input_dir: Union[Path, str],
+    output_dir: Union[Path, str],
+    doc_type: str,
+    name_index: Optional[NameReservationIndex] = None,
+) -> List[Path]:
     """Handles zipped/packaged download artifacts by expanding them into their individual components
 
     :param input_dir: Path of the zip file
     :param output_dir: Directory where files, unzipped or not, should be placed
     :param doc_type: Document file type, e.g. "pdf", "html", "txt"
+    :param name_index: NameReservationIndex of the directory files are moved to
     :return: iterable of Downloaded documents, len > 1 for bundles
     """
 
     # TODO: create set of recursive unzip methods for other archive types and a dispatcher
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir)
     try:
-        # unzip & move
-        temp_dir = tempfile.TemporaryDirectory()
-        unzipped_files = unzip_all(zip_file=input_dir, output_dir=temp_dir.name)
-        unzipped_files = [f for f in unzipped_files if f.suffix.lower()[1:] == doc_type]
-        if not unzipped_files:
-            raise RuntimeError(f"Tried to unzip {input_dir}, but could not find any expected files inside")
-        final_ddocs = []
-
-        # TODO: Add capibility to unzip multiple zips and add corresponding metadata for each
-        # do just the first iteration to unzip only the first file
-        unzipped_files.sort()  # TODO: this doesnt work ->> messy solution. sorting to make sure we grab the first in us_code
-        for pdf_file in unzipped_files:
-            if pdf_file.name.startswith("usc42"):
-                output_filename = extract_title_42_subfile_names(pdf_file.name, input_dir.name)
-                output_dir = output_dir.parent / output_filename
-            new_ddoc = copy.deepcopy(output_dir)
-            safe_move_file(file_path=pdf_file, output_path=output_dir)
-            final_ddocs.append(new_ddoc)
+        # members are streamed from the archive (and nested archives) straight to their destination
+        with contextlib.ExitStack() as stack:
+            zip_file = stack.enter_context(zipfile.ZipFile(input_dir))
+            unzipped_files = list(iter_zip_members(zip_file, stack, doc_type))
+            if not unzipped_files:
+                raise RuntimeError(f"Tried to unzip {input_dir}, but could not find any expected files inside")
+            final_ddocs = []
+
+            # TODO: Add capibility to unzip multiple zips and add corresponding metadata for each
+            # do just the first iteration to unzip only the first file
+            unzipped_files.sort(key=lambda member: member[0])  # TODO: this doesnt work ->> messy solution. sorting to make sure we grab the first in us_code
+            for sort_path, member_zip, member_info in unzipped_files:
+                if sort_path.name.startswith("usc42"):
+                    output_filename = extract_title_42_subfile_names(sort_path.name, input_dir.name)
+                    output_dir = output_dir.parent / output_filename
+                new_ddoc = copy.deepcopy(output_dir)
+                extract_zip_member(member_zip, member_info, output_path=output_dir, name_index=name_index)
+                final_ddocs.append(new_ddoc)
     finally:
-        temp_dir.cleanup()
-
         # remove zip. check in case a bad input was put in
         if input_dir.is_file() and input_dir.suffix.lower() == ".zip":
             os.remove(input_dir)
@@ -266,6 +631,38 @@ def unzip_docs_as_needed(input_dir: Union[Path, str], output_dir: Union[Path, st
     return final_ddocs
 
 
+def _strptime_timestamp(ts: str) -> t.Optional[datetime.datetime]:
+    """Parse ts with the format learned for its shape, trying the known formats on a miss
+    :return: datetime.datetime, or None if it should be left to pandas
+    """
+    if not ts.isascii() or ts != ts.strip() or "  " in ts:
+        return None
+
+    shape = ts.translate(_TIMESTAMP_SHAPE_TABLE)
+    learned = _learned_timestamp_formats.get(shape, "")
+    if learned is None:
+        return None
+    if learned:
+        try:
+            return datetime.datetime.strptime(ts, learned)
+        except ValueError:
+            # same shape but not the same format, e.g. 13/05/2020 which pandas reads day first
+            return None
+
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            parsed = datetime.datetime.strptime(ts, fmt)
+        except ValueError:
+            continue
+        if len(_learned_timestamp_formats) < _TIMESTAMP_SHAPE_CACHE_SIZE:
+            _learned_timestamp_formats[shape] = fmt
+        return parsed
+
+    if len(_learned_timestamp_formats) < _TIMESTAMP_SHAPE_CACHE_SIZE:
+        _learned_timestamp_formats.setdefault(shape, None)
+    return None
+
+
 def parse_timestamp(ts: t.Union[str, datetime.datetime], raise_parse_error: bool = False) -> t.Optional[datetime.datetime]:
     """Parse date/timestamp with no particular format
     :param ts: date/timestamp string
@@ -275,6 +672,14 @@ def parse_timestamp(ts: t.Union[str, datetime.datetime], raise_parse_error: bool
         if isinstance(ts, datetime.datetime):
             return ts
 
+        if isinstance(ts, str):
+            parsed = _strptime_timestamp(ts)
+            if parsed is not None:
+                return parsed
+
+        # imported here, it's slow to import and only needed for strings the formats above don't cover
+        import pandas
+
         try:
             ts = pandas.to_datetime(ts).to_pydatetime()
             if str(ts) == 'NaT':
@@ -7,8 +7,150 @@ Utils for validating input/output data schema.
 
 from . import INPUT_SPEC_PATH, OUTPUT_SPEC_PATH
 from jsonschema import Draft7Validator as JsonSchemaValidator
-from typing import Union
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import json
+import re
+
+
+# keywords that don't affect validation
+_ANNOTATION_KEYWORDS = {"$schema", "$id", "title", "description", "examples", "default", "definitions"}
+_COMPILED_KEYWORDS = {"type", "enum", "required", "properties", "items", "minItems", "minLength", "pattern", "$ref"}
+_TYPE_CHECKS = {
+    "string": "isinstance({v}, str)",
+    "null": "{v} is None",
+    "boolean": "isinstance({v}, bool)",
+    "object": "isinstance({v}, dict)",
+    "array": "isinstance({v}, list)",
+    "number": "(isinstance({v}, (int, float)) and not isinstance({v}, bool))",
+    "integer": "((isinstance({v}, int) and not isinstance({v}, bool)) or (isinstance({v}, float) and {v}.is_integer()))",
+}
+_MISSING = object()
+
+
+class _SchemaCompiler:
+    """Generates a python function that returns whether an instance is valid for a schema,
+    only covers the draft 7 keywords used by this repo's specs and raises NotImplementedError for anything else
+    """
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self.namespace = {"_MISSING": _MISSING}
+        self.functions: List[str] = []
+        self.refs: Dict[str, str] = {}
+        self._counter = 0
+
+    def _name(self, prefix: str) -> str:
+        self._counter += 1
+        return f"{prefix}_{self._counter}"
+
+    def _constant(self, prefix: str, value) -> str:
+        name = self._name(prefix)
+        self.namespace[name] = value
+        return name
+
+    def _ref_function(self, ref: str) -> str:
+        if ref not in self.refs:
+            if not ref.startswith("#/definitions/"):
+                raise NotImplementedError(f"Unsupported $ref: {ref}")
+            self.refs[ref] = self._name("_check_ref")
+            self._function(self.refs[ref], self.schema["definitions"][ref[len("#/definitions/"):]])
+        return self.refs[ref]
+
+    def _function(self, name: str, schema: dict) -> None:
+        lines = [f"def {name}(v0):"]
+        self._emit(schema, "v0", lines, 1)
+        lines.append("    return True")
+        self.functions.append("\n".join(lines))
+
+    def _emit(self, schema: dict, v: str, lines: List[str], depth: int) -> None:
+        pad = "    " * depth
+        unsupported = set(schema) - _COMPILED_KEYWORDS - _ANNOTATION_KEYWORDS
+        if unsupported:
+            raise NotImplementedError(f"Unsupported schema keywords: {sorted(unsupported)}")
+
+        if "$ref" in schema:
+            if set(schema) & (_COMPILED_KEYWORDS - {"$ref"}):
+                raise NotImplementedError("Keywords next to $ref are ignored in draft 7")
+            lines.append(f"{pad}if not {self._ref_function(schema['$ref'])}({v}): return False")
+            return
+
+        types = schema.get("type")
+        types = [types] if isinstance(types, str) else types
+        if types:
+            lines.append(f"{pad}if not ({' or '.join(_TYPE_CHECKS[t].format(v=v) for t in types)}): return False")
+
+        def guard(json_type: str) -> str:
+            # keywords only apply to their instance type, skip the check when the type is already known
+            return "" if types == [json_type] else f"{_TYPE_CHECKS[json_type].format(v=v)} and "
+
+        if "enum" in schema:
+            if not all(value is None or isinstance(value, str) for value in schema["enum"]):
+                raise NotImplementedError("Only string/null enums are supported")
+            lines.append(f"{pad}if {v} not in {self._constant('_enum', tuple(schema['enum']))}: return False")
+        if "minLength" in schema:
+            lines.append(f"{pad}if {guard('string')}len({v}) < {int(schema['minLength'])}: return False")
+        if "pattern" in schema:
+            pattern = self._constant("_pattern", re.compile(schema["pattern"]))
+            lines.append(f"{pad}if {guard('string')}{pattern}.search({v}) is None: return False")
+        if "minItems" in schema:
+            lines.append(f"{pad}if {guard('array')}len({v}) < {int(schema['minItems'])}: return False")
+        if "items" in schema:
+            if not isinstance(schema["items"], dict):
+                raise NotImplementedError("Only single schema items are supported")
+            item_guard = guard("array")
+            item_pad, item_depth = (pad + "    ", depth + 1) if item_guard else (pad, depth)
+            item_var = self._name("v")
+            item_lines: List[str] = []
+            self._emit(schema["items"], item_var, item_lines, item_depth + 1)
+            if item_lines:
+                if item_guard:
+                    lines.append(f"{pad}if {item_guard[:-len(' and ')]}:")
+                lines.append(f"{item_pad}for {item_var} in {v}:")
+                lines.extend(item_lines)
+        if schema.get("required"):
+            present = " and ".join(f"{key!r} in {v}" for key in schema["required"])
+            lines.append(f"{pad}if {guard('object')}not ({present}): return False")
+        if "properties" in schema:
+            property_guard = guard("object")
+            property_pad, property_depth = (pad + "    ", depth + 1) if property_guard else (pad, depth)
+            property_lines: List[str] = []
+            for key, subschema in schema["properties"].items():
+                value_var = self._name("v")
+                value_lines: List[str] = []
+                self._emit(subschema, value_var, value_lines, property_depth + 1)
+                if value_lines:
+                    property_lines.append(f"{property_pad}{value_var} = {v}.get({key!r}, _MISSING)")
+                    property_lines.append(f"{property_pad}if {value_var} is not _MISSING:")
+                    property_lines.extend(value_lines)
+            if property_lines:
+                if property_guard:
+                    lines.append(f"{pad}if {property_guard[:-len(' and ')]}:")
+                lines.extend(property_lines)
+
+    def compile(self) -> Callable[[dict], bool]:
+        self._function("check", self.schema)
+        exec(compile("\n\n".join(self.functions), "<compiled schema>", "exec"), self.namespace)
+        return self.namespace["check"]
+
+
+def compile_schema(schema: dict) -> Optional[Callable[[dict], bool]]:
+    """Compile a jsonschema to a function returning whether an instance is valid,
+    None if the schema uses keywords the compiler doesn't support
+    """
+    try:
+        return _SchemaCompiler(schema).compile()
+    except NotImplementedError as e:
+        print(f"Could not compile schema {schema.get('title', '')}, falling back to jsonschema: {e}")
+        return None
+
+
+@lru_cache(maxsize=None)
+def load_compiled_schema(schema_path: str) -> Tuple[JsonSchemaValidator, Optional[Callable[[dict], bool]]]:
+    """Schema file read, checked and compiled once per process"""
+    with open(schema_path) as f:
+        schema_dict = json.load(f)
+    return JsonSchemaValidator(schema=schema_dict), compile_schema(schema_dict)
 
 
 class SchemaValidator:
@@ -24,6 +166,9 @@ class SchemaValidator:
     def validate_dict(self, _dict: dict) -> None:
         self.validator.validate(_dict)
 
+    def is_valid(self, _dict: dict) -> bool:
+        return self.validator.is_valid(_dict)
+
     def validate_json(self, _json: str) -> None:
         self.validate_dict(json.loads(_json))
 
@@ -36,6 +181,27 @@ class SchemaValidator:
             raise TypeError("Tried to validate incompatible object type.")
 
 
+class CompiledSchemaValidator(SchemaValidator):
+    """Checks items with generated code, only going through jsonschema to report why an item is invalid
+    :param validator: jsonschema validator, used for detailed errors
+    :param check: compiled check from compile_schema, None to always use the validator
+    """
+
+    def __init__(self, validator: JsonSchemaValidator, check: Optional[Callable[[dict], bool]]):
+        super().__init__(validator)
+        self.check = check
+
+    def validate_dict(self, _dict: dict) -> None:
+        if self.check is not None and self.check(_dict):
+            return
+        self.validator.validate(_dict)
+
+    def is_valid(self, _dict: dict) -> bool:
+        if self.check is not None:
+            return self.check(_dict)
+        return self.validator.is_valid(_dict)
+
+
 class NoopSchemaValidator(SchemaValidator):
     """Validator that'll match any dictionary object"""
 
@@ -52,9 +218,8 @@ class DefaultInputSchemaValidator(SchemaValidator):
         self.validator = JsonSchemaValidator(schema=schema_dict)
 
 
-class DefaultOutputSchemaValidator(SchemaValidator):
+class DefaultOutputSchemaValidator(CompiledSchemaValidator):
     """Validator that only matches according to output_spec.json"""
 
     def __init__(self):
-        schema_dict = json.load(open(OUTPUT_SPEC_PATH))
-        self.validator = JsonSchemaValidator(schema=schema_dict)
+        super().__init__(*load_compiled_schema(OUTPUT_SPEC_PATH))
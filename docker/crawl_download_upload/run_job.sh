@@ -40,6 +40,19 @@ function setup_local_vars_and_dirs() {
 ## ## MAIN FUNCTIONS
 #####
 
+function escape_s3_pattern() {
+  # aws s3 --exclude patterns are fnmatch globs, wrap [ ] * ? in brackets so a doc name is matched literally
+  local path="$1" escaped="" char i
+  for (( i=0; i<${#path}; i++ )); do
+    char="${path:i:1}"
+    case "$char" in
+      '['|']'|'*'|'?') escaped+="[$char]" ;;
+      *) escaped+="$char" ;;
+    esac
+  done
+  printf '%s' "$escaped"
+}
+
 function run_crawler() {
   if [[ "${TEST_RUN:-no}" == "yes" ]]; then
     echo -e "\n RUNNING SCRAPY SPIDER: us_code_spider.py \n"
@@ -56,6 +69,12 @@ function run_crawler() {
   --previous-manifest-location=$LOCAL_PREVIOUS_MANIFEST_LOCATION \
   --slack-hook-channel-id=$SLACK_HOOK_CHANNEL_ID \
   --slack-hook-url=$SLACK_HOOK_URL \
+  ${LOCAL_HTTP_CACHE_LOCATION:+ "--http-cache-location=$LOCAL_HTTP_CACHE_LOCATION"} \
+  ${LOCAL_RATE_STATE_LOCATION:+ "--rate-state-location=$LOCAL_RATE_STATE_LOCATION"} \
+  ${LOCAL_USER_AGENT_HEALTH_LOCATION:+ "--user-agent-health-location=$LOCAL_USER_AGENT_HEALTH_LOCATION"} \
+  ${LOCAL_RUN_HISTORY_LOCATION:+ "--run-history-location=$LOCAL_RUN_HISTORY_LOCATION"} \
+  --max-parallel-spiders=$MAX_PARALLEL_SPIDERS \
+  --workers=$CRAWL_WORKERS \
   ${LOCAL_SPIDER_LIST_FILE:+ "--spiders-file-location=$LOCAL_SPIDER_LIST_FILE"}
 
   set -o pipefail
@@ -66,21 +85,45 @@ function run_upload() {
   S3_UPLOAD_BASE_PATH="${S3_UPLOAD_BASE_PATH#/}"
   S3_UPLOAD_BASE_PATH="${S3_UPLOAD_BASE_PATH%/}"
   S3FULLPATH="s3://${BUCKET}/${S3_UPLOAD_BASE_PATH}"
-  aws s3 cp "${LOCAL_DOWNLOAD_DIRECTORY_PATH}" "${S3FULLPATH}" --recursive && rc=$? || rc=$?
+
+  # downloads with identical content are hardlinks to the same blob, upload one and copy the rest server side
+  local duplicates_file="$LOCAL_DOWNLOAD_DIRECTORY_PATH/.blobs/duplicates.tsv"
+  local excludes=(--exclude ".blobs/*")
+  if [[ -f "$duplicates_file" ]]; then
+    while IFS=$'\t' read -r duplicate_path source_path; do
+      excludes+=(--exclude "$(escape_s3_pattern "$duplicate_path")")
+    done < "$duplicates_file"
+  fi
+
+  aws s3 cp "${LOCAL_DOWNLOAD_DIRECTORY_PATH}" "${S3FULLPATH}" --recursive "${excludes[@]}" && rc=$? || rc=$?
 
   if [[ "$rc" -ne 0 ]]; then
     >&2 echo -e "\n[ERROR] FAILED TO UPLOAD DOCS\n"
     exit 11
   fi
+
+  if [[ -f "$duplicates_file" ]]; then
+    while IFS=$'\t' read -r duplicate_path source_path; do
+      aws s3 cp "${S3FULLPATH}/${source_path}" "${S3FULLPATH}/${duplicate_path}" && rc=$? || rc=$?
+      if [[ "$rc" -ne 0 ]]; then
+        >&2 echo -e "\n[ERROR] FAILED TO COPY DUPLICATE DOC ${duplicate_path}\n"
+        exit 11
+      fi
+    done < "$duplicates_file"
+  fi
 }
 
 function create_cumulative_manifest() {
   local cumulative_manifest="$LOCAL_DOWNLOAD_DIRECTORY_PATH/cumulative-manifest.json"
-  if [[ -f "$LOCAL_PREVIOUS_MANIFEST_LOCATION" ]]; then
-    cat "$LOCAL_PREVIOUS_MANIFEST_LOCATION" > "$cumulative_manifest"
-    echo >> "$cumulative_manifest"
-  fi
-  cat "$LOCAL_NEW_MANIFEST_PATH" >> "$cumulative_manifest"
+  # stream-merges, dedupes and sorts old + new manifests, with a .sha256 checksum file next to it
+  # the crawl's http validators are only committed once this succeeds, after the upload
+  "$PYTHON_CMD" -m dataPipelines.gc_scrapy manifest merge \
+  --previous-manifest-location="$LOCAL_PREVIOUS_MANIFEST_LOCATION" \
+  --new-manifest-location="$LOCAL_NEW_MANIFEST_PATH" \
+  ${LOCAL_HTTP_CACHE_LOCATION:+ "--http-cache-location=$LOCAL_HTTP_CACHE_LOCATION"} \
+  --output-location="$cumulative_manifest" \
+  ${MANIFEST_KEEP_LATEST_VERSIONS:+ "--keep-latest=$MANIFEST_KEEP_LATEST_VERSIONS"} \
+  $( [[ "${MANIFEST_COMPRESS:-no}" == "yes" ]] && echo "--compress" || echo "--no-compress" )
 }
 
 
@@ -2,6 +2,8 @@
 import os
 from os.path import isfile, join
 
+from dataPipelines.gc_scrapy.gc_scrapy.spider_registry import SpiderRegistry
+
 
 def checkdiff(required, testing):
     diff = [x for x in required if x not in testing]
@@ -12,9 +14,8 @@ def verify_spiders_are_scheduled():
     current_file = os.path.realpath(__file__)
     current_dir = os.path.dirname(current_file)
 
-    spiders_dir = f'{current_dir}/dataPipelines/gc_scrapy/gc_scrapy/spiders'
-    spiders_in_dir = [f.replace('.py', '') for f in os.listdir(spiders_dir) if isfile(
-        join(spiders_dir, f)) and not f.startswith("_")]
+    # modules defining a spider, read from their source so the spiders' dependencies don't need installing
+    spiders_in_dir = SpiderRegistry(cache_path=None).spider_modules()
 
     schedule_dir = f"{current_dir}/paasJobs/crawler_schedule"
     spiders_in_schedule = []
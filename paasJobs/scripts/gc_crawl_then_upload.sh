@@ -93,6 +93,14 @@ function grab_manifest() {
     >&2 echo -e "\n[ERROR] FAILED TO GRAB MANIFEST\n"
     exit 11
   fi
+
+  # checksum sidecar written by the manifest merge, the crawler container verifies the manifest against it
+  rm -f "${LOCAL_PREVIOUS_MANIFEST_LOCATION}.sha256"
+  if aws s3 cp "${S3FULLPATH_MANIFEST}.sha256" "${LOCAL_PREVIOUS_MANIFEST_LOCATION}.sha256"; then
+    LOCAL_PREVIOUS_MANIFEST_CHECKSUM_LOCATION="${LOCAL_PREVIOUS_MANIFEST_LOCATION}.sha256"
+  else
+    >&2 echo -e "\n[WARNING] NO CHECKSUM FOR THE LATEST MANIFEST, IT WON'T BE VERIFIED\n"
+  fi
 }
 
 function update_manifest() {
@@ -103,8 +111,13 @@ function update_manifest() {
   # backup old manifest
   aws s3 cp "${S3FULLPATH_MANIFEST}" "$s3_backup_cumulative_manifest" \
     || >&2 echo -e "\n[WARNING] FAILED TO BACKUP OLD MANIFEST\n"
-  # upload new manifest
+  if [[ -n "${LOCAL_PREVIOUS_MANIFEST_CHECKSUM_LOCATION:-}" ]]; then
+    aws s3 cp "${S3FULLPATH_MANIFEST}.sha256" "${s3_backup_cumulative_manifest}.sha256" \
+      || >&2 echo -e "\n[WARNING] FAILED TO BACKUP OLD MANIFEST CHECKSUM\n"
+  fi
+  # upload new manifest, then its checksum so the sidecar never describes a manifest that isn't there yet
   aws s3 cp "${local_new_cumulative_manifest}" "${S3FULLPATH_MANIFEST}" \
+    && aws s3 cp "${local_new_cumulative_manifest}.sha256" "${S3FULLPATH_MANIFEST}.sha256" \
     || >&2 echo -e "\n[WARNING] FAILED TO UPDATE CUMULATIVE MANIFEST\n"
 }
 
@@ -117,6 +130,7 @@ function run_crawl_download_upload() {
     --name "$container_name" \
     -u "$(id -u):$(id -g)" \
     -v "${LOCAL_PREVIOUS_MANIFEST_LOCATION}:${CRAWLER_CONTAINER_MANIFEST_LOCATION}:z" \
+    ${LOCAL_PREVIOUS_MANIFEST_CHECKSUM_LOCATION:+ -v "${LOCAL_PREVIOUS_MANIFEST_CHECKSUM_LOCATION}:${CRAWLER_CONTAINER_MANIFEST_LOCATION}.sha256:z"} \
     -v "${HOST_JOB_DL_DIR}:${CRAWLER_CONTAINER_DL_DIR}:z" \
     -e "LOCAL_DOWNLOAD_DIRECTORY_PATH=${CRAWLER_CONTAINER_DL_DIR}" \
     -e "LOCAL_PREVIOUS_MANIFEST_LOCATION=${CRAWLER_CONTAINER_MANIFEST_LOCATION}" \
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+from click.testing import CliRunner
+from scrapy import Spider
+from scrapy.settings import Settings
+from twisted.internet import defer
+
+from dataPipelines.gc_scrapy import cli
+from dataPipelines.gc_scrapy.cli import (
+    parallel_crawler_settings, partition_workers, queue_spiders_in_parallel, queue_spiders_sequentially
+)
+
+
+def test_parallel_crawler_settings_split_concurrency(tmp_path):
+    class PoliteSpider(Spider):
+        name = "polite"
+        custom_settings = {"CONCURRENT_REQUESTS": 2, "CONCURRENT_REQUESTS_PER_DOMAIN": 1}
+
+    class GreedySpider(Spider):
+        name = "greedy"
+        custom_settings = {"CONCURRENT_REQUESTS": 64}
+
+    settings = Settings({"CONCURRENT_REQUESTS": 10, "ADAPTIVE_RATE_MAX_CONCURRENCY": 16})
+    for spidercls, expected in ((PoliteSpider, 2), (GreedySpider, 5)):
+        crawler_settings = parallel_crawler_settings(settings, spidercls, 5, str(tmp_path / f"{spidercls.name}.part"))
+        # applied the same way Crawler does
+        spidercls.update_settings(crawler_settings)
+        assert crawler_settings.getint("CONCURRENT_REQUESTS") == expected
+        assert crawler_settings.getint("ADAPTIVE_RATE_MAX_CONCURRENCY") == expected
+        assert crawler_settings["FEED_URI"].endswith(f"{spidercls.name}.part")
+    assert crawler_settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN") == 8
+    assert settings.getint("CONCURRENT_REQUESTS") == 10
+
+
+def test_selenium_spiders_crawl_one_at_a_time_in_their_own_lane(tmp_path, monkeypatch):
+    running = {}
+    shares = set()
+
+    def fake_crawl(runner, spider, crawl_kwargs, concurrency_share, feed_uri):
+        shares.add(concurrency_share)
+        running[spider] = defer.Deferred()
+        return running[spider]
+
+    monkeypatch.setattr(cli, "crawl_with_concurrency_share", fake_crawl)
+    monkeypatch.setattr(cli.reactor, "stop", lambda: None)
+    runner = SimpleNamespace(settings=Settings({"CONCURRENT_REQUESTS": 9}))
+
+    spiders = ["af_selenium", "army", "navy_selenium", "navy", "dod"]
+    done = queue_spiders_in_parallel(
+        runner, spiders, {}, 3, str(tmp_path / "output.json"), {"af_selenium", "navy_selenium"}
+    )
+    assert list(running) == ["af_selenium", "army", "navy"]
+    running["army"].callback(None)
+    assert list(running) == ["af_selenium", "army", "navy", "dod"]
+    running["af_selenium"].callback(None)
+    assert list(running)[-1] == "navy_selenium"
+    for spider in ("navy", "dod", "navy_selenium"):
+        running[spider].callback(None)
+    assert done.called
+    assert shares == {3}
+
+
+def test_partition_workers_gives_selenium_spiders_their_own_worker():
+    durations = {"af_selenium": 9, "navy_selenium": 3, "army": 8, "navy": 5, "dod": 4}
+    selenium = {"af_selenium", "navy_selenium"}
+    assert partition_workers(list(durations), durations, 3, selenium) == [
+        ["army"], ["navy", "dod"], ["af_selenium", "navy_selenium"]
+    ]
+    # nothing to separate
+    assert partition_workers(["army", "navy"], durations, 2, selenium) == [["army"], ["navy"]]
+    assert partition_workers(["af_selenium", "navy_selenium"], durations, 2, selenium) == [
+        ["af_selenium"], ["navy_selenium"]
+    ]
+
+
+def test_worker_concurrency_share_caps_spiders_crawling_one_after_another(monkeypatch):
+    class PoliteSpider(Spider):
+        name = "polite"
+        custom_settings = {"CONCURRENT_REQUESTS": 2}
+
+    class GreedySpider(Spider):
+        name = "greedy"
+        custom_settings = {"CONCURRENT_REQUESTS": 64}
+
+    crawled = {}
+
+    def fake_crawl(crawler, **kwargs):
+        crawled[crawler.spidercls.name] = crawler.settings.getint("CONCURRENT_REQUESTS")
+        return defer.succeed(None)
+
+    monkeypatch.setattr(cli.reactor, "stop", lambda: None)
+    runner = SimpleNamespace(settings=Settings({"CONCURRENT_REQUESTS": 4, "FEED_URI": "output.json"}), crawl=fake_crawl)
+    assert queue_spiders_sequentially(runner, [PoliteSpider, GreedySpider], {}, concurrency_share=4).called
+    assert crawled == {"polite": 2, "greedy": 4}
+
+
+def test_parallel_crawl_runs_selenium_spiders_in_a_worker_of_their_own(tmp_path, monkeypatch):
+    started = []
+    monkeypatch.setattr(cli, "run_workers", lambda shards, worker_args, *args: started.append(shards) or {})
+    monkeypatch.setattr(cli, "send_stats", lambda **kwargs: None)
+    spiders_file = tmp_path / "spiders.txt"
+    spiders_file.write_text("army_pubs_spider.py\nair_force_spider.py\narmy_g1_spider.py\n")
+    (tmp_path / "manifest.json").write_text("")
+
+    result = CliRunner().invoke(cli.crawl, [
+        f"--download-output-dir={tmp_path}", f"--crawler-output-location={tmp_path / 'output.json'}",
+        f"--previous-manifest-location={tmp_path / 'manifest.json'}", f"--spiders-file-location={spiders_file}",
+        "--dont-filter-previous-hashes=true", "--max-parallel-spiders=3",
+    ])
+    assert result.exit_code == 0, result.output
+    assert len(started) == 1
+    assert sorted(map(sorted, started[0])) == [["air_force_spider.py"], ["army_g1_spider.py", "army_pubs_spider.py"]]
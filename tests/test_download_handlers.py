@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from dataPipelines.gc_scrapy.gc_scrapy import download_handlers
+from dataPipelines.gc_scrapy.gc_scrapy.GCSpider import GCSpider
+from dataPipelines.gc_scrapy.gc_scrapy.download_handlers import StreamingDownloadHandler
+
+CRAWL_SCRIPT = """
+import json, sys
+from scrapy.crawler import CrawlerProcess
+from dataPipelines.gc_scrapy.gc_scrapy.GCSpider import GCSpider
+from dataPipelines.gc_scrapy.gc_scrapy.items import DocItem
+from dataPipelines.gc_scrapy.gc_scrapy.utils import dict_to_sha256_hex_digest
+
+base_url, download_dir = sys.argv[1:3]
+
+
+class StreamingTestSpider(GCSpider):
+    name = "streaming_test"
+    start_urls = [f"{base_url}/index.html"]
+    stream_downloads = True
+    rotate_user_agent = False
+
+    def parse(self, response):
+        for doc_name in ("big", "missing"):
+            url = f"{base_url}/{doc_name}.pdf"
+            version_hash_raw_data = {"doc_name": doc_name, "download_url": url}
+            yield DocItem(
+                doc_name=doc_name, doc_title=doc_name, doc_num="1", doc_type="pdf", display_doc_type="Document",
+                publication_date=None, cac_login_required=False, crawler_used=self.name,
+                downloadable_items=[{"doc_type": "pdf", "download_url": url, "compression_type": None}],
+                source_page_url=response.url, source_fqdn="127.0.0.1", download_url=url,
+                version_hash_raw_data=version_hash_raw_data,
+                version_hash=dict_to_sha256_hex_digest(version_hash_raw_data),
+                display_org="Test", data_source="Test", source_title="Test", display_source="Test - Test",
+                display_title=doc_name, file_ext="pdf", is_revoked=False,
+            )
+
+
+process = CrawlerProcess({"LOG_LEVEL": "ERROR"})
+crawler = process.create_crawler(StreamingTestSpider)
+process.crawl(crawler, download_output_dir=download_dir, previous_manifest_location="",
+              dont_filter_previous_hashes=True)
+process.start()
+print(json.dumps(crawler.stats.get_stats(), default=str))
+"""
+
+
+@pytest.fixture
+def site(tmp_path):
+    site_dir = tmp_path / "site"
+    site_dir.mkdir()
+    (site_dir / "index.html").write_text("<html><body>docs</body></html>")
+    (site_dir / "big.pdf").write_bytes(b"%PDF-1.4 " + os.urandom(3 * 1024 * 1024))
+    server = HTTPServer(("127.0.0.1", 0), partial(SimpleHTTPRequestHandler, directory=str(site_dir)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield site_dir, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_streamed_downloads_go_through_the_downloader_to_disk(tmp_path, site):
+    site_dir, base_url = site
+    download_dir = tmp_path / "downloads"
+    download_dir.mkdir()
+
+    proc = subprocess.run(
+        [sys.executable, "-c", CRAWL_SCRIPT, base_url, str(download_dir)],
+        capture_output=True, text=True, timeout=120, cwd=Path(__file__).parents[1],
+    )
+    assert proc.returncode == 0, proc.stderr
+    stats = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    assert (download_dir / "big.pdf").read_bytes() == (site_dir / "big.pdf").read_bytes()
+    assert stats["stream_download/file_count"] == 1
+    assert stats["stream_download/bytes"] == (site_dir / "big.pdf").stat().st_size
+    # the index page and both documents were scheduled and counted by the downloader like any other request
+    assert stats["downloader/request_count"] == 3
+    assert stats["downloader/response_status_count/404"] == 1
+
+    rows = [json.loads(line) for line in (download_dir / "manifest.json").read_text().splitlines()]
+    assert [row["doc_name"] for row in rows] == ["big"]
+    assert "missing" in (download_dir / "dead_queue.json").read_text()
+    # temp files live under the blob dir, which isn't uploaded, and none are left behind
+    assert list((download_dir / ".blobs" / "streaming").iterdir()) == []
+    assert not list(download_dir.glob("*.part"))
+
+
+def test_only_streaming_spiders_get_the_streaming_handler(monkeypatch):
+    class PlainSpider(GCSpider):
+        name = "plain"
+
+    class StreamingSpider(GCSpider):
+        name = "streaming"
+        stream_downloads = True
+
+    assert "https" not in get_crawler(PlainSpider).settings.getdict("DOWNLOAD_HANDLERS")
+    crawler = get_crawler(StreamingSpider)
+    assert crawler.settings.getdict("DOWNLOAD_HANDLERS")["https"].endswith(".StreamingDownloadHandler")
+    StreamingDownloadHandler(crawler.settings, crawler)
+
+    # a scrapy upgrade that changes how response bodies are buffered fails loading the handler, not the downloads
+    monkeypatch.setattr(download_handlers, "response_reader_buffers_in_bodybuf", lambda: False)
+    with pytest.raises(NotConfigured):
+        StreamingDownloadHandler(crawler.settings, crawler)
@@ -0,0 +1,216 @@
+import json
+from pathlib import Path
+
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.blob_store import BlobStore
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.compaction import compact_manifests
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.digest_set import DigestSet
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.index import ManifestIndex
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.reader import (
+    is_gzip_file,
+    iter_manifest_rows,
+    verify_manifest_checksum,
+)
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.validator_store import ValidatorStore
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.writers import BufferedAppendWriter
+
+from tests.test_spiders import (
+    TEST_RESOURCES_SPIDERS_ROOT as _TEST_RESOURCES_SPIDERS_ROOT,
+    TEST_SPIDER_PREV_MANIFEST_FILENAME as _TEST_SPIDER_PREV_MANIFEST_FILENAME,
+)
+
+
+def write_manifest(path: Path, rows) -> Path:
+    with path.open(mode="w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    return path
+
+
+def test_manifest_index_partitions_by_crawler(tmp_path):
+    manifest = write_manifest(
+        tmp_path / "manifest.json",
+        [
+            {"version_hash": "a" * 64, "doc_name": "one", "crawler_used": "spider_a"},
+            {"version_hash": "b" * 64, "doc_name": "two", "crawler_used": "spider_b"},
+            {"version_hash": "c" * 64, "doc_name": "legacy"},
+        ],
+    )
+    index = ManifestIndex.build(manifest, tmp_path / "manifest.sqlite")
+
+    assert index.contains("spider_a", "a" * 64)
+    assert not index.contains("spider_a", "b" * 64)
+    # legacy rows without crawler info apply to every spider
+    assert index.contains("spider_b", "c" * 64)
+    assert sorted(index.iter_hashes("spider_a")) == ["a" * 64, "c" * 64]
+    assert index.count("spider_b") == 2
+
+
+def test_manifest_index_matches_full_scan():
+    manifest = _TEST_RESOURCES_SPIDERS_ROOT / _TEST_SPIDER_PREV_MANIFEST_FILENAME
+    expected = set()
+    for line in manifest.read_text().splitlines():
+        if line.strip():
+            jdoc = json.loads(line)
+            if jdoc.get("crawler_used") in (None, "", "us_code"):
+                expected.add(jdoc["version_hash"])
+
+    index = ManifestIndex.for_manifest(manifest)
+    assert set(index.iter_hashes("us_code")) == expected
+    assert ManifestIndex.for_manifest(manifest) is index
+
+
+def test_digest_set_membership_matches_set():
+    from hashlib import sha256
+
+    values = [sha256(str(i).encode()).hexdigest() for i in range(5000)] + ["not-a-hash", "A" * 64]
+    for bloom_filter in (False, True):
+        digest_set = DigestSet.from_iterable(values, capacity_hint=100, bloom_filter=bloom_filter)
+
+        assert len(digest_set) == len(values)
+        assert all(v in digest_set for v in values)
+        assert sha256(b"missing").hexdigest() not in digest_set
+        # hex lookups stay case sensitive
+        assert values[0].upper() not in digest_set
+        assert "a" * 64 not in digest_set
+        assert sorted(digest_set) == sorted(values)
+
+
+def test_compact_manifests_dedupes_and_keeps_latest(tmp_path):
+    old = write_manifest(
+        tmp_path / "old.json",
+        [
+            {"version_hash": "1" * 64, "doc_name": "doc", "crawler_used": "a", "access_timestamp": "2021-01-01 00:00:00.0"},
+            {"version_hash": "2" * 64, "doc_name": "doc", "crawler_used": "a", "access_timestamp": "2021-02-01 00:00:00.0"},
+            {"version_hash": "2" * 64, "doc_name": "doc", "crawler_used": "a", "access_timestamp": "2021-03-01 00:00:00.0"},
+            {"version_hash": "9" * 64, "doc_name": "other", "crawler_used": "b", "access_timestamp": "2021-01-01 00:00:00.0"},
+        ],
+    )
+    new = write_manifest(
+        tmp_path / "new.json",
+        [{"version_hash": "3" * 64, "doc_name": "doc", "crawler_used": "a", "access_timestamp": "2022-01-01T00:00:00"}],
+    )
+    output = tmp_path / "cumulative.json"
+
+    results = compact_manifests([old, new], output, keep_latest=2, chunk_size=2)
+
+    assert is_gzip_file(output)
+    assert verify_manifest_checksum(output)
+    assert results["duplicates_dropped"] == 1
+    assert results["superseded_dropped"] == 1
+    assert [(r["crawler_used"], r["version_hash"][0]) for r in iter_manifest_rows(output)] == [
+        ("a", "2"),
+        ("a", "3"),
+        ("b", "9"),
+    ]
+    assert set(ManifestIndex.build(output, tmp_path / "index.sqlite").iter_hashes("a")) == {"2" * 64, "3" * 64}
+
+
+def test_buffered_append_writer_is_shared_and_flushes_on_release(tmp_path):
+    path = tmp_path / "manifest.json"
+    first = BufferedAppendWriter.acquire(path, max_buffer_bytes=1024 * 1024, max_buffer_seconds=60)
+    second = BufferedAppendWriter.acquire(path)
+    assert first is second
+
+    first.write_json({"version_hash": "1" * 64})
+    second.write_json({"version_hash": "2" * 64})
+    assert not path.exists()
+
+    first.release()
+    assert not path.exists()
+    second.release()
+
+    assert [row["version_hash"][0] for row in iter_manifest_rows(path)] == ["1", "2"]
+    assert second.stats()["lines_written"] == 2
+    reacquired = BufferedAppendWriter.acquire(path)
+    assert reacquired is not first
+    reacquired.release()
+
+
+def test_buffered_append_writer_flushes_when_buffer_is_full(tmp_path):
+    path = tmp_path / "dead_queue.json"
+    writer = BufferedAppendWriter(path, max_buffer_bytes=10, max_buffer_seconds=60)
+    writer.write_line("0123456789")
+    assert path.read_text() == "0123456789\n"
+    writer.close()
+
+
+def test_validator_store_conditional_headers(tmp_path):
+    store = ValidatorStore(tmp_path / "http_cache.sqlite")
+    url = "https://example.com/doc.pdf"
+    assert store.conditional_headers(url) == {}
+
+    store.record(url, etag='"abc"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT", content_length=3, sha256="1" * 64)
+    # staged until the job's upload and manifest merge succeed
+    assert store.conditional_headers(url) == {}
+    assert store.commit_staged() == 1
+    store.close()
+
+    reopened = ValidatorStore(tmp_path / "http_cache.sqlite")
+    assert reopened.conditional_headers(url) == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+    }
+    # a later download without validators can't be revalidated
+    reopened.record(url, etag=None, last_modified=None)
+    reopened.commit_staged()
+    assert reopened.get(url) is None
+    # a failed job's validators are dropped by the next one
+    reopened.record(url, etag='"v2"', last_modified=None)
+    assert reopened.discard_staged() == 1
+    assert reopened.commit_staged() == 0 and reopened.get(url) is None
+    reopened.close()
+
+    # spiders crawling at once share a connection, the last release closes it
+    shared = ValidatorStore.acquire(tmp_path / "http_cache.sqlite")
+    assert ValidatorStore.acquire(tmp_path / "http_cache.sqlite") is shared
+    shared.release()
+    shared.record(url, etag='"v3"', last_modified=None)
+    shared.commit_staged()
+    shared.release()
+    reacquired = ValidatorStore.acquire(tmp_path / "http_cache.sqlite")
+    assert reacquired is not shared and reacquired.get(url)["etag"] == '"v3"'
+    reacquired.release()
+
+
+def test_blob_store_links_duplicates_to_one_blob(tmp_path):
+    store = BlobStore.for_output_dir(tmp_path)
+    assert BlobStore.for_output_dir(tmp_path) is store
+
+    digest, blob = store.add_bytes(b"same bytes")
+    assert store.link(digest, tmp_path / "first.pdf") is None
+    assert store.add_bytes(b"same bytes") == (digest, blob)
+    assert store.link(digest, tmp_path / "second.pdf") == tmp_path / "first.pdf"
+
+    # replacing an output file must not write through to the blob
+    other_digest, _ = store.add_bytes(b"other bytes")
+    store.link(other_digest, tmp_path / "second.pdf")
+    assert blob.read_bytes() == b"same bytes"
+    assert (tmp_path / "second.pdf").read_bytes() == b"other bytes"
+    assert len(list(blob.parent.parent.glob("*/*"))) == 2
+
+    # linking the same content again, e.g. another spider with the same doc name, leaves no temp links behind
+    store.link(digest, tmp_path / "first.pdf")
+    store.link(digest, tmp_path / "first.pdf")
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".blobs", "first.pdf", "second.pdf"]
+
+
+def test_worker_shards_are_named_and_merged_in_order(tmp_path):
+    from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.shards import (
+        merge_shard_files,
+        shard_path,
+    )
+
+    manifest = tmp_path / "manifest.json"
+    assert shard_path(manifest, None) == manifest
+    assert shard_path(manifest, 1) == tmp_path / "manifest.shard1.json"
+
+    # nothing to merge doesn't create the file
+    assert merge_shard_files([shard_path(manifest, 0)], manifest) == 0
+    assert not manifest.exists()
+
+    manifest.write_text("earlier\n")
+    shard_path(manifest, 2).write_text("c\n")
+    shard_path(manifest, 0).write_text("a\n")
+    assert merge_shard_files([shard_path(manifest, i) for i in range(3)], manifest) == 2
+    assert manifest.read_text() == "earlier\na\nc\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["manifest.json"]
@@ -0,0 +1,269 @@
+import pytest
+import scrapy
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, task
+
+from dataPipelines.gc_scrapy.gc_scrapy.GCSpider import GCSpider
+from dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares import AdaptiveRateMiddleware
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.adaptive_rate import AdaptiveRateController
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.delay_scheduler import DomainDelayScheduler
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_fast_mode import blocked_url_patterns
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_pool import SeleniumDriverPool
+from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.user_agent_health import UserAgentHealth
+
+
+def test_domain_delay_scheduler_spaces_requests_per_domain():
+    clock = task.Clock()
+    scheduler = DomainDelayScheduler(clock=clock)
+
+    assert scheduler.wait("a.mil", 2) is None
+    fired = []
+    scheduler.wait("a.mil", 2).addCallback(lambda _: fired.append("a2"))
+    scheduler.wait("a.mil", 1).addCallback(lambda _: fired.append("a3"))
+    # other domains aren't held up by a.mil
+    assert scheduler.wait("b.gov", 2) is None
+
+    clock.advance(1.9)
+    assert fired == []
+    clock.advance(0.1)
+    assert fired == ["a2"]
+    clock.advance(2)
+    assert fired == ["a2", "a3"]
+
+    # an idle domain doesn't bank more than burst tokens
+    clock.advance(60)
+    assert scheduler.reserve("a.mil", 2) == 0
+    assert scheduler.reserve("a.mil", 2) == 2
+
+    bursty = DomainDelayScheduler(clock=clock, burst=3)
+    assert [bursty.reserve("c.mil", 1) for _ in range(5)] == [0, 0, 0, 1, 2]
+
+
+def test_adaptive_rate_controller_aimd_and_state_file(tmp_path):
+    controller = AdaptiveRateController(concurrency=(8, 1, 16), delay=(0.1, 0.0, 30.0), timeout=(3.5, 60.0), window=10)
+
+    # healthy windows speed a fast api up
+    for _ in range(40):
+        rate = controller.record_success("api.govinfo.gov", 0.05)
+    assert (rate.concurrency, rate.delay) == (12, 0.0)
+    assert rate.p95_latency == 0.05
+
+    # a burst of 429s from requests already in flight backs off once, timeouts lengthen the timeout
+    for _ in range(5):
+        rate = controller.record_failure("api.govinfo.gov", now=100.0)
+    assert (rate.concurrency, rate.delay) == (6, 0.25)
+    rate = controller.record_failure("api.govinfo.gov", now=102.0, timed_out=True)
+    assert (rate.concurrency, rate.delay, rate.timeout) == (3, 0.5, 5.25)
+
+    # slow hosts lose concurrency and get a timeout that fits their latency
+    for _ in range(10):
+        slow = controller.record_success("slow.mil", 4.0)
+    assert (slow.concurrency, slow.timeout) == (7, 12.0)
+
+    state_path = tmp_path / "rate_state.json"
+    controller.save(state_path)
+    other_run = AdaptiveRateController(window=10)
+    other_run.record_success("other.gov", 0.1)
+    other_run.save(state_path)
+
+    restored = AdaptiveRateController(window=10)
+    restored.load(state_path)
+    assert sorted(restored.hosts) == ["api.govinfo.gov", "other.gov", "slow.mil"]
+    assert restored.get("slow.mil").concurrency == 7
+    assert restored.get("slow.mil").timeout == 12.0
+
+
+def test_adaptive_rate_middleware_stays_within_spider_settings():
+    adaptive = {
+        "ADAPTIVE_RATE_ENABLED": True, "ADAPTIVE_RATE_MAX_CONCURRENCY": 16, "ADAPTIVE_RATE_MAX_DELAY": 30.0,
+        "ADAPTIVE_RATE_TARGET_LATENCY": 2.0, "ADAPTIVE_RATE_WINDOW": 10,
+    }
+
+    class PoliteSpider(scrapy.Spider):
+        name = "polite"
+        custom_settings = {**adaptive, "CONCURRENT_REQUESTS_PER_DOMAIN": 2, "DOWNLOAD_DELAY": 1.5}
+
+    class ThrottledSpider(scrapy.Spider):
+        name = "throttled"
+        custom_settings = {**adaptive, "AUTOTHROTTLE_ENABLED": True}
+
+    # per host concurrency never goes over the spider's own limit, a delay it set is the floor
+    controller = AdaptiveRateMiddleware(get_crawler(PoliteSpider)).controller
+    assert (controller.start_concurrency, controller.max_concurrency) == (2, 2)
+    assert (controller.start_delay, controller.min_delay) == (1.5, 1.5)
+    for _ in range(100):
+        rate = controller.record_success("fast.mil", 0.01)
+    assert (rate.concurrency, rate.delay) == (2, 1.5)
+
+    # the general_settings every spider shares are only where hosts start
+    class GeneralSpider(GCSpider):
+        name = "general"
+
+    controller = AdaptiveRateMiddleware(get_crawler(GeneralSpider)).controller
+    assert (controller.start_concurrency, controller.max_concurrency) == (8, 16)
+    assert (controller.start_delay, controller.min_delay) == (0.1, 0.0)
+    for _ in range(200):
+        rate = controller.record_success("fast.mil", 0.01)
+    assert rate.concurrency > 8 and rate.delay < 0.1
+
+    with pytest.raises(NotConfigured):
+        AdaptiveRateMiddleware(get_crawler(ThrottledSpider))
+
+
+def test_user_agent_health_quarantines_and_reprobes(tmp_path):
+    import random
+
+    health = UserAgentHealth(failure_threshold=3, quarantine_seconds=60, rng=random.Random(0))
+    agents = ["good", "banned"]
+
+    for now in range(3):
+        health.record("sasc.senate.gov", "banned", ok=False, now=now)
+        health.record("sasc.senate.gov", "good", ok=True, now=now)
+    assert health.quarantines == 1
+    assert {health.choose("sasc.senate.gov", agents, now=10) for _ in range(50)} == {"good"}
+    # quarantine is per domain
+    assert "banned" in {health.choose("hasc.house.gov", agents, now=10) for _ in range(50)}
+
+    # a failed probe goes straight back for twice as long, a good one clears the agent
+    health.record("sasc.senate.gov", "banned", ok=False, now=70)
+    assert health.get("sasc.senate.gov", "banned").quarantined_until == 70 + 120
+    health.record("sasc.senate.gov", "banned", ok=True, now=200)
+    assert health.get("sasc.senate.gov", "banned").quarantine_count == 0
+
+    # when everything is quarantined the agent that gets out first is used
+    for now in (300, 301, 302):
+        health.record("sasc.senate.gov", "good", ok=False, now=now)
+        health.record("sasc.senate.gov", "banned", ok=False, now=now + 0.5)
+    assert health.choose("sasc.senate.gov", agents, now=310) == "good"
+
+    state_path = tmp_path / "user_agent_health.json"
+    health.save(state_path)
+    restored = UserAgentHealth()
+    restored.load(state_path)
+    assert restored.get("sasc.senate.gov", "banned").as_state() == health.get("sasc.senate.gov", "banned").as_state()
+    assert "hasc.house.gov" not in restored.table
+    assert health.stats_table(now=310)["sasc.senate.gov"]["good"]["quarantined"]
+
+
+def test_selenium_driver_pool_bounds_and_recycles_drivers():
+    class FakeDriver:
+        def __init__(self):
+            self.quit_called = False
+
+        def quit(self):
+            self.quit_called = True
+
+    pool = SeleniumDriverPool(FakeDriver, size=2, max_pages=2)
+    # run blocking calls inline instead of on the pool's threads
+    pool.run = lambda func, *args, **kwargs: defer.maybeDeferred(func, *args, **kwargs)
+
+    leases = []
+    for _ in range(3):
+        pool.acquire().addCallback(leases.append)
+    # the third request waits for a driver
+    assert len(leases) == 2 and pool.created_count == 2
+
+    first = leases[0].driver
+    leases[0].release()
+    leases[0].release()
+    assert len(leases) == 3 and leases[2].driver is first
+    assert pool.semaphore.tokens == 0
+
+    # second page on the same driver replaces it
+    leases[2].release()
+    assert first.quit_called and pool.recycled_count == 1
+    leases[1].release(broken=True)
+    assert pool.recycled_count == 2 and pool.idle == []
+
+    pool.acquire().addCallback(leases.append)
+    assert pool.created_count == 3
+    pool.close()
+    assert leases[3].driver.quit_called
+    leases[3].release()
+    assert pool.semaphore.tokens == 2
+
+
+def test_selenium_fast_mode_blocks_urls_per_request():
+    from dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares import SeleniumMiddleware
+    from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_request import SeleniumRequest
+
+    assert blocked_url_patterns(["font", "font"], ["*dap.digitalgov.gov*"]) == [
+        "*.woff*", "*.ttf*", "*.otf*", "*.eot*", "*dap.digitalgov.gov*"
+    ]
+    with pytest.raises(ValueError):
+        blocked_url_patterns(["script"], [])
+
+    class FakeChrome:
+        def __init__(self):
+            self.commands = []
+
+        def execute_cdp_cmd(self, cmd, params):
+            self.commands.append((cmd, params))
+
+    middleware = SeleniumMiddleware("chrome", "chromedriver", None, None, [], fast_mode=True,
+                                    blocked_resource_types=["stylesheet"], blocked_url_patterns=["*ads*"])
+    driver = FakeChrome()
+    middleware.block_urls(driver, SeleniumRequest(url="https://www.med.navy.mil/Directives/"))
+    middleware.block_urls(driver, SeleniumRequest(url="https://www.med.navy.mil/Directives/?page=2"))
+    assert driver.commands == [("Network.enable", {}), ("Network.setBlockedURLs", {"urls": ["*.css*", "*ads*"]})]
+
+    middleware.block_urls(driver, SeleniumRequest(url="https://www.med.navy.mil/", fast_mode=False))
+    assert driver.commands[-1] == ("Network.setBlockedURLs", {"urls": []})
+
+
+def test_selenium_spider_waits_for_stable_dom_and_rows():
+    from dataPipelines.gc_scrapy.gc_scrapy.GCSeleniumSpider import GCSeleniumSpider
+
+    class FakeDriver:
+        def __init__(self, snapshots, row_counts):
+            self.snapshots = iter(snapshots)
+            self.row_counts = iter(row_counts)
+
+        def execute_script(self, script):
+            return next(self.snapshots)
+
+        def find_elements(self, by, value):
+            return [object()] * next(self.row_counts)
+
+    spider = GCSeleniumSpider(name="wait_test")
+    loading = ["loading", 10, 100]
+    driver = FakeDriver([loading, loading, ["interactive", 50, 900], ["complete", 80, 2000], ["complete", 80, 2000]],
+                        [0, 3, 7, 7])
+    assert spider.wait_for_dom_stable(driver, timeout=5, quiet_period=0, poll=0.01)
+    assert spider.wait_for_table_rows(driver, "table tbody tr", timeout=5, quiet_period=0, poll=0.01) == 7
+
+    # never settles
+    driver = FakeDriver(([i, i, i] for i in range(10 ** 6)), iter(int, 1))
+    assert not spider.wait_for_dom_stable(driver, timeout=0.1, poll=0.01)
+    assert spider.wait_for_table_rows(driver, "table tbody tr", timeout=0.1, poll=0.01) == 0
+
+
+def test_selenium_driver_callback_runs_with_the_render():
+    from dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares import SeleniumMiddleware
+    from dataPipelines.gc_scrapy.gc_scrapy.GCSeleniumSpider import GCSeleniumSpider
+    from dataPipelines.gc_scrapy.gc_scrapy.middleware_utils.selenium_request import SeleniumRequest
+
+    class FakeDriver:
+        current_url = "https://www.e-publishing.af.mil/Product-Index/#/?view=cat&catID=1"
+        page_source = "<html></html>"
+
+        def get(self, url):
+            pass
+
+    class WalkingSpider(GCSeleniumSpider):
+        name = "walking"
+        start_urls = [FakeDriver.current_url]
+        selenium_request_overrides = {
+            "driver_callback": lambda driver, request: [(driver.current_url, request.meta["start_url"])],
+            "meta": {"dont_redirect": True},
+        }
+
+    # overrides add to the start request's meta instead of replacing it
+    request = next(WalkingSpider().start_requests())
+    assert request.meta == {"dont_redirect": True, "start_url": FakeDriver.current_url}
+    assert isinstance(request, SeleniumRequest)
+
+    middleware = SeleniumMiddleware("chrome", "chromedriver", None, None, [])
+    middleware.render(FakeDriver(), request, WalkingSpider())
+    assert request.meta["driver_result"] == [(FakeDriver.current_url, FakeDriver.current_url)]
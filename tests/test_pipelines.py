@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import scrapy
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+from twisted.internet import reactor
+
+from dataPipelines.gc_scrapy.gc_scrapy.GCSpider import GCSpider
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.blob_store import BlobStore
+from dataPipelines.gc_scrapy.gc_scrapy.manifest_utils.validator_store import ValidatorStore
+from dataPipelines.gc_scrapy.gc_scrapy.pipelines import FileDownloadPipeline
+from dataPipelines.gc_scrapy.gc_scrapy.runspider_settings import general_settings
+
+
+class PipelineTestSpider(GCSpider):
+    name = "pipeline_test"
+    custom_settings = {**general_settings, "FILE_PIPELINE_THREADS": 2, "FILE_PIPELINE_MAX_PENDING": 2}
+
+
+def open_pipeline(tmp_path, **spider_kwargs):
+    crawler = get_crawler(PipelineTestSpider)
+    spider_kwargs = {
+        "previous_manifest_location": str(tmp_path / "missing-manifest.json"),
+        "dont_filter_previous_hashes": True,
+        **spider_kwargs,
+    }
+    spider = PipelineTestSpider.from_crawler(crawler, download_output_dir=str(tmp_path), **spider_kwargs)
+    crawler.spider = spider
+    spider.setup_stats()
+    pipeline = FileDownloadPipeline.from_crawler(crawler)
+    pipeline.open_spider(spider)
+    return pipeline, spider
+
+
+def pump_reactor_until(condition, timeout=10):
+    """Run the calls file pool threads hand to the reactor, without starting it"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        reactor.runUntilCurrent()
+        time.sleep(0.01)
+
+
+def downloaded(doc_name, body, status=200):
+    url = f"https://example.mil/{doc_name}.pdf"
+    meta = {"output_file_name": f"{doc_name}.pdf", "doc_type": "pdf", "compression_type": None, "http_cache_url": url}
+    response = Response(url, status=status, body=body, request=scrapy.Request(url, meta=meta))
+    item = {"doc_name": doc_name, "version_hash": f"hash-{doc_name}", "crawler_used": "pipeline_test",
+            "access_timestamp": "2023-01-01 00:00:00"}
+    return [(True, (True, response, None))], item
+
+
+def test_file_pipeline_bounds_pending_work_and_writes_manifest_rows(tmp_path):
+    pipeline, spider = open_pipeline(tmp_path)
+    info = SimpleNamespace(downloaded={"url": "done"}, spider=spider)
+
+    release = threading.Event()
+    store_downloaded_files = pipeline.store_downloaded_files
+
+    def slow_store(*args):
+        release.wait(10)
+        return store_downloaded_files(*args)
+
+    pipeline.store_downloaded_files = slow_store
+    completed = []
+    try:
+        for i in range(5):
+            # two documents share a body, the second is a duplicate of the first blob
+            results, item = downloaded(f"doc{i}", b"%PDF same" if i < 2 else f"%PDF {i}".encode())
+            pipeline.item_completed(results, item, info).addCallback(completed.append)
+
+        # only FILE_PIPELINE_MAX_PENDING items are handed to the file pool, the rest wait on the semaphore
+        assert pipeline.file_work_semaphore.tokens == 0
+        assert len(pipeline.file_work_semaphore.waiting) == 3
+    finally:
+        release.set()
+    try:
+        pump_reactor_until(lambda: len(completed) == 5)
+    finally:
+        pipeline.close_spider(spider)
+
+    rows = [json.loads(line) for line in (tmp_path / "manifest.json").read_text().splitlines()]
+    assert sorted(row["doc_name"] for row in rows) == [f"doc{i}" for i in range(5)]
+    assert all(row["content_hash"] for row in rows)
+    assert (tmp_path / "doc0.pdf").read_bytes() == (tmp_path / "doc1.pdf").read_bytes() == b"%PDF same"
+    assert spider.crawler.stats.get_value("blob_store/duplicate_count") == 1
+
+
+def test_not_modified_files_keep_their_new_metadata(tmp_path):
+    output_dir = tmp_path / "downloads"
+    output_dir.mkdir()
+    previous_manifest = tmp_path / "previous-manifest.json"
+    previous_manifest.write_text("")
+    http_cache = tmp_path / "http-cache.sqlite"
+
+    # the last job downloaded doc0, its blob is still in the download dir, doc1's blob is gone
+    store = ValidatorStore(http_cache)
+    content_hash, _ = BlobStore.for_output_dir(output_dir).add_bytes(b"%PDF unchanged")
+    store.record("https://example.mil/doc0.pdf", etag='"doc0"', last_modified=None, sha256=content_hash)
+    store.record("https://example.mil/doc1.pdf", etag='"doc1"', last_modified=None, sha256="0" * 64)
+    store.commit_staged()
+    store.close()
+
+    pipeline, spider = open_pipeline(output_dir, previous_manifest_location=str(previous_manifest),
+                                     dont_filter_previous_hashes=False, http_cache_location=str(http_cache))
+    info = SimpleNamespace(downloaded={"url": "done"}, spider=spider)
+    completed = []
+    try:
+        for doc_name in ("doc0", "doc1"):
+            results, item = downloaded(doc_name, b"", status=304)
+            item["doc_title"] = f"{doc_name} renamed"
+            pipeline.item_completed(results, item, info).addCallback(completed.append)
+        pump_reactor_until(lambda: len(completed) == 2)
+    finally:
+        pipeline.close_spider(spider)
+
+    for doc_name in ("doc0", "doc1"):
+        metadata = json.loads((output_dir / f"{doc_name}.pdf.metadata").read_text())
+        assert metadata["doc_title"] == f"{doc_name} renamed"
+    assert (output_dir / "doc0.pdf").read_bytes() == b"%PDF unchanged"
+    assert not (output_dir / "doc1.pdf").exists()
+    # doc1 isn't filtered by its new version_hash next run, and is downloaded in full then
+    rows = [json.loads(line) for line in (output_dir / "manifest.json").read_text().splitlines()]
+    assert [(row["doc_name"], row["content_hash"]) for row in rows] == [("doc0", content_hash)]
+    store = ValidatorStore(http_cache)
+    store.commit_staged()
+    assert store.conditional_headers("https://example.mil/doc0.pdf") == {"If-None-Match": '"doc0"'}
+    assert store.get("https://example.mil/doc1.pdf") is None
+    store.close()
@@ -0,0 +1,54 @@
+import threading
+
+from dataPipelines.gc_scrapy.gc_scrapy.run_history import RunHistory, order_longest_first, partition_longest_first
+
+
+def test_run_history_predicts_durations_and_packs_longest_first(tmp_path):
+    history = RunHistory(max_runs=3)
+    for elapsed in (5000, 100, 4000, 4200):
+        history.record("air_force_pubs", {"Elapsed Time (sec)": elapsed, "Item Scraped Count": 10,
+                                          "Close Reason": "finished", "Spider Module": "air_force_spider"})
+    history.record("army_pubs", {"Elapsed Time (sec)": 900, "Close Reason": "finished", "Spider Module": "army_spider"})
+    # failed runs only count when there are no finished ones
+    history.record("army_pubs", {"Elapsed Time (sec)": 5, "Close Reason": "shutdown"})
+    history.record("no_elapsed", {"Close Reason": "finished"})
+    assert history.predicted_duration("air_force_pubs") == 4000
+    assert history.predicted_duration("army_pubs") == 900
+    assert history.predicted_duration("no_elapsed") is None
+
+    history.save(tmp_path / "run_history.json")
+    restored = RunHistory()
+    restored.load(tmp_path / "run_history.json")
+    durations = restored.predicted_durations(["army_spider.py", "new_spider.py", "air_force_spider.py", "bupers_spider.py"])
+    # spiders without history are assumed to be as slow as the slowest known one
+    assert durations == {"army_spider.py": 900, "new_spider.py": 4000, "air_force_spider.py": 4000, "bupers_spider.py": 4000}
+
+    durations = {"a": 10, "b": 7, "c": 6, "d": 5, "e": 4, "f": 2}
+    assert order_longest_first(["f", "a", "d", "b", "e", "c"], durations) == ["a", "b", "c", "d", "e", "f"]
+    assert partition_longest_first(list(durations), durations, 2) == [["a", "d", "f"], ["b", "c", "e"]]
+    assert partition_longest_first(["x", "y", "z"], {}, 2) == [["x", "z"], ["y"]]
+    assert partition_longest_first(["x"], {}, 3) == [["x"]]
+
+
+def test_run_history_saves_from_workers_at_once_are_merged(tmp_path):
+    path = tmp_path / "run_history.json"
+    history = RunHistory()
+    history.record("dod_issuances", {"Elapsed Time (sec)": 60, "Close Reason": "finished"})
+    history.save(path)
+
+    def run_worker(spider_name):
+        worker_history = RunHistory()
+        worker_history.load(path)
+        worker_history.record(spider_name, {"Elapsed Time (sec)": 10, "Close Reason": "finished"})
+        worker_history.save(path)
+
+    workers = [threading.Thread(target=run_worker, args=(f"spider_{i}",)) for i in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    restored = RunHistory()
+    restored.load(path)
+    assert set(restored.spiders) == {"dod_issuances", *(f"spider_{i}" for i in range(8))}
+    assert all(len(spider["runs"]) == 1 for spider in restored.spiders.values())
@@ -0,0 +1,23 @@
+from dataPipelines.gc_scrapy.gc_scrapy.schedule_balancer import balance_week, day_runtime, spider_hosts, week_report
+
+
+def test_schedule_balancer_separates_hosts_and_evens_out_days():
+    assert spider_hosts(["www.navy.mil"], ["https://www.secnav.navy.mil/doni/default.aspx", "https://navy.mil/a"]) \
+        == {"navy.mil", "secnav.navy.mil"}
+    assert day_runtime(["a", "b", "c"], {"a": 5, "b": 4, "c": 3}) == 12
+    assert day_runtime(["a", "b", "c"], {"a": 5, "b": 4, "c": 3}, parallel_spiders=2) == 7
+
+    durations = {"a.py": 10, "b.py": 8, "c": 6, "d": 5, "e": 3}
+    downloaded_bytes = {"a.py": 100, "b.py": 100, "c": 10, "d": 10, "e": 10}
+    hosts = {"a.py": {"army.mil"}, "b.py": {"navy.mil"}, "c": {"army.mil"}, "d": {"af.mil"}, "e": {"navy.mil"}}
+    week = balance_week(list(durations), durations, downloaded_bytes, hosts, window_seconds=20, days=("mon", "tue"))
+    assert sorted(week["mon"] + week["tue"]) == sorted(durations)
+    # c would even out the days better next to a, but they crawl the same host, as do b and e
+    assert week == {"mon": ["a.py", "d", "e"], "tue": ["b.py", "c"]}
+
+    current = {"mon": ["a.py", "c", "b.py"], "tue": ["d", "e"]}
+    report = week_report(current, durations, downloaded_bytes, hosts, window_seconds=20)
+    assert report["mon"]["runtime"] == 24 and report["mon"]["over_window"]
+    assert report["mon"]["host_conflicts"] == ["army.mil"]
+    balanced = week_report(week, durations, downloaded_bytes, hosts, window_seconds=20)
+    assert max(day["runtime"] for day in balanced.values()) < 24
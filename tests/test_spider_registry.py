@@ -0,0 +1,44 @@
+import os
+
+from dataPipelines.gc_scrapy.gc_scrapy.spider_registry import SpiderRegistry
+
+
+def test_spider_registry_scans_without_importing_and_rescans_changed_modules(tmp_path):
+    spiders_dir = tmp_path / "spiders"
+    spiders_dir.mkdir()
+    (spiders_dir / "__init__.py").write_text("")
+    (spiders_dir / "helpers.py").write_text("import not_installed\nBASE = 1\n")
+    (spiders_dir / "navy_spider.py").write_text(
+        "import not_installed\n"
+        "from urllib.parse import urljoin\n"
+        "class NavyBase(GCSeleniumSpider):\n"
+        "    domain = 'www.navy.mil'\n"
+        "class NavySpider(NavyBase):\n"
+        "    name = 'navy'\n"
+        "    base_url = f'https://{domain}'\n"
+        "    allowed_domains = [domain]\n"
+        "    start_urls = [urljoin(base_url, '/pubs'), base_url + '/other', make_url()]\n"
+    )
+    (spiders_dir / "army_spider.py").write_text(
+        "class ArmySpider(gc.GCSpider):\n    name: str = 'army'\n    start_urls = ['https://army.mil']\n"
+    )
+
+    cache_path = tmp_path / "cache" / "registry.json"
+    registry = SpiderRegistry(spiders_dir, cache_path)
+    assert registry.spider_modules() == ["army_spider", "navy_spider"]
+    assert registry.get("helpers") is None
+    # start_urls with a value that can't be worked out statically are left out
+    assert registry.get("navy_spider") == {
+        "class_name": "NavySpider", "name": "navy", "selenium": True,
+        "allowed_domains": ["www.navy.mil"], "start_urls": [],
+    }
+    assert registry.get("army_spider")["start_urls"] == ["https://army.mil"]
+    assert registry.find_by_name("army") == "army_spider"
+
+    army = spiders_dir / "army_spider.py"
+    army.write_text("class ArmySpider(GCSpider):\n    name = 'army_pubs'\n")
+    os.utime(army, ns=(1, 1))
+    (spiders_dir / "navy_spider.py").unlink()
+    restored = SpiderRegistry(spiders_dir, cache_path)
+    assert restored.spider_modules() == ["army_spider"]
+    assert restored.get("army_spider")["name"] == "army_pubs"
@@ -0,0 +1,141 @@
+from dataPipelines.gc_scrapy.gc_scrapy.utils import NameReservationIndex, get_available_path
+
+
+def test_name_reservation_index_matches_probing(tmp_path):
+    for name in ("doc.pdf", "doc_dup1.pdf", "doc_dup3.pdf"):
+        (tmp_path / name).write_text(name)
+    (tmp_path / "tmp_unzip").mkdir()
+    (tmp_path / "dir.ext").mkdir()
+
+    index = NameReservationIndex(tmp_path)
+    for desired in ("doc.pdf", "tmp_unzip", "dir.ext", "new.pdf"):
+        assert index.reserve(tmp_path / desired) == get_available_path(tmp_path / desired)
+
+    # reserved names are handed out once, even before anything is written to them, and keep the kind
+    # they were reserved as
+    assert index.reserve(tmp_path / "doc.pdf") == (tmp_path / "doc_dup4.pdf").resolve()
+    assert index.reserve(tmp_path / "new.pdf") == (tmp_path / "new_dup1.pdf").resolve()
+    assert index.reserve(tmp_path / "new.dir", is_dir=True) == (tmp_path / "new.dir").resolve()
+    assert index.reserve(tmp_path / "new.dir", is_dir=True) == (tmp_path / "new.dir_dup1.dir").resolve()
+
+    # files written without the index are still avoided
+    (tmp_path / "later.pdf").write_text("later")
+    (tmp_path / "later_dup1.pdf").write_text("later")
+    assert index.reserve(tmp_path / "later.pdf") == (tmp_path / "later_dup2.pdf").resolve()
+
+
+def test_unzip_docs_as_needed_streams_nested_zips(tmp_path):
+    import io
+    import zipfile
+
+    from dataPipelines.gc_scrapy.gc_scrapy.utils import unzip_docs_as_needed
+
+    def zip_bytes(members, compression):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=compression) as z:
+            for name, data in members.items():
+                z.writestr(name, data)
+        return buffer.getvalue()
+
+    stored_nested = zip_bytes({"b_stored.pdf": b"stored " * 100, "skip.txt": b"x"}, zipfile.ZIP_STORED)
+    deflated_nested = zip_bytes({"c_deflated.pdf": b"deflated " * 100}, zipfile.ZIP_DEFLATED)
+    archive = tmp_path / "bundle.zip"
+    archive.write_bytes(
+        zip_bytes(
+            {"a_top.pdf": b"top", "readme.txt": b"x", "one.zip": stored_nested, "two.zip": deflated_nested},
+            zipfile.ZIP_STORED,
+        )
+    )
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    desired = unzip_docs_as_needed(archive, output_dir, "pdf", NameReservationIndex(output_dir))
+
+    assert desired == [output_dir] * 3
+    assert sorted(p.name for p in output_dir.iterdir()) == ["a_top.pdf", "b_stored.pdf", "c_deflated.pdf"]
+    assert (output_dir / "b_stored.pdf").read_bytes() == b"stored " * 100
+    assert (output_dir / "c_deflated.pdf").read_bytes() == b"deflated " * 100
+    assert not archive.exists()
+
+
+def test_dict_to_sha256_hex_digest_matches_reduce_implementation():
+    from functools import reduce
+    from hashlib import sha256
+
+    from dataPipelines.gc_scrapy.gc_scrapy.utils import dict_to_sha256_hex_digest, stream_dict_to_sha256
+
+    def reduce_digest(_dict):
+        value_string = reduce(
+            lambda t1, t2: "".join(map(str, (t1, t2))), sorted(_dict.items(), key=lambda t: str(t[0])), ""
+        )
+        return sha256(value_string.encode("utf-8")).hexdigest()
+
+    payloads = [
+        {},
+        {"pub_date": "2020-06-01", "item_currency": "afgm2020-16-01.pdf", "certified_date": None},
+        {"doc_name": "Title 42 - Health", "nested": {"b": [1, 2.5, True], "a": "é"}, 3: "int key", "3": "str key"},
+    ]
+    for payload in payloads:
+        assert dict_to_sha256_hex_digest(payload) == reduce_digest(payload)
+
+    # canonical encoding doesn't depend on insertion order, but does on value types
+    assert stream_dict_to_sha256({"a": 1, "b": "2"}).hexdigest() == stream_dict_to_sha256({"b": "2", "a": 1}).hexdigest()
+    assert stream_dict_to_sha256({"a": 1}).hexdigest() != stream_dict_to_sha256({"a": "1"}).hexdigest()
+
+
+def test_parse_timestamp_matches_pandas():
+    import datetime
+    import json
+    from pathlib import Path
+
+    import pandas
+
+    from dataPipelines.gc_scrapy.gc_scrapy import utils
+
+    def pandas_parse(ts):
+        try:
+            ts = pandas.to_datetime(ts).to_pydatetime()
+            return None if str(ts) == "NaT" else ts
+        except:
+            return None
+
+    dates = [
+        "2020-06-01", "6/1/2020", "06-01-2020", "2020/06/01", "2020 06 01", "2020-06-01T22:59:57",
+        "2020-06-01 22:59:57.123", "06/01/2020 10:59 PM", "06/01/2020 22:59", "June 1, 2020", "jun 01, 2020",
+        "Jun. 1, 2020", "Monday, June 1, 2020", "1 June 2020", "01-Jun-2020", "June 2020", "2020-06", "06/2020",
+        "2020", "1234", "9999-12-31", "9999-99-99", "13/05/2020", "05/13/2020", "99/99/99", "06/01/20",
+        "Sept 1, 2020", " 2020-06-01", "June  1, 2020", "N/A", "", "2020-06-01T22:59:57Z",
+    ]
+    for path in (Path(utils.__file__).parent / "output_samples").glob("*.json"):
+        for line in path.read_text().splitlines()[:200]:
+            dates.append(json.loads(line).get("publication_date"))
+
+    utils._learned_timestamp_formats.clear()
+    for _ in range(2):
+        for ts in dates:
+            assert utils.parse_timestamp(ts) == pandas_parse(ts), ts
+
+    ts = datetime.datetime(2020, 6, 1)
+    assert utils.parse_timestamp(ts) is ts
+    assert utils.parse_timestamp(None) is None
+
+
+def test_crawl_startup_does_not_import_heavy_modules():
+    import subprocess
+    import sys
+
+    code = (
+        "import sys\n"
+        "import dataPipelines.gc_scrapy.cli\n"
+        "import dataPipelines.gc_scrapy.gc_scrapy.downloader_middlewares\n"
+        "import dataPipelines.gc_scrapy.gc_scrapy.pipelines\n"
+        "import dataPipelines.gc_scrapy.gc_scrapy.spiders.us_code_spider\n"
+        "print(' '.join(m for m in ('pandas', 'selenium', 'bs4', 'requests') if m in sys.modules))\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == ""
+
+    from dataPipelines.gc_scrapy.gc_scrapy.utils import LazyModule
+
+    lazy_json = LazyModule("json")
+    assert lazy_json.loads("[1]") == [1]
@@ -0,0 +1,74 @@
+import copy
+import json
+
+import pytest
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import ValidationError
+
+from dataPipelines.gc_scrapy.gc_scrapy import OUTPUT_SPEC_PATH
+from dataPipelines.gc_scrapy.gc_scrapy.validators import DefaultOutputSchemaValidator, compile_schema
+
+VALID_ITEM = {
+    "doc_name": "DOC 1",
+    "doc_title": "Document 1",
+    "doc_num": "1",
+    "doc_type": "DOC",
+    "display_doc_type": "Document",
+    "publication_date": None,
+    "cac_login_required": False,
+    "crawler_used": "test",
+    "downloadable_items": [{"doc_type": "pdf", "download_url": "https://example.local/1.pdf", "compression_type": None}],
+    "download_url": "https://example.local/1.pdf",
+    "source_page_url": "https://example.local/page.html",
+    "source_fqdn": "example.local",
+    "version_hash_raw_data": {"pub_date": "2020-06-01"},
+    "version_hash": "0" * 64,
+    "access_timestamp": "2020-06-28T22:59:57",
+    "display_org": "Org",
+    "data_source": "Source",
+    "source_title": "Source Title",
+    "display_source": "Source - Source Title",
+    "display_title": "DOC 1 Document 1",
+    "file_ext": "pdf",
+    "is_revoked": False,
+}
+
+MUTATIONS = [
+    lambda d: d.pop("doc_name"),
+    lambda d: d.update(doc_name=""),
+    lambda d: d.update(doc_num=1),
+    lambda d: d.update(publication_date="2020-01-01"),
+    lambda d: d.update(cac_login_required=0),
+    lambda d: d.update(source_page_url="ftp://example.local"),
+    lambda d: d.update(downloadable_items=[]),
+    lambda d: d.update(downloadable_items=[{"doc_type": "pdf"}]),
+    lambda d: d["downloadable_items"][0].update(compression_type="rar"),
+    lambda d: d["downloadable_items"][0].update(compression_type="zip"),
+    lambda d: d["downloadable_items"][0].update(doc_type="p df"),
+    lambda d: d.update(version_hash_raw_data=[]),
+    lambda d: d.update(access_timestamp="2020-06-28 22:59:57"),
+    lambda d: d.update(extra_field={"anything": 1}),
+]
+
+
+def test_compiled_output_validator_matches_jsonschema():
+    with open(OUTPUT_SPEC_PATH) as f:
+        draft7 = Draft7Validator(json.load(f))
+    validator = DefaultOutputSchemaValidator()
+    assert validator.check is not None
+
+    for mutate in [lambda d: None] + MUTATIONS:
+        item = copy.deepcopy(VALID_ITEM)
+        mutate(item)
+        assert validator.is_valid(item) == draft7.is_valid(item), item
+        if not draft7.is_valid(item):
+            # invalid items still get jsonschema's detailed error
+            with pytest.raises(ValidationError):
+                validator.validate(item)
+
+
+def test_compiled_schema_accepts_an_empty_required_list():
+    schema = {"type": "object", "required": []}
+    check = compile_schema(schema)
+    for instance in ({}, {"a": 1}, []):
+        assert check(instance) == Draft7Validator(schema).is_valid(instance)